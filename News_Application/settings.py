@@ -60,21 +60,135 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+
+    # Keyset pagination on (created_at, id), see news/pagination.py
+    "DEFAULT_PAGINATION_CLASS": "news.pagination.KeysetPagination",
+
+    # orjson when installed, see news/renderers.py
+    "DEFAULT_RENDERER_CLASSES": [
+        "news.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+# Rendered article/newsletter bodies are cached here, see news/caching.py.
+# Point "default" at Redis/Memcached to share the cache between workers.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
 }
+NEWS_DETAIL_CACHE = "default"
+NEWS_DETAIL_CACHE_TIMEOUT = 3600  # seconds
+
+# Page size for list views and APIs, overridable with ?page_size=
+NEWS_PAGE_SIZE = 20
+NEWS_MAX_PAGE_SIZE = 100
+
+# Article list APIs serialize from values() rows instead of going through
+# DRF serializers (same JSON), see news/serializers.py
+NEWS_FAST_SERIALIZATION = True
+
+# Rows fetched and encoded per chunk by the streaming article export
+NEWS_EXPORT_CHUNK_SIZE = 2000
+
+# Full-text search (FTS5 on SQLite, tsvector + GIN on PostgreSQL)
+NEWS_SEARCH_CONFIG = "english"  # PostgreSQL text search configuration
+NEWS_SEARCH_MAX_RESULTS = 1000  # ranked results are paged by OFFSET
+
+# Incremental sync (api/subscribed-articles/changes/)
+NEWS_SYNC_BATCH_SIZE = 500  # change log entries per response
+NEWS_SYNC_TOKEN_MAX_AGE = 30 * 86400  # seconds, see prune_changelog
+
+# Live feed (/live/, Server-Sent Events, needs an ASGI server)
+NEWS_LIVE_BROKER = "news.live.LocalBroker"  # in-process; swap for multi-worker
+NEWS_LIVE_KEEPALIVE = 15  # seconds between keepalive comments
+NEWS_LIVE_QUEUE_SIZE = 100  # events buffered per connection
 
 
 X_API_KEY = os.getenv("X_API_KEY")
 X_API_SECRET = os.getenv("X_API_SECRET")
 X_ACCESS_TOKEN = os.getenv("X_ACCESS_TOKEN")
 X_ACCESS_SECRET = os.getenv("X_ACCESS_SECRET")
+X_API_BASE_URL = os.getenv("X_API_BASE_URL", "https://api.twitter.com")
+
+# Tweet posting: client-side throttle, retries and background queue
+NEWS_TWEET_RATE = 1.0  # tweets/second, further limited by x-rate-limit-* headers
+NEWS_TWEET_BURST = 5
+NEWS_TWEET_MAX_RETRIES = 3  # for 429, 5xx and connection errors
+NEWS_TWEET_WORKERS = 2
+NEWS_TWEET_QUEUE_SIZE = 100
+
+
+# Notification outbox, drained by "python manage.py process_outbox"
+NEWS_OUTBOX_WORKERS = int(os.getenv("NEWS_OUTBOX_WORKERS", "4"))
+NEWS_OUTBOX_POOL = os.getenv("NEWS_OUTBOX_POOL", "thread")  # or "process"
+NEWS_OUTBOX_BATCH_SIZE = 100
+NEWS_OUTBOX_POLL_INTERVAL = 2.0  # seconds
+NEWS_OUTBOX_MAX_ATTEMPTS = 8
+NEWS_OUTBOX_BACKOFF_BASE = 2  # seconds, doubled on every attempt
+NEWS_OUTBOX_BACKOFF_MAX = 600  # seconds
+NEWS_OUTBOX_LEASE_SECONDS = 300  # reclaim messages from crashed workers
+
+# Subscriber email delivery
+NEWS_SUBSCRIBER_CHUNK_SIZE = 2000  # rows fetched per round trip
+NEWS_EMAIL_BATCH_SIZE = 100  # recipients per message / messages per send
+NEWS_EMAIL_MODE = "bcc"  # or "individual"
+
+# Serve api/subscribed-articles/ from the precomputed FeedEntry table.
+# Run "python manage.py backfill_feed" before switching it on.
+NEWS_FEED_MATERIALIZED = os.getenv("NEWS_FEED_MATERIALIZED", "") == "1"
+
+# Routes served by the async-native views in news/async_views.py, by URL
+# name ("article_list,subscribed-articles") or "all". Only worth it under
+# an ASGI server; leave empty under WSGI.
+NEWS_ASYNC_VIEWS = [
+    name for name in os.getenv("NEWS_ASYNC_VIEWS", "").split(",") if name
+]
 
+# Per-view query counts and timings, see news/instrumentation.py and
+# api/instrumentation/. Off by default: the middleware then unloads itself.
+NEWS_INSTRUMENTATION = os.getenv("NEWS_INSTRUMENTATION", "") == "1"
+NEWS_INSTRUMENTATION_BUFFER = 500  # recent requests kept per view
+# Most queries a request to these URL names may run. Requests over budget
+# are logged; with NEWS_QUERY_BUDGET_STRICT they raise (used by the tests).
+NEWS_QUERY_BUDGETS = {
+    "article_list": 8,
+    "article_detail": 8,
+    "newsletter_list": 8,
+    "newsletter_detail": 8,
+    "subscribed-articles": 8,
+    "approve_article": 20,
+}
+NEWS_QUERY_BUDGET_STRICT = False
+
+# Article views are buffered per process and written in batches, see
+# news/counters.py. Flushed after this many seconds or views.
+NEWS_VIEW_COUNT_FLUSH_INTERVAL = 30
+NEWS_VIEW_COUNT_FLUSH_SIZE = 1000
+
+# Scrapers of metrics/ that are not logged in (staff always can) send
+# NEWS_METRICS_TOKEN as "Authorization: Bearer <token>", or connect from
+# NEWS_METRICS_ALLOWED_IPS. Never list a reverse proxy's address there:
+# every client it forwards would match. The outbox worker serves its own
+# metrics: process_outbox --metrics-port 9101
+NEWS_METRICS_TOKEN = os.getenv("NEWS_METRICS_TOKEN", "")
+NEWS_METRICS_ALLOWED_IPS = []
+
+# Resolved permissions are kept in the session, see news/permissions.py.
+# Changes are noticed through versions in the database; entries are
+# resolved again after TIMEOUT seconds anyway (e.g. after raw SQL).
+NEWS_PERMISSION_CACHE_TIMEOUT = 300
 
 MIDDLEWARE = [
+    # Removes itself unless NEWS_INSTRUMENTATION is on
+    "news.instrumentation.QueryInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # AuthenticationMiddleware that keeps permissions in the session
+    "news.permissions.PermissionCacheMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
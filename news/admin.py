@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Article, Publisher, Newsletter
+from . import approval, search
+from .models import CustomUser, Article, Publisher, Newsletter, OutboxMessage
 
 
 # ************** CUSTOMERUSER  ADMIN **************
@@ -8,8 +9,10 @@ from .models import CustomUser, Article, Publisher, Newsletter
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
 
-    list_display = ("username", "email", "role", "is_staff")
-    list_filter = ("role",)
+    list_display = (
+        "username", "email", "role", "notification_frequency", "subscriber_count", "is_staff"
+    )
+    list_filter = ("role", "notification_frequency")
 
     fieldsets = UserAdmin.fieldsets + (
         (
@@ -17,6 +20,7 @@ class CustomUserAdmin(UserAdmin):
             {
                 "fields": (
                     "role",
+                    "notification_frequency",
                     "subscribed_publishers",
                     "subscribed_journalists",
                     "independent_articles",
@@ -37,17 +41,29 @@ class CustomUserAdmin(UserAdmin):
 # ************** ARTICLE  ADMIN **************
 @admin.register(Article)
 class ArticleAdmin(admin.ModelAdmin):
-    list_display = ("title", "publisher", "approved", "created_at")
+    list_display = ("title", "publisher", "approved", "created_at", "view_count")
     list_filter = ("approved", "publisher")
     search_fields = ("title", "content")
     list_editable = ("approved",)
     actions = ["approve_articles"]
 
     def approve_articles(self, request, queryset):
-        queryset.update(approved=True)
+        # One UPDATE and one coalesced notification for the whole selection
+        self.message_user(request, str(approval.approve_articles(queryset)))
+
+    def changelist_view(self, request, extra_context=None):
+        # list_editable saves rows one by one; notify subscribers once
+        with approval.coalesce_approvals():
+            return super().changelist_view(request, extra_context)
 
     approve_articles.short_description = "Approve selected articles"
 
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index instead of icontains scans over search_fields
+        if not search_term:
+            return queryset, False
+        return search.get_backend().search(queryset, "article", search_term), False
+
     def get_readonly_fields(self, request, obj=None):
         if request.user.role != "editor":
             return ("approved",)
@@ -57,7 +73,7 @@ class ArticleAdmin(admin.ModelAdmin):
 # ************** PUBLISHER  ADMIN **************
 @admin.register(Publisher)
 class PublisherAdmin(admin.ModelAdmin):
-    list_display = ("name",)
+    list_display = ("name", "subscriber_count")
     search_fields = ("name",)
 
 
@@ -66,3 +82,16 @@ class PublisherAdmin(admin.ModelAdmin):
 class NewsletterAdmin(admin.ModelAdmin):
     list_display = ("title", "publisher", "created_at")
     search_fields = ("title", "content")
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.get_backend().search(queryset, "newsletter", search_term), False
+
+
+# ************** OUTBOX  ADMIN **************
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ("kind", "status", "attempts", "available_at", "created_at")
+    list_filter = ("kind", "status")
+    readonly_fields = ("created_at", "delivered_at", "locked_at", "last_error")
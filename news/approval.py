@@ -0,0 +1,133 @@
+"""
+Editorial approval of articles, one at a time or in bulk.
+
+Bulk approval flips every selected article with a single UPDATE and queues
+one coalesced email per subscriber listing all the newly approved articles
+they follow, instead of one save, one subscriber query and one email per
+article. Inside ``coalesce_approvals()`` the per-article ``post_save``
+signal buffers approvals the same way, which covers code paths that still
+save articles one by one (the admin ``list_editable`` changelist).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import live, metrics, sync
+from .models import Article, OutboxMessage
+from .notifications import count_audience
+from .outbox import (
+    approval_messages,
+    enqueue_article_approved,
+    enqueue_articles_approved,
+)
+
+_state = threading.local()
+
+
+class ApprovalResult:
+    '''What one bulk approval did, for reporting back to the editor'''
+
+    def __init__(self, article_ids, recipients, messages, elapsed):
+        self.article_ids = article_ids
+        self.recipients = recipients
+        self.messages = messages
+        self.elapsed = elapsed
+
+    def __str__(self):
+        return (
+            f"Approved {len(self.article_ids)} article(s) in "
+            f"{self.elapsed * 1000:.0f} ms; {self.recipients} subscriber "
+            f"notification(s) queued in {self.messages} outbox message(s)."
+        )
+
+
+def count_recipients(article_ids):
+    ''' Distinct subscriber addresses that will hear about ``article_ids``,
+        i.e. the number of notification emails the coalesced message sends
+    '''
+    return count_audience(
+        Article.objects.filter(pk__in=article_ids).only("publisher", "journalist")
+    )
+
+
+def approve_articles(queryset):
+    ''' Approve every pending article in ``queryset`` with one UPDATE and
+        queue their notifications once the transaction commits
+    '''
+    started = time.monotonic()
+    with transaction.atomic():
+        article_ids = list(
+            queryset.filter(approved=False)
+            .select_for_update()
+            .values_list("pk", flat=True)
+        )
+        messages = 0
+        if article_ids:
+            # update() skips auto_now, bump it so cached detail pages refresh
+            Article.objects.filter(pk__in=article_ids).update(
+                approved=True, updated_at=timezone.now()
+            )
+            # update() sends no signals, record the change for sync clients
+            sync.log_article_ids(article_ids)
+            batch = approval_messages(article_ids)
+            messages = len(batch)
+            transaction.on_commit(partial(OutboxMessage.objects.bulk_create, batch))
+            publish_live(article_ids)
+            metrics.approvals.inc(len(article_ids), mode="bulk")
+
+    recipients = count_recipients(article_ids) if article_ids else 0
+    elapsed = time.monotonic() - started
+    if article_ids:
+        metrics.log_event(
+            "articles_approved", mode="bulk", articles=len(article_ids),
+            recipients=recipients, messages=messages, seconds=round(elapsed, 4),
+        )
+    return ApprovalResult(article_ids, recipients, messages, elapsed)
+
+
+@contextmanager
+def coalesce_approvals():
+    ''' Buffer approval notifications raised by ``post_save`` inside the
+        block and queue them as one coalesced batch at the end
+    '''
+    if getattr(_state, "pending", None) is not None:
+        yield  # nested, the outer block flushes
+        return
+
+    _state.pending = []
+    try:
+        yield
+    finally:
+        article_ids, _state.pending = _state.pending, None
+    if article_ids:
+        transaction.on_commit(partial(enqueue_articles_approved, article_ids))
+        publish_live(article_ids)
+
+
+def article_approved(article_id):
+    ''' Called by the post_save signal for an approved article '''
+    pending = getattr(_state, "pending", None)
+    if pending is not None:
+        if article_id not in pending:
+            pending.append(article_id)
+            metrics.approvals.inc(mode="coalesced")
+        return
+
+    transaction.on_commit(partial(enqueue_article_approved, article_id))
+    publish_live([article_id])
+    metrics.approvals.inc(mode="single")
+    metrics.log_event("articles_approved", mode="single", articles=1)
+
+
+def publish_live(article_ids):
+    ''' Push to open live streams after commit; a broker failure must not
+        break the approval
+    '''
+    transaction.on_commit(
+        partial(live.publish_articles, article_ids), robust=True
+    )
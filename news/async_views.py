@@ -0,0 +1,267 @@
+"""
+Async-native versions of the read-heavy views.
+
+Under ASGI a sync view occupies a thread of the ``sync_to_async`` pool for
+its whole duration, so one worker serves only as many concurrent readers
+as it has threads. These views await the ORM (``aget``, ``async for``),
+the session/user lookup (``request.auser()``) and the cache instead, and
+keep the event loop free while they wait.
+
+Each route is switched on by listing its URL name in ``NEWS_ASYNC_VIEWS``
+(see ``news/urls.py``). Behaviour, templates, ETags and authorization
+rules are those of the sync views in ``news/views.py``; the role checks
+are shared, and the user's membership id sets are loaded asynchronously
+up front so the shared checks run without a query. Under WSGI keep the
+sync views: Django would run these through ``async_to_sync`` per request.
+"""
+
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseForbidden, JsonResponse
+from django.shortcuts import render
+from rest_framework.authtoken.models import Token
+from rest_framework.utils.urls import replace_query_param
+
+from .caching import arender_body
+from .conditional import aconditional, apage_validators, make_validators
+from .counters import arecord_view
+from .feed import FEED_PAGINATION_KEY, feed_enabled
+from .models import Article, Newsletter
+from .pagination import DEFAULT_KEY, apaginate_keyset, apaginate_request, page_size_from
+from .serializers import ArticleSerializer, article_values
+from .views import (
+    article_access_error,
+    article_rows_response,
+    fast_rows,
+    newsletter_context,
+    preview_length,
+    reader_feed,
+    subscription_context,
+    visible_articles,
+    visible_newsletters,
+)
+
+ASYNC_VIEW_NAMES = (
+    "article_list",
+    "article_detail",
+    "newsletter_list",
+    "newsletter_detail",
+    "subscribed-articles",
+)
+
+
+async def request_user(request):
+    ''' The authenticated user, also set as ``request.user`` so templates
+        and the shared sync helpers do not trigger a lazy sync lookup
+    '''
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+async def load_memberships(user):
+    ''' Load the id sets the role checks and list templates need '''
+    if user.role == "reader":
+        await user.asubscribed_publisher_ids()
+        await user.asubscribed_journalist_ids()
+    elif user.role == "journalist":
+        await user.aowned_newsletter_ids()
+
+
+""" # ******************** ARTICLES ********************"""
+
+
+@login_required
+async def article_list(request):
+    ''' Async ``views.article_list`` '''
+    user = await request_user(request)
+    await load_memberships(user)
+
+    articles = visible_articles(user)
+    context = subscription_context(user)
+    validators = await apage_validators(
+        request, articles, user.pk, user.role, request.get_full_path(),
+        *(tuple(sorted(ids)) for ids in context.values()),
+    )
+
+    async def build():
+        page = await apaginate_request(request, articles.for_listing())
+        return render(
+            request,
+            "news/article_list.html",
+            {"articles": page, "page": page, **context},
+        )
+
+    return await aconditional(request, validators, build)
+
+
+@login_required
+async def article_detail(request, article_id):
+    ''' Async ``views.article_detail`` '''
+    user = await request_user(request)
+    try:
+        article = await Article.objects.only(
+            "approved", "publisher", "journalist", "updated_at"
+        ).aget(id=article_id)
+    except Article.DoesNotExist:
+        raise Http404("No Article matches the given query.")
+
+    await load_memberships(user)
+    forbidden = article_access_error(user, article)
+    if forbidden is not None:
+        return forbidden
+    if request.method == "GET":
+        await arecord_view(article.pk)
+
+    async def build():
+        body = await arender_body(
+            "article", article.pk, article.updated_at, "news/article_body.html",
+            lambda: Article.objects.select_related("publisher", "journalist").aget(
+                pk=article.pk
+            ),
+        )
+        return render(
+            request, "news/article_detail.html", {"article": article, "body": body}
+        )
+
+    validators = make_validators(article.updated_at, "article", article.pk, user.pk)
+    return await aconditional(request, validators, build)
+
+
+""" # ******************** NEWSLETTERS ********************"""
+
+
+@login_required
+async def newsletter_list(request):
+    ''' Async ``views.newsletter_list`` '''
+    user = await request_user(request)
+    await load_memberships(user)
+
+    newsletters = visible_newsletters(user)
+    context = newsletter_context(user)
+    validators = await apage_validators(
+        request, newsletters, user.pk, user.role, request.get_full_path(),
+        *(tuple(sorted(ids)) for ids in context.values()),
+    )
+
+    async def build():
+        page = await apaginate_request(request, newsletters.for_listing())
+        return render(
+            request,
+            "news/newsletter_list.html",
+            {"newsletters": page, "page": page, **context},
+        )
+
+    return await aconditional(request, validators, build)
+
+
+@login_required
+async def newsletter_detail(request, newsletter_id):
+    ''' Async ``views.newsletter_detail`` '''
+    user = await request_user(request)
+    try:
+        newsletter = await Newsletter.objects.only("publisher", "updated_at").aget(
+            id=newsletter_id
+        )
+    except Newsletter.DoesNotExist:
+        raise Http404("No Newsletter matches the given query.")
+
+    # Readers can only view subscribed newsletters
+    if user.role == "reader":
+        await load_memberships(user)
+        if not (
+            user.is_subscribed_to_publisher(newsletter.publisher_id)
+            or await newsletter.owning_journalists.filter(
+                pk__in=user.subscribed_journalist_ids()
+            ).aexists()
+        ):
+            return HttpResponseForbidden("You are not subscribed to this newsletter.")
+
+    async def build():
+        body = await arender_body(
+            "newsletter", newsletter.pk, newsletter.updated_at,
+            "news/newsletter_body.html",
+            lambda: Newsletter.objects.select_related("publisher").aget(
+                pk=newsletter.pk
+            ),
+        )
+        return render(
+            request,
+            "news/newsletter_detail.html",
+            {"newsletter": newsletter, "body": body},
+        )
+
+    validators = make_validators(
+        newsletter.updated_at, "newsletter", newsletter.pk, user.pk
+    )
+    return await aconditional(request, validators, build)
+
+
+""" # ******************** API ********************"""
+
+
+async def api_user(request):
+    ''' The user of a token (``Authorization: Token <key>``) or session.
+        Returns None when unauthenticated or the token is invalid.
+    '''
+    scheme, _, key = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "token" and key:
+        try:
+            token = await Token.objects.select_related("user").aget(key=key.strip())
+        except Token.DoesNotExist:
+            return None
+        return token.user if token.user.is_active else None
+    user = await request_user(request)
+    return user if user.is_authenticated else None
+
+
+async def subscribed_articles_api(request):
+    ''' Async ``SubscribedArticlesAPIView``: same JSON, cursors and ETags.
+        Supports token and session authentication, GET only.
+    '''
+    if request.method not in ("GET", "HEAD"):
+        return JsonResponse(
+            {"detail": f'Method "{request.method}" not allowed.'}, status=405
+        )
+    user = await api_user(request)
+    if user is None:
+        response = JsonResponse(
+            {"detail": "Authentication credentials were not provided."}, status=401
+        )
+        response["WWW-Authenticate"] = "Token"
+        return response
+    request.user = user
+
+    await load_memberships(user)
+    articles = reader_feed(user)
+    key = FEED_PAGINATION_KEY if feed_enabled() else DEFAULT_KEY
+    validators = await apage_validators(
+        request, articles, user.pk, request.get_full_path(),
+        *(tuple(sorted(ids)) for ids in subscription_context(user).values()),
+        key=key,
+    )
+
+    async def build():
+        preview = preview_length(request)
+        rows = fast_rows(preview)
+        page = await apaginate_keyset(
+            article_values(articles, key, preview) if rows else articles,
+            request.GET.get("cursor"),
+            page_size_from(request),
+            key,
+        )
+        next_link = None
+        if page.has_next:
+            next_link = replace_query_param(
+                request.build_absolute_uri(), "cursor", page.next_cursor
+            )
+        if rows:
+            return article_rows_response(
+                page.object_list, next_link, page.next_cursor, preview
+            )
+        return JsonResponse({
+            "next": next_link,
+            "next_cursor": page.next_cursor,
+            "results": ArticleSerializer(page.object_list, many=True).data,
+        })
+
+    return await aconditional(request, validators, build)
@@ -0,0 +1,270 @@
+"""
+Helpers shared by the benchmark management commands.
+
+Seeding uses ``bulk_create`` and bypasses ``CustomUser.save()`` and the
+signals, so it is fast but produces users without groups, articles without
+notifications and an out of date search index. Only run it against a
+scratch database.
+"""
+
+import asyncio
+import random
+import statistics
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.hashers import make_password
+from django.contrib.sessions.backends.db import SessionStore
+from django.utils import timezone
+
+from .counters import reconcile_subscriber_counts
+from .models import Article, CustomUser, Newsletter, Publisher
+
+BATCH_SIZE = 1000
+
+# Synthetic vocabulary used with Zipf-like frequencies, so words range from
+# very common to rare as in real text (matters for search benchmarks)
+SYLLABLES = ("ba", "ko", "ri", "te", "mu", "sa", "lo", "ne",
+             "di", "pa", "vu", "xe", "zo", "fi", "ga", "hu")
+VOCABULARY = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+CUM_WEIGHTS = list(accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+
+def random_text(words):
+    return " ".join(random.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=words))
+
+
+def power_law_weights(count, skew):
+    ''' Cumulative weights ``1 / rank ** skew`` for ``count`` items; a
+        ``skew`` of 0 weighs them all the same
+    '''
+    return list(accumulate(1 / rank ** skew for rank in range(1, count + 1)))
+
+
+def weighted_sample(ids, cum_weights, k):
+    ''' ``k`` distinct ids drawn with the given cumulative weights '''
+    k = min(k, len(ids))
+    if k > len(ids) // 2:
+        # Rejection would take long to reach the rare ids
+        return random.sample(ids, k)
+    chosen = set()
+    while len(chosen) < k:
+        chosen.update(random.choices(ids, cum_weights=cum_weights, k=k - len(chosen)))
+    return chosen
+
+
+def fan_out(mean, skew):
+    ''' A per-reader subscription count averaging ``mean``: Pareto
+        distributed (most readers follow a few, some follow many) when
+        ``skew`` is positive, always ``mean`` otherwise
+    '''
+    if skew <= 0 or mean <= 0:
+        return max(0, round(mean))
+    shape = 1 + 1 / skew
+    return max(1, round(mean * (shape - 1) / shape * random.paretovariate(shape)))
+
+
+def seed(publishers=10, journalists=50, readers=1000, articles=10000,
+         newsletters=1000, approved_ratio=0.9, prefix="bench", skew=1.0,
+         publishers_per_reader=3, journalists_per_reader=5):
+    ''' Bulk insert a synthetic data set and return the created counts.
+
+        Popularity follows a power law of exponent ``skew``: a few
+        publishers and journalists get most articles and subscribers, and
+        readers' subscription counts are heavy-tailed around the given
+        means. ``skew=0`` spreads everything uniformly. Call
+        ``random.seed()`` first for a reproducible data set.
+    '''
+    password = make_password(None)  # unusable, and hashed only once
+
+    Publisher.objects.bulk_create(
+        [Publisher(name=f"{prefix} publisher {i}") for i in range(publishers)],
+        batch_size=BATCH_SIZE,
+    )
+    for role, count in (("journalist", journalists), ("reader", readers)):
+        CustomUser.objects.bulk_create(
+            [
+                CustomUser(
+                    username=f"{prefix}_{role}_{i}",
+                    email=f"{prefix}_{role}_{i}@example.com",
+                    password=password,
+                    role=role,
+                )
+                for i in range(count)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+    publisher_ids = list(
+        Publisher.objects.filter(name__startswith=f"{prefix} ").values_list("pk", flat=True)
+    )
+    journalist_ids = list(
+        CustomUser.objects.filter(
+            username__startswith=f"{prefix}_journalist_"
+        ).values_list("pk", flat=True)
+    )
+
+    # Rank by a shuffled order, so popularity is unrelated to the pk
+    random.shuffle(publisher_ids)
+    random.shuffle(journalist_ids)
+    publisher_weights = power_law_weights(len(publisher_ids), skew)
+    journalist_weights = power_law_weights(len(journalist_ids), skew)
+    now = timezone.now()
+
+    def articles_iter():
+        for i in range(articles):
+            yield Article(
+                title=f"{prefix} article {i} {random_text(6)}",
+                content=random_text(80),
+                approved=random.random() < approved_ratio,
+                publisher_id=random.choices(publisher_ids, cum_weights=publisher_weights)[0],
+                journalist_id=random.choices(journalist_ids, cum_weights=journalist_weights)[0],
+            )
+
+    _bulk_insert(Article, articles_iter())
+    _bulk_insert(
+        Newsletter,
+        (
+            Newsletter(
+                title=f"{prefix} newsletter {i} {random_text(6)}",
+                content=random_text(80),
+                publisher_id=random.choices(publisher_ids, cum_weights=publisher_weights)[0],
+            )
+            for i in range(newsletters)
+        ),
+    )
+    # auto_now_add stamps every row with the same instant; spread them out
+    # so date ordering and keyset pagination behave like real data
+    spread_dates(Article, f"{prefix} article ", now)
+    spread_dates(Newsletter, f"{prefix} newsletter ", now)
+
+    subscribe_readers(
+        prefix, publisher_ids, journalist_ids, publishers_per_reader,
+        journalists_per_reader, skew,
+    )
+    # The bulk inserts bypassed the handlers that keep the counts
+    reconcile_subscriber_counts()
+    return {
+        "publishers": publishers,
+        "journalists": journalists,
+        "readers": readers,
+        "articles": articles,
+        "newsletters": newsletters,
+    }
+
+
+def _bulk_insert(model, objects):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def spread_dates(model, title_prefix, now, span_days=365):
+    pks = model.objects.filter(title__startswith=title_prefix).values_list("pk", flat=True)
+    updates = []
+    for pk in pks.iterator(chunk_size=BATCH_SIZE):
+        stamp = now - timedelta(seconds=random.randint(0, span_days * 86400))
+        updates.append(model(pk=pk, created_at=stamp, updated_at=stamp))
+        if len(updates) >= BATCH_SIZE:
+            model.objects.bulk_update(updates, ["created_at", "updated_at"])
+            updates = []
+    if updates:
+        model.objects.bulk_update(updates, ["created_at", "updated_at"])
+
+
+def subscribe_readers(prefix, publisher_ids, journalist_ids,
+                      publishers_per_reader=3, journalists_per_reader=5, skew=0):
+    ''' Subscribe every seeded reader; with ``skew`` > 0 both the targets
+        and the number of subscriptions per reader follow a power law
+        (``publisher_ids``/``journalist_ids`` are in popularity order)
+    '''
+    PublisherLink = CustomUser.subscribed_publishers.through
+    JournalistLink = CustomUser.subscribed_journalists.through
+    # Read up front: on SQLite the inserts below would share the cursor
+    reader_ids = list(CustomUser.objects.filter(
+        username__startswith=f"{prefix}_reader_"
+    ).values_list("pk", flat=True))
+    publisher_weights = power_law_weights(len(publisher_ids), skew)
+    journalist_weights = power_law_weights(len(journalist_ids), skew)
+
+    publisher_links, journalist_links = [], []
+    for reader_id in reader_ids:
+        for publisher_id in weighted_sample(
+            publisher_ids, publisher_weights, fan_out(publishers_per_reader, skew)
+        ):
+            publisher_links.append(
+                PublisherLink(customuser_id=reader_id, publisher_id=publisher_id)
+            )
+        for journalist_id in weighted_sample(
+            journalist_ids, journalist_weights, fan_out(journalists_per_reader, skew)
+        ):
+            journalist_links.append(
+                JournalistLink(from_customuser_id=reader_id, to_customuser_id=journalist_id)
+            )
+        # Flush now and then so millions of links do not pile up in memory
+        if len(publisher_links) + len(journalist_links) >= BATCH_SIZE * 10:
+            PublisherLink.objects.bulk_create(publisher_links, batch_size=BATCH_SIZE)
+            JournalistLink.objects.bulk_create(journalist_links, batch_size=BATCH_SIZE)
+            publisher_links, journalist_links = [], []
+    PublisherLink.objects.bulk_create(publisher_links, batch_size=BATCH_SIZE)
+    JournalistLink.objects.bulk_create(journalist_links, batch_size=BATCH_SIZE)
+
+
+def time_call(func, repeat=5):
+    ''' Run ``func`` ``repeat`` times and return timings in milliseconds '''
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def summarize(timings):
+    timings = sorted(timings)
+    return {
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(statistics.median(timings), 3),
+        "max_ms": round(timings[-1], 3),
+    }
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[max(0, int(len(sorted_values) * fraction) - 1)]
+
+
+""" # ******************** HTTP LOAD ********************"""
+
+
+def session_cookie(user):
+    ''' Cookie header value of a fresh logged-in session for ``user`` '''
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return f"{settings.SESSION_COOKIE_NAME}={session.session_key}"
+
+
+async def http_get(host, port, path, headers=None):
+    ''' One GET on a new connection; returns (status, body size) '''
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        lines = [f"GET {path} HTTP/1.1", f"Host: {host}:{port}", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split(b" ", 2)[1]), len(body)
+
@@ -0,0 +1,114 @@
+"""
+Read-through cache for rendered article and newsletter bodies.
+
+Detail pages are read far more often than they are edited, so the rendered
+body fragment is cached per object. Each entry stores the object's
+``updated_at`` stamp and is only served while the stamp still matches, and
+``post_save``/``post_delete`` drop entries eagerly. The bodies also show the
+publisher's name and the journalist's username; renaming either moves the
+``updated_at`` of the objects that show it (``touch``), which makes their
+cached bodies and their ETags stale. Authorization is still checked per
+request by the views; only rendering is skipped on a hit.
+"""
+
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def cache_stats():
+    ''' Hit/miss counters of this process, for tuning the cache size '''
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / lookups if lookups else None,
+    }
+
+
+def detail_cache():
+    return caches[getattr(settings, "NEWS_DETAIL_CACHE", "default")]
+
+
+def body_key(kind, pk):
+    return f"news:{kind}:{pk}:body"
+
+
+def _timeout():
+    return getattr(settings, "NEWS_DETAIL_CACHE_TIMEOUT", 3600)
+
+
+def cached_body(kind, pk, updated_at, render):
+    ''' Return the cached body for an object at version ``updated_at``,
+        calling ``render()`` and storing the result on a miss
+    '''
+    cache = detail_cache()
+    key = body_key(kind, pk)
+    stamp = updated_at.timestamp()
+
+    entry = cache.get(key)
+    if entry is not None and entry[0] == stamp:
+        _record("hits")
+        return mark_safe(entry[1])
+
+    _record("misses")
+    body = render()
+    cache.set(key, (stamp, str(body)), _timeout())
+    return body
+
+
+async def acached_body(kind, pk, updated_at, render):
+    ''' ``cached_body`` for async views, ``render`` is a coroutine function '''
+    cache = detail_cache()
+    key = body_key(kind, pk)
+    stamp = updated_at.timestamp()
+
+    entry = await cache.aget(key)
+    if entry is not None and entry[0] == stamp:
+        _record("hits")
+        return mark_safe(entry[1])
+
+    _record("misses")
+    body = await render()
+    await cache.aset(key, (stamp, str(body)), _timeout())
+    return body
+
+
+def render_body(kind, pk, updated_at, template, load):
+    ''' Cached render of ``template`` with the object returned by ``load()`` '''
+    return cached_body(
+        kind, pk, updated_at, lambda: render_to_string(template, {kind: load()})
+    )
+
+
+async def arender_body(kind, pk, updated_at, template, load):
+    ''' ``render_body`` with an async ``load()`` '''
+    async def render():
+        return render_to_string(template, {kind: await load()})
+
+    return await acached_body(kind, pk, updated_at, render)
+
+
+def invalidate(kind, pk):
+    detail_cache().delete(body_key(kind, pk))
+
+
+def touch(queryset):
+    ''' Move ``updated_at`` of every object in ``queryset``, so their cached
+        bodies and HTTP validators go stale
+    '''
+    return queryset.update(updated_at=timezone.now())
@@ -0,0 +1,95 @@
+"""
+HTTP conditional requests (ETag / Last-Modified) for pages and APIs.
+
+Validators are derived from cheap inputs -- an object's ``updated_at``, or
+the ids and ``updated_at`` of the rows on one page of a listing -- so a
+client polling an unchanged resource gets ``304 Not Modified`` before any
+template is rendered. A listing's validators are read with the same
+keyset query as the page itself, so they cost no more than the page
+however long the listing is.
+"""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .pagination import DEFAULT_KEY, page_window
+
+
+def make_validators(last_modified, *parts):
+    ''' Return (etag, last_modified) for a response built from
+        ``last_modified`` and any other inputs it depends on (user id,
+        subscriptions, query string...)
+    '''
+    stamp = last_modified.timestamp() if last_modified else None
+    digest = hashlib.md5(
+        repr((stamp,) + parts).encode(), usedforsecurity=False
+    ).hexdigest()
+    return digest, last_modified
+
+
+def _page_rows(request, queryset, key):
+    return page_window(request, queryset.values_list("pk", "updated_at"), key)
+
+
+def _page_validators(rows, parts):
+    # Rows added, changed or removed on the page change the ids or stamps
+    last_modified = max((updated_at for _, updated_at in rows), default=None)
+    return make_validators(last_modified, tuple(rows), *parts)
+
+
+def page_validators(request, queryset, *parts, key=DEFAULT_KEY):
+    ''' Validators for the page of ``queryset`` that ``request`` asks for
+        (?cursor=, ?page_size=), paged on ``key``
+    '''
+    return _page_validators(list(_page_rows(request, queryset, key)), parts)
+
+
+async def apage_validators(request, queryset, *parts, key=DEFAULT_KEY):
+    rows = [row async for row in _page_rows(request, queryset, key)]
+    return _page_validators(rows, parts)
+
+
+def _not_modified(request, etag, timestamp):
+    if request.method in ("GET", "HEAD"):
+        return get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+    return None
+
+
+def _finish(response, etag, timestamp):
+    if response.status_code == 200:
+        response["ETag"] = etag
+        if timestamp is not None:
+            response["Last-Modified"] = http_date(timestamp)
+    # Responses are per user
+    patch_vary_headers(response, ("Cookie", "Authorization"))
+    return response
+
+
+def _unpack(validators):
+    etag, last_modified = validators
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return quote_etag(etag), timestamp
+
+
+def conditional(request, validators, build):
+    ''' Answer 304 when the client's copy is current, otherwise call
+        ``build()`` and attach the validators to its response
+    '''
+    etag, timestamp = _unpack(validators)
+    response = _not_modified(request, etag, timestamp)
+    if response is not None:
+        return response
+    return _finish(build(), etag, timestamp)
+
+
+async def aconditional(request, validators, build):
+    ''' ``conditional`` for async views, ``build`` is a coroutine function '''
+    etag, timestamp = _unpack(validators)
+    response = _not_modified(request, etag, timestamp)
+    if response is not None:
+        return response
+    return _finish(await build(), etag, timestamp)
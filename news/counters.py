@@ -0,0 +1,162 @@
+"""
+Denormalised counters: subscribers per publisher and journalist, views per
+article.
+
+``subscriber_count`` on ``Publisher`` and ``CustomUser`` is kept current by
+the subscription ``m2m_changed`` handlers with atomic ``F()`` updates (see
+``news/signals.py``), so dashboards and batch sizing read a column instead
+of counting the M2M tables. Writes that bypass the signals (bulk inserts,
+raw SQL) can make it drift; ``python manage.py reconcile_counters``
+recomputes it.
+
+Article views are counted in memory and flushed to ``Article.view_count``
+every ``NEWS_VIEW_COUNT_FLUSH_INTERVAL`` seconds or
+``NEWS_VIEW_COUNT_FLUSH_SIZE`` views, one UPDATE per distinct increment,
+so a hot article is written once per flush instead of once per view and
+readers never wait on its row lock. Each process has its own buffer;
+views buffered when a process is killed are lost.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+logger = logging.getLogger(__name__)
+
+
+""" # ******************** SUBSCRIBER COUNTS ********************"""
+
+
+def change_subscriber_count(model, pks, delta):
+    ''' Add ``delta`` (may be negative) to the subscriber_count of ``pks`` '''
+    if not pks or not delta:
+        return
+    count = F("subscriber_count") + delta
+    if delta < 0:
+        # Never below zero, even when the count had drifted
+        count = Greatest(count, Value(0))
+    model.objects.filter(pk__in=pks).update(subscriber_count=count)
+
+
+def _actual_count(through, column):
+    return Coalesce(
+        Subquery(
+            through.objects.filter(**{column: OuterRef("pk")})
+            .values(column)
+            .annotate(n=Count("*"))
+            .values("n")
+        ),
+        0,
+    )
+
+
+def reconcile_subscriber_counts(publisher_model=None, user_model=None, dry_run=False):
+    ''' Recompute every subscriber_count from the M2M tables; returns the
+        number of rows that were wrong, per model. The models can be
+        passed in for use from migrations.
+    '''
+    from .models import CustomUser, Publisher
+
+    publisher_model = publisher_model or Publisher
+    user_model = user_model or CustomUser
+    targets = (
+        (publisher_model, user_model.subscribed_publishers.through, "publisher"),
+        (user_model, user_model.subscribed_journalists.through, "to_customuser"),
+    )
+    fixed = {}
+    for model, through, column in targets:
+        actual = _actual_count(through, column)
+        drifted = model.objects.annotate(actual=actual).exclude(
+            subscriber_count=F("actual")
+        )
+        fixed[model._meta.model_name] = (
+            drifted.count() if dry_run else drifted.update(subscriber_count=actual)
+        )
+    return fixed
+
+
+""" # ******************** ARTICLE VIEWS ********************"""
+
+
+class ViewCounter:
+    '''Article views of this process, waiting to be written'''
+
+    def __init__(self):
+        self.pending = defaultdict(int)
+        self.size = 0
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record(self, article_id):
+        ''' Count one view; returns True when a flush is due '''
+        with self.lock:
+            self.pending[article_id] += 1
+            self.size += 1
+            return (
+                self.size >= getattr(settings, "NEWS_VIEW_COUNT_FLUSH_SIZE", 1000)
+                or time.monotonic() - self.flushed_at
+                >= getattr(settings, "NEWS_VIEW_COUNT_FLUSH_INTERVAL", 30)
+            )
+
+    def flush(self):
+        ''' Write the buffered views; returns the number of views written '''
+        from .models import Article
+
+        with self.lock:
+            pending, self.pending = self.pending, defaultdict(int)
+            self.size = 0
+            self.flushed_at = time.monotonic()
+        if not pending:
+            return 0
+
+        by_increment = defaultdict(list)
+        for article_id, views in pending.items():
+            by_increment[views].append(article_id)
+        try:
+            with transaction.atomic():
+                for views, article_ids in by_increment.items():
+                    # update() leaves updated_at, and so cached pages, alone
+                    Article.objects.filter(pk__in=sorted(article_ids)).update(
+                        view_count=F("view_count") + views
+                    )
+        except Exception:
+            # Keep the views for the next flush rather than dropping them
+            with self.lock:
+                for article_id, views in pending.items():
+                    self.pending[article_id] += views
+                    self.size += views
+            raise
+        return sum(pending.values())
+
+
+view_counter = ViewCounter()
+
+
+def record_view(article_id):
+    if view_counter.record(article_id):
+        flush_views()
+
+
+async def arecord_view(article_id):
+    if view_counter.record(article_id):
+        await sync_to_async(flush_views)()
+
+
+def flush_views():
+    try:
+        return view_counter.flush()
+    except Exception as e:
+        logger.error("Could not write article view counts: %s", e)
+        return 0
+
+
+# Write what is left when the process exits normally
+atexit.register(flush_views)
@@ -0,0 +1,125 @@
+"""
+Hourly and daily notification digests.
+
+Readers who chose a digest are left out of the immediate announcement
+emails. Instead the outbox worker records a ``PendingNotification`` row per
+(reader, article), and ``python manage.py send_digests --frequency hourly``
+(run from cron) reads the pending rows for that frequency with one ordered
+join, groups them per reader and sends a single email per reader listing
+everything approved since their last digest.
+"""
+
+import logging
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Left
+
+from .models import PendingNotification
+from .notifications import DeliveryStats, batched, subscriber_querysets
+
+logger = logging.getLogger(__name__)
+
+DIGEST_FREQUENCIES = ("hourly", "daily")
+
+SNIPPET_LENGTH = 200
+
+
+def queue_digest_notifications(articles, chunk_size=None):
+    ''' Record every approved article for the digest readers subscribed to
+        it. Returns the number of rows written.
+    '''
+    chunk_size = chunk_size or getattr(settings, "NEWS_SUBSCRIBER_CHUNK_SIZE", 2000)
+    queued = 0
+    for article in articles:
+        for readers in subscriber_querysets(
+            article.publisher_id, article.journalist_id, DIGEST_FREQUENCIES
+        ):
+            reader_ids = readers.values_list("pk", flat=True).iterator(
+                chunk_size=chunk_size
+            )
+            for batch in batched(reader_ids, chunk_size):
+                PendingNotification.objects.bulk_create(
+                    [
+                        PendingNotification(reader_id=pk, article_id=article.pk)
+                        for pk in batch
+                    ],
+                    ignore_conflicts=True,  # approved twice, or re-queued
+                )
+                queued += len(batch)
+    return queued
+
+
+def pending_rows(frequency):
+    ''' One ordered query over every pending notification of ``frequency``,
+        with just the columns the digest needs
+    '''
+    return (
+        PendingNotification.objects.filter(
+            reader__notification_frequency=frequency, article__approved=True
+        )
+        .exclude(reader__email="")
+        .annotate(snippet=Left("article__content", SNIPPET_LENGTH))
+        .order_by("reader_id", "-article__created_at", "article_id")
+        .values_list("pk", "reader_id", "reader__email", "article__title", "snippet")
+    )
+
+
+def compose_digest(frequency, email, items, connection=None):
+    subject = f"Your {frequency} digest: {len(items)} new article(s)"
+    body = "\n\n".join(f"{title}\n{snippet}" for title, snippet in items)
+    return EmailMessage(
+        subject, body, settings.DEFAULT_FROM_EMAIL, [email], connection=connection
+    )
+
+
+def _sent(pks):
+    # A failing send leaves its rows for the next run; nothing else does
+    with transaction.atomic():
+        for chunk in batched(pks, 500):
+            PendingNotification.objects.filter(pk__in=chunk).delete()
+
+
+def send_digests(frequency, batch_size=None, connection=None, chunk_size=None):
+    ''' Send one digest per reader of ``frequency`` with pending articles,
+        ``batch_size`` messages per ``send_messages`` call over one
+        connection, deleting the rows of each batch once it is sent.
+    '''
+    if frequency not in DIGEST_FREQUENCIES:
+        raise ValueError(f"Unknown digest frequency: {frequency}")
+    batch_size = batch_size or getattr(settings, "NEWS_EMAIL_BATCH_SIZE", 100)
+    chunk_size = chunk_size or getattr(settings, "NEWS_SUBSCRIBER_CHUNK_SIZE", 2000)
+    connection = connection or get_connection()
+    stats = DeliveryStats()
+
+    # Rows no digest will list: retracted articles (approving them again
+    # queues them again) and readers without an address
+    PendingNotification.objects.filter(
+        reader__notification_frequency=frequency
+    ).filter(Q(article__approved=False) | Q(reader__email="")).delete()
+
+    def digests():
+        rows = pending_rows(frequency).iterator(chunk_size=chunk_size)
+        for (reader_id, email), group in groupby(rows, key=lambda row: row[1:3]):
+            pks, items = [], []
+            for pk, _, _, title, snippet in group:
+                pks.append(pk)
+                items.append((title, snippet))
+            yield compose_digest(frequency, email, items, connection), pks
+
+    opened = connection.open()
+    try:
+        for batch in batched(digests(), batch_size):
+            messages = [message for message, _ in batch]
+            stats.messages += connection.send_messages(messages) or 0
+            stats.recipients += len(messages)
+            _sent([pk for _, pks in batch for pk in pks])
+    finally:
+        if opened:
+            connection.close()
+
+    logger.info("%s digests sent: %s", frequency.capitalize(), stats)
+    return stats
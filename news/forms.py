@@ -14,6 +14,12 @@ class CustomUserCreationForm(UserCreationForm):
         fields = ("username", "email", "role", "password1", "password2")
 
 
+class NotificationPreferencesForm(forms.ModelForm):
+    class Meta:
+        model = CustomUser
+        fields = ["notification_frequency"]
+
+
 """ # ******************** ARTICLE FORMS ********************"""
 
 
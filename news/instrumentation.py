@@ -0,0 +1,197 @@
+"""
+Opt-in per-view instrumentation: SQL query count, database time, template
+render time, response size and total time of every request.
+
+``QueryInstrumentationMiddleware`` is always listed in ``MIDDLEWARE`` but
+raises ``MiddlewareNotUsed`` unless ``NEWS_INSTRUMENTATION`` is on, so
+Django drops it from the chain at startup and a disabled deployment pays
+nothing per request. When on, queries are counted through
+``connection.execute_wrapper``, template time by timing the outermost
+``Template.render`` of the request, and the samples are kept per URL name
+in a ring buffer of this process (``NEWS_INSTRUMENTATION_BUFFER`` per
+view). ``api/instrumentation/`` returns the aggregates to staff.
+
+``NEWS_QUERY_BUDGETS`` maps URL names to the most queries a request may
+run. Requests over budget are logged, and raise ``QueryBudgetExceeded``
+when ``NEWS_QUERY_BUDGET_STRICT`` is set, which fails the test that made
+the request.
+"""
+
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+from .benchmark import percentile
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED = "<unresolved>"
+
+# Metrics of the request being handled, for the template hook
+_current = ContextVar("news_request_metrics", default=None)
+
+_samples = {}
+_samples_lock = threading.Lock()
+
+
+def instrumentation_enabled():
+    return getattr(settings, "NEWS_INSTRUMENTATION", False)
+
+
+def query_budgets():
+    return getattr(settings, "NEWS_QUERY_BUDGETS", {})
+
+
+class QueryBudgetExceeded(Exception):
+    '''A view ran more queries than its NEWS_QUERY_BUDGETS entry allows'''
+
+
+class RequestMetrics:
+    '''What one request spent, filled in while it runs'''
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        ''' ``execute_wrapper`` hook: time and count every query '''
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+""" # ******************** TEMPLATES ********************"""
+
+_original_render = Template.render
+
+
+def _timed_render(self, context):
+    metrics = _current.get()
+    # Included templates render inside their parent; count the outermost
+    if metrics is None or metrics.rendering:
+        return _original_render(self, context)
+    metrics.rendering = True
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        metrics.template_time += time.perf_counter() - started
+        metrics.rendering = False
+
+
+def _patch_templates():
+    if Template.render is not _timed_render:
+        Template.render = _timed_render
+
+
+""" # ******************** AGGREGATES ********************"""
+
+
+def record(view, sample):
+    size = getattr(settings, "NEWS_INSTRUMENTATION_BUFFER", 500)
+    with _samples_lock:
+        if view not in _samples:
+            _samples[view] = {"count": 0, "over_budget": 0, "recent": deque(maxlen=size)}
+        entry = _samples[view]
+        entry["count"] += 1
+        entry["over_budget"] += sample["over_budget"]
+        entry["recent"].append(sample)
+
+
+def reset():
+    with _samples_lock:
+        _samples.clear()
+
+
+def view_stats():
+    ''' Per URL name: requests seen and aggregates of the recent ones '''
+    with _samples_lock:
+        snapshot = {
+            view: (entry["count"], entry["over_budget"], list(entry["recent"]))
+            for view, entry in _samples.items()
+        }
+    budgets = query_budgets()
+    stats = {}
+    for view, (count, over_budget, recent) in sorted(snapshot.items()):
+        durations = sorted(sample["duration_ms"] for sample in recent)
+        queries = [sample["queries"] for sample in recent]
+        stats[view] = {
+            "requests": count,
+            "window": len(recent),
+            "p50_ms": round(percentile(durations, 0.5), 3),
+            "p95_ms": round(percentile(durations, 0.95), 3),
+            "max_ms": round(durations[-1], 3),
+            "queries_mean": round(statistics.fmean(queries), 2),
+            "queries_max": max(queries),
+            "db_ms_mean": round(statistics.fmean(s["db_ms"] for s in recent), 3),
+            "template_ms_mean": round(statistics.fmean(s["template_ms"] for s in recent), 3),
+            "bytes_mean": round(statistics.fmean(s["bytes"] for s in recent)),
+            "query_budget": budgets.get(view),
+            "over_budget": over_budget,
+        }
+    return stats
+
+
+""" # ******************** MIDDLEWARE ********************"""
+
+
+class QueryInstrumentationMiddleware:
+    '''Record per-request metrics per URL name, see the module docstring'''
+
+    def __init__(self, get_response):
+        if not instrumentation_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _patch_templates()
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = (match.view_name if match else None) or UNRESOLVED
+        budget = query_budgets().get(view)
+        over_budget = budget is not None and metrics.queries > budget
+        record(view, {
+            "duration_ms": duration * 1000,
+            "queries": metrics.queries,
+            "db_ms": metrics.db_time * 1000,
+            "template_ms": metrics.template_time * 1000,
+            # Streaming bodies are produced after this point
+            "bytes": 0 if response.streaming else len(response.content),
+            "status": response.status_code,
+            "over_budget": over_budget,
+        })
+
+        if over_budget:
+            message = (
+                f"{view} ran {metrics.queries} queries, over its budget of {budget} "
+                f"({request.method} {request.path})"
+            )
+            if getattr(settings, "NEWS_QUERY_BUDGET_STRICT", False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
@@ -0,0 +1,177 @@
+"""
+Live feed of newly approved articles over Server-Sent Events.
+
+Approvals are published, once committed, to a broker under the topics
+``publisher:<id>`` and ``journalist:<id>``; every open ``/live/`` stream
+subscribes to the topics of the reader's subscriptions and receives each
+article once. A connection is an idle coroutine plus a small queue, so one
+ASGI worker holds thousands of them -- serve the project with an ASGI
+server (``uvicorn News_Application.asgi:application`` or daphne); under
+WSGI a stream would tie up a thread.
+
+``LocalBroker`` fans out inside one process. With several workers,
+point ``NEWS_LIVE_BROKER`` at a class with the same ``subscribe`` /
+``publish`` interface backed by Redis pub/sub or PostgreSQL
+LISTEN/NOTIFY. Missed events can be fetched with the incremental sync API.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils.module_loading import import_string
+
+from .models import Article
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    '''One connection's queue of messages for its topics'''
+
+    def __init__(self, broker, topics, maxsize):
+        self.broker = broker
+        self.topics = frozenset(topics)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def deliver(self, message):
+        ''' Thread-safe: publishers run in request or worker threads '''
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            pass  # loop closed, the connection is gone
+
+    def _put(self, message):
+        if self.queue.full():
+            # A client too slow to keep up loses the oldest events
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        ''' Next message, or None after ``timeout`` seconds '''
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    '''In-process pub/sub; reaches the connections of this process only'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.topics = defaultdict(set)
+
+    def subscribe(self, topics, maxsize=100):
+        ''' Must be called from the event loop that will read it '''
+        subscription = Subscription(self, topics, maxsize)
+        with self.lock:
+            for topic in subscription.topics:
+                self.topics[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for topic in subscription.topics:
+                subscribers = self.topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.topics[topic]
+
+    def publish(self, topics, message):
+        ''' Deliver ``message`` once to every subscriber of any of
+            ``topics``; returns the number of subscribers reached
+        '''
+        with self.lock:
+            targets = set()
+            for topic in topics:
+                targets.update(self.topics.get(topic, ()))
+        for subscription in targets:
+            subscription.deliver(message)
+        return len(targets)
+
+    def connections(self):
+        with self.lock:
+            return len(set().union(*self.topics.values())) if self.topics else 0
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            path = getattr(settings, "NEWS_LIVE_BROKER", "news.live.LocalBroker")
+            _broker = import_string(path)()
+        return _broker
+
+
+""" # ******************** PUBLISHING ********************"""
+
+
+def article_topics(publisher_id, journalist_id):
+    return [f"publisher:{publisher_id}", f"journalist:{journalist_id}"]
+
+
+def reader_topics(user):
+    return [f"publisher:{pk}" for pk in user.subscribed_publisher_ids()] + [
+        f"journalist:{pk}" for pk in user.subscribed_journalist_ids()
+    ]
+
+
+def publish_articles(article_ids):
+    ''' Push freshly approved articles to the live streams, one query '''
+    broker = get_broker()
+    rows = Article.objects.filter(pk__in=article_ids, approved=True).values_list(
+        "pk", "title", "publisher_id", "journalist_id",
+        "publisher__name", "journalist__username",
+    )
+    published_at = time.time()
+    for pk, title, publisher_id, journalist_id, publisher, journalist in rows:
+        broker.publish(
+            article_topics(publisher_id, journalist_id),
+            {
+                "id": pk,
+                "title": title,
+                "publisher": publisher,
+                "journalist": journalist,
+                "url": reverse("article_detail", args=[pk]),
+                "published_at": published_at,
+            },
+        )
+
+
+""" # ******************** STREAMING ********************"""
+
+
+def format_event(message):
+    return f"id: {message['id']}\nevent: article\ndata: {json.dumps(message)}\n\n"
+
+
+async def event_stream(topics, keepalive=None):
+    ''' SSE body: one ``article`` event per message, and a comment line
+        every ``keepalive`` seconds so proxies keep the connection open
+    '''
+    keepalive = keepalive or getattr(settings, "NEWS_LIVE_KEEPALIVE", 15)
+    subscription = get_broker().subscribe(
+        topics, getattr(settings, "NEWS_LIVE_QUEUE_SIZE", 100)
+    )
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            message = await subscription.get(timeout=keepalive)
+            yield ": keepalive\n\n" if message is None else format_event(message)
+    finally:
+        subscription.close()
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from news.models import CustomUser
+from news.roles import ROLES, set_roles, sync_role_groups
+
+
+class Command(BaseCommand):
+    help = (
+        "Change the role of many users at once, with the group and role "
+        "separation updates CustomUser.save() makes, or with --sync-groups "
+        "put users in the group of the role they already have (needed once "
+        "for users created before roles were mapped to groups)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--role", choices=ROLES, help="The new role")
+        parser.add_argument("--users", nargs="+", metavar="USERNAME", default=[])
+        parser.add_argument(
+            "--file", help="File with one username per line"
+        )
+        parser.add_argument(
+            "--from-role", choices=ROLES, help="Every user that has this role"
+        )
+        parser.add_argument(
+            "--all", action="store_true", help="Every user (with --sync-groups)"
+        )
+        parser.add_argument(
+            "--sync-groups", action="store_true",
+            help="Fix group memberships instead of changing roles",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if bool(options["role"]) == options["sync_groups"]:
+            raise CommandError("Pass either --role or --sync-groups")
+        if options["all"] and not options["sync_groups"]:
+            raise CommandError("--all only goes with --sync-groups")
+        users = self.selected(options)
+        started = time.monotonic()
+
+        if options["sync_groups"]:
+            added = sync_role_groups(users)
+            message = f"Added {added} missing role group membership(s)"
+        else:
+            changed = set_roles(users, options["role"], options["batch_size"])
+            message = f"Changed {changed} user(s) to {options['role']}"
+        self.stdout.write(self.style.SUCCESS(
+            f"{message} in {time.monotonic() - started:.2f}s"
+        ))
+
+    def selected(self, options):
+        usernames = list(options["users"])
+        if options["file"]:
+            try:
+                with open(options["file"], encoding="utf-8") as f:
+                    usernames += [line.strip() for line in f if line.strip()]
+            except OSError as e:
+                raise CommandError(e)
+
+        if options["all"]:
+            return CustomUser.objects.all()
+        if options["from_role"]:
+            users = CustomUser.objects.filter(role=options["from_role"])
+            return users.filter(username__in=usernames) if usernames else users
+        if not usernames:
+            raise CommandError("Select users with --users, --file, --from-role or --all")
+
+        users = CustomUser.objects.filter(username__in=usernames)
+        unknown = set(usernames) - set(users.values_list("username", flat=True))
+        if unknown:
+            raise CommandError(f"Unknown user(s): {', '.join(sorted(unknown))}")
+        return users
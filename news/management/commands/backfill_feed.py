@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from news.feed import rebuild_reader_feed
+from news.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Populate the materialised reader feed table from current subscriptions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reader", type=int, action="append", dest="readers",
+            help="Only rebuild these reader ids (repeatable)",
+        )
+
+    def handle(self, *args, **options):
+        readers = CustomUser.objects.filter(role="reader")
+        if options["readers"]:
+            readers = readers.filter(pk__in=options["readers"])
+
+        total_added = total_removed = 0
+        for reader in readers.iterator():
+            added, removed = rebuild_reader_feed(reader)
+            total_added += added
+            total_removed += removed
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Feed backfilled: {total_added} entries added, {total_removed} removed"
+            )
+        )
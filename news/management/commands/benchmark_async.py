@@ -0,0 +1,156 @@
+import asyncio
+import json
+import resource
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from news.benchmark import http_get, percentile, seed, session_cookie
+from news.feed import subscription_articles
+from news.models import CustomUser, Newsletter
+
+
+class Command(BaseCommand):
+    help = (
+        "Load running servers that share this database with the read-heavy "
+        "pages of one reader and compare requests/sec and p99 latency, e.g. "
+        "'--target wsgi=http://127.0.0.1:8001 --target "
+        "asgi=http://127.0.0.1:8002' with the second started with "
+        "NEWS_ASYNC_VIEWS=all. Use a scratch database: --seed writes data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target", action="append", metavar="NAME=URL", required=True,
+            help="Server to load (repeatable)",
+        )
+        parser.add_argument(
+            "--path", action="append",
+            help="Path to request (repeatable), default: the five async-capable routes",
+        )
+        parser.add_argument("--concurrency", type=int, default=100)
+        parser.add_argument(
+            "--requests", type=int, default=2000, help="Requests per path and target"
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, metavar="ARTICLES",
+            help="Insert this many synthetic articles first",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options["target"]:
+            name, _, url = target.partition("=")
+            url = urlsplit(url)
+            if url.scheme != "http" or not name:
+                raise CommandError(f"Expected NAME=http://host:port, got {target!r}")
+            targets.append((name, url.hostname, url.port or 80))
+
+        if options["seed"]:
+            seed(
+                articles=options["seed"],
+                newsletters=max(1, options["seed"] // 10),
+                readers=max(1, options["seed"] // 100),
+            )
+
+        reader = (
+            CustomUser.objects.filter(role="reader", subscribed_publishers__isnull=False)
+            .order_by("pk")
+            .first()
+        )
+        if reader is None:
+            raise CommandError("No subscribed reader to benchmark, run with --seed N")
+        headers = {
+            "Cookie": session_cookie(reader),
+            "Authorization": f"Token {Token.objects.get_or_create(user=reader)[0].key}",
+        }
+        paths = options["path"] or self.default_paths(reader)
+
+        # Every concurrent request is a file descriptor
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = options["concurrency"] + 100
+        if soft != resource.RLIM_INFINITY and soft < wanted:
+            limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+        report = {}
+        for name, host, port in targets:
+            report[name] = {
+                path: asyncio.run(self.load(host, port, path, headers, options))
+                for path in paths
+            }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for name, results in report.items():
+            self.stdout.write(name)
+            for path, stats in results.items():
+                self.stdout.write(
+                    f"  {path:<32} {stats['rps']:>8} req/s  "
+                    f"p50 {stats['p50_ms']} ms  p99 {stats['p99_ms']} ms  "
+                    f"errors {stats['errors']}"
+                )
+        self.stdout.write(self.style.SUCCESS("Done"))
+
+    def default_paths(self, reader):
+        paths = ["/articles/", "/newsletters/", "/api/subscribed-articles/"]
+        article = subscription_articles(reader).order_by("-created_at").first()
+        if article is not None:
+            paths.insert(1, f"/articles/{article.pk}/")
+        newsletter = (
+            Newsletter.objects.filter(publisher__in=reader.subscribed_publisher_ids())
+            .order_by("-created_at")
+            .first()
+        )
+        if newsletter is not None:
+            paths.insert(-1, f"/newsletters/{newsletter.pk}/")
+        return paths
+
+    async def load(self, host, port, path, headers, options):
+        ''' Keep ``concurrency`` requests in flight until ``requests`` are done '''
+        remaining = options["requests"]
+        latencies, errors = [], 0
+
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                try:
+                    status, _ = await http_get(host, port, path, headers)
+                except (OSError, ValueError, IndexError):
+                    status = None
+                if status == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+        # Warm up caches and connection pools before measuring
+        try:
+            await asyncio.gather(*(
+                http_get(host, port, path, headers)
+                for _ in range(min(options["concurrency"], 20))
+            ))
+        except OSError as e:
+            raise CommandError(f"{host}:{port} is not reachable: {e}")
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(options["concurrency"])))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        stats = {"requests": options["requests"], "errors": errors,
+                 "rps": round(len(latencies) / elapsed, 1),
+                 "p50_ms": None, "p99_ms": None}
+        if latencies:
+            stats.update({
+                "p50_ms": round(statistics.median(latencies) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            })
+        return stats
@@ -0,0 +1,106 @@
+import json
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from news.benchmark import seed
+from news.digests import queue_digest_notifications, send_digests
+from news.models import Article, CustomUser
+from news.notifications import send_article_emails
+
+LOCMEM_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-article announcement emails with daily digests for the "
+        "latest approved articles. Mail goes to the locmem backend and every "
+        "change is rolled back. Use a scratch database: --seed writes data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed", type=int, default=0, metavar="ARTICLES",
+            help="Insert this many synthetic articles first",
+        )
+        parser.add_argument(
+            "--articles", type=int, default=50,
+            help="Number of approved articles to announce",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            seed(
+                articles=options["seed"],
+                newsletters=1,
+                readers=max(1, options["seed"] // 10),
+            )
+
+        articles = list(
+            Article.objects.approved().order_by("-created_at")[: options["articles"]]
+        )
+        if not articles:
+            raise CommandError("No approved articles, run with --seed N")
+
+        connection = get_connection(LOCMEM_BACKEND)
+        report = {"articles": len(articles)}
+        try:
+            with transaction.atomic():
+                CustomUser.objects.filter(role="reader").update(
+                    notification_frequency="immediate"
+                )
+                report["immediate"] = self.run(
+                    lambda: [
+                        send_article_emails(
+                            article, mode="individual", connection=connection
+                        )
+                        for article in articles
+                    ]
+                )
+
+                CustomUser.objects.filter(role="reader").update(
+                    notification_frequency="daily"
+                )
+
+                def digest():
+                    queue_digest_notifications(articles)
+                    return [send_digests("daily", connection=connection)]
+
+                report["daily_digest"] = self.run(digest)
+                raise Rollback
+        except Rollback:
+            pass
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for variant in ("immediate", "daily_digest"):
+            result = report[variant]
+            self.stdout.write(
+                f"{variant}: {result['messages']} message(s) in "
+                f"{result['elapsed_s']}s"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            "Digests send {:.1f}x fewer messages".format(
+                report["immediate"]["messages"]
+                / max(1, report["daily_digest"]["messages"])
+            )
+        ))
+
+    def run(self, send):
+        started = time.perf_counter()
+        all_stats = send()
+        return {
+            "messages": sum(stats.messages for stats in all_stats),
+            "elapsed_s": round(time.perf_counter() - started, 3),
+        }
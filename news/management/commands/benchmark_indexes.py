@@ -0,0 +1,105 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from news.benchmark import seed, summarize, time_call
+from news.feed import subscription_articles
+from news.models import Article, CustomUser, Newsletter, Publisher
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the hot article/newsletter queries and show their plans with and "
+        "without the composite indexes. Use a scratch database: --seed writes data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed", type=int, default=0, metavar="ARTICLES",
+            help="Insert this many synthetic articles first",
+        )
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            seed(
+                articles=options["seed"],
+                newsletters=max(1, options["seed"] // 10),
+                readers=max(1, options["seed"] // 10),
+            )
+
+        reader = CustomUser.objects.filter(role="reader").first()
+        publisher = Publisher.objects.first()
+        journalist = CustomUser.objects.filter(role="journalist").first()
+        if not (reader and publisher and journalist):
+            raise CommandError("No data to benchmark, run with --seed N")
+
+        queries = {
+            "pending_articles": lambda: Article.objects.pending().order_by(
+                "-created_at", "-pk"
+            )[:20],
+            "reader_article_list": lambda: Article.objects.approved().order_by(
+                "-created_at", "-pk"
+            )[:20],
+            "subscribed_articles": lambda: subscription_articles(reader).order_by(
+                "-created_at", "-pk"
+            )[:20],
+            "publisher_approved": lambda: Article.objects.filter(
+                publisher=publisher, approved=True
+            ).order_by("-created_at")[:20],
+            "journalist_approved": lambda: Article.objects.filter(
+                journalist=journalist, approved=True
+            ).order_by("-created_at")[:20],
+            "publisher_newsletters": lambda: Newsletter.objects.filter(
+                publisher=publisher
+            ).order_by("-created_at")[:20],
+        }
+
+        report = {"with_indexes": self.measure(queries, options["repeat"])}
+
+        # Drop the indexes inside a transaction and roll it back afterwards.
+        # SQLite and PostgreSQL run DDL transactionally.
+        if not connection.features.can_rollback_ddl:
+            self.stderr.write("Backend cannot roll back DDL, skipping the comparison")
+        else:
+            # SQLite refuses schema changes in a transaction with FK checks on
+            try:
+                with connection.constraint_checks_disabled(), transaction.atomic():
+                    with connection.schema_editor() as editor:
+                        for model in (Article, Newsletter):
+                            for index in model._meta.indexes:
+                                editor.remove_index(model, index)
+                    report["without_indexes"] = self.measure(
+                        queries, options["repeat"]
+                    )
+                    raise Rollback
+            except Rollback:
+                pass
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for variant, results in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(variant))
+            for name, result in results.items():
+                self.stdout.write(f"  {name}: {result['timing']}")
+                for line in result["plan"].splitlines():
+                    self.stdout.write(f"      {line}")
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, build in queries.items():
+            results[name] = {
+                "plan": build().explain(),
+                "timing": summarize(time_call(lambda: list(build()), repeat)),
+            }
+        return results
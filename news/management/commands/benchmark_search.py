@@ -0,0 +1,87 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from news.benchmark import VOCABULARY, seed, summarize, time_call
+from news.models import Article, CustomUser
+from news.search import BasicSearch, get_backend, rebuild, search
+
+
+class Command(BaseCommand):
+    help = (
+        "Time ranked full-text search against icontains scans, e.g. "
+        "'--seed 1000000' for the 1M article benchmark. Use a scratch "
+        "database: --seed writes data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed", type=int, default=0, metavar="ARTICLES",
+            help="Insert this many synthetic articles and re-index first",
+        )
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument(
+            "--query", action="append",
+            help="Query to time (repeatable), default: common, mid and rare words",
+        )
+        parser.add_argument(
+            "--skip-scan", action="store_true",
+            help="Do not time the icontains baseline (slow on large tables)",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            seed(
+                articles=options["seed"],
+                newsletters=max(1, options["seed"] // 100),
+                readers=max(1, options["seed"] // 100),
+            )
+            rebuild("article")
+            rebuild("newsletter")
+
+        reader = CustomUser.objects.filter(role="reader").first()
+        editor = CustomUser(role="editor")  # unsaved, sees everything
+        if reader is None or not Article.objects.exists():
+            raise CommandError("No data to benchmark, run with --seed N")
+
+        queries = options["query"] or [
+            VOCABULARY[0], VOCABULARY[100], VOCABULARY[3000],
+            f"{VOCABULARY[5]} {VOCABULARY[50]}",
+        ]
+        backend = get_backend()
+        scan = BasicSearch(None)
+
+        report = {"backend": type(backend).__name__, "articles": Article.objects.count()}
+        for query in queries:
+            first_page = {
+                "indexed_editor": lambda: search(editor, query)[:20],
+                "indexed_reader": lambda: search(reader, query)[:20],
+            }
+            if not options["skip_scan"]:
+                first_page["icontains_editor"] = lambda: scan.search(
+                    Article.objects.all(), "article", query
+                )[:20]
+            report[query] = {
+                "matches": search(editor, query).count(),
+                **{
+                    name: summarize(time_call(lambda: list(build()), options["repeat"]))
+                    for name, build in first_page.items()
+                },
+            }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{report.pop('backend')} over {report.pop('articles')} articles"
+        )
+        for query, results in report.items():
+            self.stdout.write(
+                self.style.MIGRATE_HEADING(f"{query!r}: {results.pop('matches')} matches")
+            )
+            for name, timing in results.items():
+                self.stdout.write(f"  {name}: {timing}")
@@ -0,0 +1,79 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from news.benchmark import seed, summarize, time_call
+from news.models import Article
+from news.renderers import json_dumps, orjson
+from news.serializers import ArticleSerializer, article_rows, article_values
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/sec of ArticleSerializer with the values() row path "
+        "used by the list APIs, database read and JSON encoding included. "
+        "Use a scratch database: --seed writes data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument(
+            "--seed", type=int, default=0, metavar="ARTICLES",
+            help="Insert this many synthetic articles first",
+        )
+        parser.add_argument("--preview", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            seed(articles=options["seed"], newsletters=1, readers=1)
+
+        rows = min(options["rows"], Article.objects.count())
+        if not rows:
+            raise CommandError("No articles to serialize, run with --seed N")
+
+        articles = Article.objects.order_by("-created_at", "-pk")
+        renderer = JSONRenderer()
+        preview = options["preview"]
+
+        cases = {
+            "serializer": lambda: renderer.render(
+                ArticleSerializer(
+                    articles.select_related("publisher", "journalist")[:rows], many=True
+                ).data
+            ),
+            "rows_drf_renderer": lambda: renderer.render(
+                list(article_rows(article_values(articles)[:rows]))
+            ),
+            "rows_fast_renderer": lambda: json_dumps(
+                list(article_rows(article_values(articles)[:rows]))
+            ),
+            f"rows_preview_{preview}": lambda: json_dumps(
+                list(article_rows(article_values(articles, preview=preview)[:rows], preview))
+            ),
+        }
+
+        report = {"rows": rows, "encoder": "orjson" if orjson else "json"}
+        for name, run in cases.items():
+            timings = time_call(run, options["repeat"])
+            stats = summarize(timings)
+            stats["rows_per_sec"] = round(rows / (stats["median_ms"] / 1000))
+            report[name] = stats
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"{report.pop('rows')} rows, encoder {report.pop('encoder')}")
+        baseline = report["serializer"]["rows_per_sec"]
+        for name, stats in report.items():
+            self.stdout.write(
+                f"  {name:<22} {stats['rows_per_sec']:>9} rows/s  "
+                f"median {stats['median_ms']} ms  "
+                f"x{stats['rows_per_sec'] / baseline:.1f}"
+            )
+        self.stdout.write(self.style.SUCCESS("Done"))
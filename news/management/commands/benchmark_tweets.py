@@ -0,0 +1,78 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from news.twitter import TweetQueue, TwitterClient
+from news.twitter_stub import StubTwitterServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure tweets/sec of the pooled Twitter client against a local stub "
+        "of the X API. Never contacts the real API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument(
+            "--rate", type=float, default=1000.0,
+            help="Client-side token bucket rate (tweets/sec)",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=None,
+            help="Stub rate limit per one second window (default: none)",
+        )
+        parser.add_argument(
+            "--fail-first", type=int, default=0,
+            help="Answer the first N requests with 503",
+        )
+        parser.add_argument(
+            "--latency", type=float, default=0.0,
+            help="Simulated server latency in seconds",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        with StubTwitterServer(
+            limit=options["limit"],
+            fail_first=options["fail_first"],
+            latency=options["latency"],
+        ) as server:
+            client = TwitterClient(
+                "key", "secret", "token", "token-secret",
+                base_url=server.url,
+                rate=options["rate"],
+                burst=options["workers"],
+                backoff_base=0.05,
+                pool_size=options["workers"],
+            )
+            tweets = TweetQueue(client, workers=options["workers"], maxsize=count)
+
+            started = time.perf_counter()
+            futures = [tweets.submit({"text": f"benchmark {i}"}) for i in range(count)]
+            tweets.join()
+            elapsed = time.perf_counter() - started
+            tweets.shutdown()
+            client.close()
+
+            failed = sum(1 for future in futures if future.exception() is not None)
+            report = {
+                "tweets": count,
+                "failed": failed,
+                "requests": server.requests,
+                "elapsed_s": round(elapsed, 3),
+                "tweets_per_s": round((count - failed) / elapsed, 1) if elapsed else None,
+            }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            "Posted {tweets} tweets ({failed} failed) in {elapsed_s}s using "
+            "{requests} requests: {tweets_per_s} tweets/s".format(**report)
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from news.feed import feed_diff, rebuild_reader_feed
+from news.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Compare the materialised reader feed table with current subscriptions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix", action="store_true", help="Repair inconsistent feeds"
+        )
+
+    def handle(self, *args, **options):
+        inconsistent = 0
+        # Non-readers are checked too: they must not have any feed entries
+        users = CustomUser.objects.filter(role="reader") | CustomUser.objects.filter(
+            feed_entries__isnull=False
+        )
+        for user in users.distinct().iterator():
+            missing, extra = feed_diff(user)
+            if not missing and not extra:
+                continue
+
+            inconsistent += 1
+            self.stdout.write(
+                f"{user.username}: {len(missing)} missing, {len(extra)} extra"
+            )
+            if options["fix"]:
+                rebuild_reader_feed(user)
+
+        if inconsistent and not options["fix"]:
+            raise CommandError(f"{inconsistent} inconsistent feed(s)")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Checked feeds, {inconsistent} repaired"
+                               if inconsistent else "All feeds consistent")
+        )
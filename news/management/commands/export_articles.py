@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from news.export import chunk_size, export_queryset, iter_export
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream approved articles as NDJSON or a JSON array to a file or "
+        "stdout, with the filters of api/articles/export/. Memory use does "
+        "not grow with the number of articles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=("ndjson", "json"), default="ndjson")
+        parser.add_argument("--publisher", type=int, help="Publisher id")
+        parser.add_argument("--journalist", type=int, help="Journalist id")
+        parser.add_argument("--since", help="ISO date or datetime, inclusive")
+        parser.add_argument("--until", help="ISO date or datetime, inclusive")
+        parser.add_argument("--chunk-size", type=int, default=chunk_size())
+        parser.add_argument(
+            "--output", "-o", help="File to write, default: stdout"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            articles = export_queryset(
+                options["publisher"], options["journalist"],
+                options["since"], options["until"],
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        chunks = iter_export(articles, options["format"], options["chunk_size"])
+        started = time.monotonic()
+        written = 0
+        if options["output"]:
+            with open(options["output"], "wb") as out:
+                for chunk in chunks:
+                    out.write(chunk)
+                    written += len(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk.decode(), ending="")
+                written += len(chunk)
+
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {written / 1e6:.1f} MB in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,79 @@
+import resource
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from news.importer import KINDS, Importer, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import publishers, articles or newsletters from a CSV (with a "
+        "header row) or NDJSON file, or '-' for stdin. See news/importer.py "
+        "for the columns. Each batch is committed on its own; invalid rows "
+        "are reported and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - for stdin")
+        parser.add_argument("--kind", choices=KINDS, required=True)
+        parser.add_argument(
+            "--format", choices=("csv", "ndjson"),
+            help="Input format, default: from the file extension",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--publisher", help="Publisher name for rows that do not name one"
+        )
+        parser.add_argument(
+            "--create-publishers", action="store_true",
+            help="Create publishers named by rows that do not exist yet",
+        )
+        parser.add_argument(
+            "--approve", action="store_true", help="Import articles as approved"
+        )
+        parser.add_argument(
+            "--notify", action="store_true",
+            help="Queue approval emails and tweets for approved articles "
+            "(a back catalogue normally should not notify anyone)",
+        )
+        parser.add_argument(
+            "--show-errors", type=int, default=20, help="Invalid rows to list"
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"]
+        if fmt is None:
+            if path == "-" or not path.endswith((".csv", ".ndjson", ".jsonl")):
+                raise CommandError("Cannot tell the input format, pass --format")
+            fmt = "csv" if path.endswith(".csv") else "ndjson"
+
+        importer = Importer(
+            options["kind"],
+            batch_size=options["batch_size"],
+            default_publisher=options["publisher"],
+            create_publishers=options["create_publishers"],
+            approve=options["approve"],
+            notify=options["notify"],
+        )
+        stream = sys.stdin if path == "-" else open(path, newline="", encoding="utf-8")
+        try:
+            stats = importer.run(read_rows(stream, fmt))
+        except (OSError, ValueError) as e:
+            raise CommandError(
+                f"{e} (batches before this point were committed: "
+                f"{importer.stats.created} created)"
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        for line, message in stats.errors[: options["show_errors"]]:
+            self.stderr.write(f"Row {line}: {message}")
+        if len(stats.errors) > options["show_errors"]:
+            self.stderr.write(f"... and {len(stats.errors) - options['show_errors']} more")
+
+        # ru_maxrss is in kilobytes on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(f"{stats}, peak memory {peak:.0f} MB"))
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import resource
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand, CommandError
+
+from news.benchmark import percentile, session_cookie
+from news.models import Article, CustomUser, Publisher
+
+
+class Command(BaseCommand):
+    help = (
+        "Open N concurrent /live/ streams against a running ASGI server that "
+        "shares this database, approve articles through it and measure how "
+        "long each event takes to reach every connection. Creates loadtest_* "
+        "users and articles: use a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000")
+        parser.add_argument("--connections", type=int, default=1000)
+        parser.add_argument("--articles", type=int, default=5)
+        parser.add_argument(
+            "--interval", type=float, default=1.0,
+            help="Seconds between approvals",
+        )
+        parser.add_argument(
+            "--timeout", type=float, default=30.0,
+            help="Seconds to wait for outstanding events at the end",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme != "http":
+            raise CommandError("Only http:// URLs are supported")
+
+        # Every connection is a file descriptor
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = options["connections"] + 100
+        if soft != resource.RLIM_INFINITY and soft < wanted:
+            limit = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+
+        self.publisher, self.journalist, reader, editor = self.fixtures()
+        self.reader_cookie = session_cookie(reader)
+        self.editor_cookie = session_cookie(editor)
+
+        report = asyncio.run(self.run(url.hostname, url.port or 80, options))
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        for name, value in report.items():
+            self.stdout.write(f"{name}: {value}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['delivered']}/{report['expected']} events delivered"
+        ))
+
+    def fixtures(self):
+        publisher, _ = Publisher.objects.get_or_create(name="loadtest publisher")
+        journalist, _ = CustomUser.objects.get_or_create(
+            username="loadtest_journalist", defaults={"role": "journalist"}
+        )
+        reader, _ = CustomUser.objects.get_or_create(
+            username="loadtest_reader", defaults={"role": "reader"}
+        )
+        reader.subscribed_publishers.add(publisher)
+        editor, _ = CustomUser.objects.get_or_create(
+            username="loadtest_editor",
+            defaults={"role": "editor", "is_superuser": True, "is_staff": True},
+        )
+        return publisher, journalist, reader, editor
+
+    async def request(self, host, port, path, cookie):
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nCookie: {cookie}\r\n"
+            "Accept: text/event-stream\r\n\r\n".encode()
+        )
+        await writer.drain()
+        status = await reader.readline()
+        if b" 200 " not in status:
+            writer.close()
+            raise CommandError(f"GET {path} answered {status.decode().strip()}")
+        return reader, writer
+
+    async def listen(self, host, port, ready, latencies):
+        try:
+            stream, writer = await self.request(
+                host, port, "/live/", self.reader_cookie
+            )
+        except Exception as e:
+            ready.set_exception(e)
+            return
+        try:
+            async for line in stream:
+                if line.startswith(b"retry:"):
+                    ready.set_result(None)
+                elif line.startswith(b"data: "):
+                    event = json.loads(line[6:])
+                    latencies.append(time.time() - event["published_at"])
+        finally:
+            writer.close()
+
+    async def approve(self, host, port):
+        article = await sync_to_async(Article.objects.create)(
+            title="loadtest article", content="Load test",
+            publisher=self.publisher, journalist=self.journalist,
+        )
+        # approve_article redirects on success
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(
+            f"GET /editor/approve/{article.pk}/ HTTP/1.1\r\nHost: {host}:{port}\r\n"
+            f"Cookie: {self.editor_cookie}\r\nConnection: close\r\n\r\n".encode()
+        )
+        await writer.drain()
+        status = await reader.readline()
+        writer.close()
+        if b" 302 " not in status:
+            raise CommandError(f"Approval answered {status.decode().strip()}")
+
+    async def run(self, host, port, options):
+        connections = options["connections"]
+        latencies = []
+        ready = [asyncio.get_running_loop().create_future() for _ in range(connections)]
+
+        started = time.perf_counter()
+        listeners = [
+            asyncio.create_task(self.listen(host, port, future, latencies))
+            for future in ready
+        ]
+        try:
+            await asyncio.gather(*ready)
+        except Exception:
+            for task in listeners:
+                task.cancel()
+            raise
+        connect_time = time.perf_counter() - started
+
+        for _ in range(options["articles"]):
+            await self.approve(host, port)
+            await asyncio.sleep(options["interval"])
+
+        expected = connections * options["articles"]
+        deadline = time.monotonic() + options["timeout"]
+        while len(latencies) < expected and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+
+        for task in listeners:
+            task.cancel()
+        await asyncio.gather(*listeners, return_exceptions=True)
+
+        report = {
+            "connections": connections,
+            "connect_s": round(connect_time, 3),
+            "expected": expected,
+            "delivered": len(latencies),
+        }
+        if latencies:
+            latencies.sort()
+            report.update({
+                "latency_p50_ms": round(statistics.median(latencies) * 1000, 1),
+                "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+                "latency_max_ms": round(latencies[-1] * 1000, 1),
+            })
+        return report
@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from news import metrics
+from news.outbox import (
+    claim_batch,
+    deliver_in_process,
+    deliver_in_worker,
+    init_worker_process,
+)
+
+
+class Command(BaseCommand):
+    help = "Deliver queued notification messages (emails, tweets) from the outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=getattr(settings, "NEWS_OUTBOX_WORKERS", 4),
+            help="Number of concurrent deliveries",
+        )
+        parser.add_argument(
+            "--pool",
+            choices=("thread", "process"),
+            default=getattr(settings, "NEWS_OUTBOX_POOL", "thread"),
+            help="Run deliveries in a thread pool or a process pool",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "NEWS_OUTBOX_BATCH_SIZE", 100),
+            help="Maximum number of messages claimed per poll",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=getattr(settings, "NEWS_OUTBOX_POLL_INTERVAL", 2.0),
+            help="Seconds to sleep when the outbox is empty",
+        )
+        parser.add_argument(
+            "--metrics-port",
+            type=int,
+            help="Serve this worker's metrics in Prometheus format on "
+            "127.0.0.1:PORT",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the currently due messages and exit",
+        )
+
+    def handle(self, *args, **options):
+        if options["metrics_port"]:
+            metrics.serve(options["metrics_port"])
+
+        if options["pool"] == "process":
+            # Children must open their own connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                max_workers=options["workers"], initializer=init_worker_process
+            )
+            work = deliver_in_process
+        else:
+            executor = ThreadPoolExecutor(max_workers=options["workers"])
+            work = deliver_in_worker
+
+        delivered = failed = 0
+        started = time.monotonic()
+        try:
+            with executor:
+                while True:
+                    batch = claim_batch(options["batch_size"])
+                    if not batch:
+                        if options["once"]:
+                            break
+                        time.sleep(options["poll_interval"])
+                        continue
+
+                    for result in executor.map(work, batch):
+                        if work is deliver_in_process:
+                            result, values = result
+                            metrics.merge(values)
+                        if result:
+                            delivered += 1
+                        else:
+                            failed += 1
+        except KeyboardInterrupt:
+            pass
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Delivered {delivered} message(s), {failed} failed attempt(s) "
+                f"in {elapsed:.2f}s"
+            )
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from news.sync import prune
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete sync change log entries older than NEWS_SYNC_TOKEN_MAX_AGE; "
+        "clients with older tokens have to reset anyway"
+    )
+
+    def handle(self, *args, **options):
+        deleted = prune()
+        self.stdout.write(self.style.SUCCESS(f"Pruned {deleted} change log entries"))
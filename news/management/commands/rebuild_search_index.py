@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from news.search import SEARCHABLE, get_backend, rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of articles and newsletters"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kind", choices=tuple(SEARCHABLE), action="append",
+            help="Only rebuild this kind (repeatable), default: all",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.create_tables()  # in case they were dropped
+        for kind in options["kind"] or SEARCHABLE:
+            indexed = rebuild(kind, options["batch_size"])
+            self.stdout.write(f"{kind}: {indexed} indexed")
+
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
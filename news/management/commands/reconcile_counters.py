@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from news.counters import reconcile_subscriber_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalised subscriber counts of publishers and "
+        "journalists from the subscription tables, e.g. after bulk loads "
+        "or raw SQL that bypassed the m2m_changed handlers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report how many counts are wrong",
+        )
+
+    def handle(self, *args, **options):
+        fixed = reconcile_subscriber_counts(dry_run=options["dry_run"])
+        verb = "wrong" if options["dry_run"] else "corrected"
+        self.stdout.write(self.style.SUCCESS(
+            "; ".join(f"{n} {model} count(s) {verb}" for model, n in fixed.items())
+        ))
@@ -0,0 +1,275 @@
+import json
+import platform
+import resource
+import statistics
+import time
+import tracemalloc
+from itertools import cycle
+
+import django
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from news.benchmark import percentile
+from news.models import Article, CustomUser, Newsletter, Publisher
+from news.urls import ASYNC_VIEWS
+from news.views import reader_feed
+
+CASES = (
+    "article_list",
+    "article_detail",
+    "subscribed_api",
+    "newsletter_list",
+    "approve_article",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the main views through the test client against the current "
+        "database (see seed_benchmark) and report latency percentiles, "
+        "query counts and memory as JSON for regression tracking. "
+        "approve_article approves pending articles: use a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--case", action="append", choices=CASES,
+            help="Case to run (repeatable), default: all",
+        )
+        parser.add_argument("--requests", type=int, default=50, help="Per case")
+        parser.add_argument("--warmup", type=int, default=5, help="Untimed, per case")
+        parser.add_argument(
+            "--reader",
+            help="Username of the reader, default: the one with the most subscriptions",
+        )
+        parser.add_argument("--output", "-o", help="Also write the report to this file")
+        parser.add_argument(
+            "--baseline", help="Report of an earlier run to compare against"
+        )
+        parser.add_argument(
+            "--max-regression", type=float, metavar="PERCENT",
+            help="With --baseline, fail when a median gets slower by more "
+            "than this or a case runs more queries",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 2:
+            raise CommandError("--requests must be at least 2")
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"]) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read the baseline: {e}")
+
+        reader = self.reader(options["reader"])
+        client = Client()
+        client.force_login(reader)
+        editor_client = Client()
+        editor_client.force_login(self.editor())
+
+        total = options["warmup"] + options["requests"]
+        feed_ids = list(
+            reader_feed(reader).order_by("-created_at").values_list("pk", flat=True)[:total]
+        )
+        pending_ids = list(
+            Article.objects.filter(approved=False).order_by("pk").values_list("pk", flat=True)[:total]
+        )
+        # One path per request; detail pages cycle through the reader's feed
+        cases = {
+            "article_list": (client.get, cycle([reverse("article_list")]), 200),
+            "article_detail": (
+                client.get,
+                (reverse("article_detail", args=[pk]) for pk in cycle(feed_ids)),
+                200,
+            ),
+            "subscribed_api": (client.get, cycle([reverse("subscribed-articles")]), 200),
+            "newsletter_list": (client.get, cycle([reverse("newsletter_list")]), 200),
+            # Each request approves another article, with its signals
+            "approve_article": (
+                editor_client.post,
+                (reverse("approve_article", args=[pk]) for pk in pending_ids),
+                302,
+            ),
+        }
+        if not feed_ids:
+            del cases["article_detail"]
+        if len(pending_ids) < total:
+            del cases["approve_article"]
+
+        selected = options["case"] or CASES
+        missing = [name for name in selected if name not in cases]
+        if missing and options["case"]:
+            raise CommandError(
+                f"Not enough data for {', '.join(missing)}: the reader needs "
+                f"approved articles and there must be {total} pending articles"
+            )
+
+        report = {
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "async_views": sorted(ASYNC_VIEWS),
+            },
+            "dataset": {
+                "publishers": Publisher.objects.count(),
+                "readers": CustomUser.objects.filter(role="reader").count(),
+                "journalists": CustomUser.objects.filter(role="journalist").count(),
+                "articles": Article.objects.count(),
+                "approved_articles": Article.objects.filter(approved=True).count(),
+                "newsletters": Newsletter.objects.count(),
+            },
+            "reader": {
+                "username": reader.username,
+                "publishers": reader.subscribed_publishers.count(),
+                "journalists": reader.subscribed_journalists.count(),
+            },
+            "cases": {},
+            "skipped": missing,
+        }
+        for name in selected:
+            if name in cases:
+                report["cases"][name] = self.run_case(
+                    *cases[name], options["warmup"], options["requests"]
+                )
+        # ru_maxrss is in kilobytes on Linux
+        report["peak_rss_mb"] = round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        )
+        if baseline is not None:
+            report["baseline"] = compare(report, baseline)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_report(report)
+
+        regressions = self.regressions(report, options["max_regression"])
+        if regressions:
+            raise CommandError("Regressed: " + ", ".join(regressions))
+
+    """ # ******************** SETUP ********************"""
+
+    def reader(self, username):
+        readers = CustomUser.objects.filter(role="reader")
+        if username:
+            reader = readers.filter(username=username).first()
+        else:
+            reader = readers.annotate(
+                subscriptions=Count("subscribed_publishers", distinct=True)
+                + Count("subscribed_journalists", distinct=True)
+            ).order_by("-subscriptions", "pk").first()
+        if reader is None:
+            raise CommandError("No such reader, run seed_benchmark first")
+        return reader
+
+    def editor(self):
+        editor, created = CustomUser.objects.get_or_create(
+            username="benchmark_editor", defaults={"role": "editor"}
+        )
+        if created:
+            editor.set_unusable_password()
+            editor.save()
+        editor.groups.add(Group.objects.get(name="editor"))
+        return editor
+
+    """ # ******************** MEASURING ********************"""
+
+    def run_case(self, send, paths, expected, warmup, requests):
+        ''' Latency, queries and allocations of ``requests`` requests '''
+        for _ in range(warmup):
+            self.expect(send(next(paths)), expected)
+
+        timings, queries = [], []
+        for _ in range(requests - 1):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = send(next(paths))
+                timings.append((time.perf_counter() - started) * 1000)
+            self.expect(response, expected)
+            queries.append(len(captured))
+
+        # The last request is traced, outside the timings (tracing is slow)
+        tracemalloc.start()
+        try:
+            self.expect(send(next(paths)), expected)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            "requests": len(timings),
+            "p50_ms": round(percentile(timings, 0.5), 3),
+            "p90_ms": round(percentile(timings, 0.9), 3),
+            "p99_ms": round(percentile(timings, 0.99), 3),
+            "max_ms": round(timings[-1], 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "queries": round(statistics.median(queries)),
+            "queries_max": max(queries),
+            "peak_alloc_kb": round(peak / 1024, 1),
+        }
+
+    @staticmethod
+    def expect(response, expected):
+        if response.status_code != expected:
+            raise CommandError(
+                f"{response.request['PATH_INFO']} returned {response.status_code}, "
+                f"expected {expected}"
+            )
+
+    """ # ******************** REPORTING ********************"""
+
+    def print_report(self, report):
+        dataset = ", ".join(f"{n} {name}" for name, n in report["dataset"].items())
+        self.stdout.write(f"{dataset}; reader {report['reader']['username']}")
+        for name, stats in report["cases"].items():
+            line = (
+                f"  {name:<16} p50 {stats['p50_ms']:>8.2f} ms  "
+                f"p90 {stats['p90_ms']:>8.2f} ms  p99 {stats['p99_ms']:>8.2f} ms  "
+                f"{stats['queries']:>3} queries  {stats['peak_alloc_kb']:>8.1f} KB"
+            )
+            change = report.get("baseline", {}).get(name)
+            if change:
+                line += f"  p50 {change['p50_change_pct']:+.1f}%"
+                line += f", queries {change['queries_change']:+d}"
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f"Peak memory {report['peak_rss_mb']} MB"))
+
+    @staticmethod
+    def regressions(report, max_regression):
+        if max_regression is None:
+            return []
+        return [
+            name for name, change in report.get("baseline", {}).items()
+            if change["p50_change_pct"] > max_regression or change["queries_change"] > 0
+        ]
+
+
+def compare(report, baseline):
+    ''' Per case change of the median latency and query count '''
+    changes = {}
+    for name, stats in report["cases"].items():
+        before = baseline.get("cases", {}).get(name)
+        if before:
+            changes[name] = {
+                "p50_change_pct": round(
+                    (stats["p50_ms"] / before["p50_ms"] - 1) * 100, 1
+                ),
+                "queries_change": stats["queries"] - before["queries"],
+            }
+    return changes
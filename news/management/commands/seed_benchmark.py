@@ -0,0 +1,102 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from news.benchmark import seed
+from news.models import CustomUser, Publisher
+from news.search import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk insert a synthetic data set for run_benchmarks and the other "
+        "benchmark commands: publishers, journalists, readers with a "
+        "power-law subscription graph, articles and newsletters. Signals "
+        "and CustomUser.save() are bypassed. Use a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--publishers", type=int, default=50)
+        parser.add_argument("--journalists", type=int, default=500)
+        parser.add_argument("--readers", type=int, default=20000)
+        parser.add_argument("--articles", type=int, default=100000)
+        parser.add_argument("--newsletters", type=int, default=5000)
+        parser.add_argument("--approved-ratio", type=float, default=0.9)
+        parser.add_argument(
+            "--skew", type=float, default=1.0,
+            help="Power-law exponent of popularity and fan-out, 0 for uniform",
+        )
+        parser.add_argument(
+            "--publishers-per-reader", type=float, default=3,
+            help="Mean publisher subscriptions per reader",
+        )
+        parser.add_argument(
+            "--journalists-per-reader", type=float, default=5,
+            help="Mean journalist subscriptions per reader",
+        )
+        parser.add_argument(
+            "--prefix", default="bench", help="Prefix of the names and usernames"
+        )
+        parser.add_argument(
+            "--random-seed", type=int, default=0,
+            help="Seed of the generator; the same seed gives the same data",
+        )
+        parser.add_argument(
+            "--index", action="store_true", help="Rebuild the search index afterwards"
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the counts as JSON"
+        )
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if options["publishers"] < 1 or options["journalists"] < 1:
+            raise CommandError("Need at least one publisher and one journalist")
+        if (
+            Publisher.objects.filter(name__startswith=f"{prefix} ").exists()
+            or CustomUser.objects.filter(username__startswith=f"{prefix}_").exists()
+        ):
+            raise CommandError(
+                f"Data with prefix {prefix!r} already exists, pass another --prefix"
+            )
+
+        random.seed(options["random_seed"])
+        started = time.monotonic()
+        counts = seed(
+            publishers=options["publishers"],
+            journalists=options["journalists"],
+            readers=options["readers"],
+            articles=options["articles"],
+            newsletters=options["newsletters"],
+            approved_ratio=options["approved_ratio"],
+            prefix=prefix,
+            skew=options["skew"],
+            publishers_per_reader=options["publishers_per_reader"],
+            journalists_per_reader=options["journalists_per_reader"],
+        )
+        readers = CustomUser.objects.filter(username__startswith=f"{prefix}_reader_")
+        counts["publisher_subscriptions"] = (
+            CustomUser.subscribed_publishers.through.objects.filter(
+                customuser__in=readers
+            ).count()
+        )
+        counts["journalist_subscriptions"] = (
+            CustomUser.subscribed_journalists.through.objects.filter(
+                from_customuser__in=readers
+            ).count()
+        )
+        if options["index"]:
+            rebuild("article")
+            rebuild("newsletter")
+        counts["seconds"] = round(time.monotonic() - started, 2)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(counts, indent=2))
+            return
+        seconds = counts.pop("seconds")
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded " + ", ".join(f"{n} {name.replace('_', ' ')}" for name, n in counts.items())
+            + f" in {seconds}s"
+        ))
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from news.digests import DIGEST_FREQUENCIES, send_digests
+
+
+class Command(BaseCommand):
+    help = (
+        "Email every reader on an hourly or daily digest the articles approved "
+        "since their last one. Schedule it from cron, e.g. hourly: "
+        "'0 * * * * manage.py send_digests --frequency hourly'"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--frequency", choices=DIGEST_FREQUENCIES, required=True
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=getattr(settings, "NEWS_EMAIL_BATCH_SIZE", 100),
+            help="Messages handed to the mail backend per call",
+        )
+
+    def handle(self, *args, **options):
+        stats = send_digests(options["frequency"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {stats.messages} {options['frequency']} digest(s) in "
+            f"{stats.elapsed:.2f}s"
+        ))
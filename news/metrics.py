@@ -0,0 +1,220 @@
+"""
+Counters and histograms for the approval fan-out, in Prometheus text format.
+
+Each stage records what it did: approvals, subscriber resolution, email
+batches, tweets (latency, retries, rate-limit pauses) and outbox
+deliveries, including the time from approval (the outbox message's
+``created_at``) to delivery that delivery SLOs are set on. Values live in
+this process; the web process serves them at ``metrics/`` and
+``process_outbox --metrics-port`` serves the worker's. Every stage also
+writes one structured (JSON) log line to the ``news.metrics`` logger.
+
+No client library is needed. Process pool workers send their values back
+to the parent with ``drain()``/``merge()``.
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; delivery can lag approval by minutes when the outbox backs off
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+           300, 900, 3600)
+
+REGISTRY = {}
+_lock = threading.Lock()
+
+
+class Metric:
+    '''A named family of values, one per combination of label values'''
+
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+        REGISTRY[name] = self
+
+    def key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes the labels {self.labels}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def label_text(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (
+            (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+            for name, value in pairs
+        )
+        return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def merge(self, values):
+        for key, amount in values.items():
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{self.label_text(key)} {value}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with _lock:
+            # [count per bucket..., count, sum]
+            state = self.values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def merge(self, values):
+        for key, other in values.items():
+            state = self.values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, value in enumerate(other):
+                state[i] += value
+
+    def samples(self):
+        for key, state in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, state):
+                le = self.label_text(key, [("le", repr(float(bound)))])
+                yield f"{self.name}_bucket{le} {count}"
+            yield f'{self.name}_bucket{self.label_text(key, [("le", "+Inf")])} {state[-2]}'
+            yield f"{self.name}_count{self.label_text(key)} {state[-2]}"
+            yield f"{self.name}_sum{self.label_text(key)} {state[-1]}"
+
+
+""" # ******************** PIPELINE METRICS ********************"""
+
+approvals = Counter(
+    "news_approvals_total", "Articles approved", ["mode"]
+)
+subscribers_resolved = Counter(
+    "news_subscribers_resolved_total", "Subscriber addresses resolved for announcements"
+)
+subscriber_seconds = Histogram(
+    "news_subscriber_resolution_seconds",
+    "Time spent resolving subscribers per announcement",
+)
+emails_sent = Counter(
+    "news_emails_sent_total", "Announcement email messages sent"
+)
+email_failures = Counter(
+    "news_email_failures_total", "Email batches that raised while sending"
+)
+email_batch_seconds = Histogram(
+    "news_email_batch_seconds", "Time per send_messages call"
+)
+tweets = Counter(
+    "news_tweets_total", "Tweet attempts by outcome", ["outcome"]
+)
+tweet_seconds = Histogram(
+    "news_tweet_seconds", "Time to post a tweet, retries and throttling included",
+    ["outcome"],
+)
+tweet_retries = Counter(
+    "news_tweet_retries_total", "Tweet requests retried", ["reason"]
+)
+rate_limit_pauses = Counter(
+    "news_tweet_rate_limit_pauses_total", "Times the X API rate limit paused tweeting"
+)
+outbox_messages = Counter(
+    "news_outbox_messages_total", "Outbox delivery attempts by outcome",
+    ["kind", "outcome"],
+)
+outbox_seconds = Histogram(
+    "news_outbox_delivery_seconds", "Handler run time per outbox message", ["kind"]
+)
+approval_to_delivery = Histogram(
+    "news_approval_to_delivery_seconds",
+    "Time from queueing at approval to successful delivery", ["kind"],
+)
+
+
+""" # ******************** EXPORT ********************"""
+
+
+def render():
+    ''' Every metric in the Prometheus text exposition format '''
+    lines = []
+    with _lock:
+        for metric in REGISTRY.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def drain():
+    ''' This process's values, reset to zero; for ``merge()`` elsewhere '''
+    with _lock:
+        values = {name: metric.values for name, metric in REGISTRY.items() if metric.values}
+        for metric in REGISTRY.values():
+            metric.values = {}
+    return values
+
+
+def merge(values):
+    with _lock:
+        for name, metric_values in values.items():
+            REGISTRY[name].merge(metric_values)
+
+
+def log_event(event, **fields):
+    ''' One structured log line, e.g. for shipping to a log pipeline '''
+    logger.info(json.dumps({"event": event, **fields}, default=str))
+
+
+def serve(port, host="127.0.0.1"):
+    ''' Serve ``render()`` over HTTP from a daemon thread; returns the server '''
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scraped every few seconds, not worth a log line
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0003_feedentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name="newsletter",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0004_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                condition=models.Q(("approved", True)),
+                fields=["-created_at", "-id"],
+                name="article_approved_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                condition=models.Q(("approved", False)),
+                fields=["-created_at", "-id"],
+                name="article_pending_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                condition=models.Q(("approved", True)),
+                fields=["publisher", "-created_at", "-id"],
+                name="article_publisher_appr_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                condition=models.Q(("approved", True)),
+                fields=["journalist", "-created_at", "-id"],
+                name="article_journalist_appr_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="newsletter",
+            index=models.Index(
+                fields=["publisher", "-created_at", "-id"],
+                name="newsletter_pub_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db import migrations
+
+# The search tables as of this migration; news/search.py maintains them
+# afterwards. Other databases search without an index.
+KINDS = {"article": "news_article", "newsletter": "news_newsletter"}
+
+
+def _rows(apps, schema_editor, kind):
+    model = apps.get_model("news", kind)
+    return model.objects.using(schema_editor.connection.alias).values_list(
+        "pk", "title", "content"
+    ).iterator(chunk_size=1000)
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            for kind in KINDS:
+                table = f"news_{kind}_fts"
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} "
+                    "USING fts5(title, content, tokenize='porter unicode61')"
+                )
+                cursor.executemany(
+                    f"INSERT INTO {table} (rowid, title, content) VALUES (%s, %s, %s)",
+                    _rows(apps, schema_editor, kind),
+                )
+
+        elif connection.vendor == "postgresql":
+            config = getattr(settings, "NEWS_SEARCH_CONFIG", "english")
+            for kind, source in KINDS.items():
+                table = f"news_{kind}_search"
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    f"object_id bigint PRIMARY KEY REFERENCES {source} (id) "
+                    "ON DELETE CASCADE, document tsvector NOT NULL)"
+                )
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_document "
+                    f"ON {table} USING GIN (document)"
+                )
+                cursor.executemany(
+                    f"INSERT INTO {table} (object_id, document) VALUES ("
+                    "%s, setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+                    "setweight(to_tsvector(%s::regconfig, %s), 'B')) "
+                    "ON CONFLICT (object_id) DO NOTHING",
+                    (
+                        (pk, config, title, config, content)
+                        for pk, title, content in _rows(apps, schema_editor, kind)
+                    ),
+                )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    suffix = {"sqlite": "fts", "postgresql": "search"}.get(connection.vendor)
+    if suffix is None:
+        return
+    with connection.cursor() as cursor:
+        for kind in KINDS:
+            cursor.execute(f"DROP TABLE IF EXISTS news_{kind}_{suffix}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0006_notification_digests"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0007_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeLogEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("article", "Article"),
+                            ("subscription", "Subscription"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("article_id", models.BigIntegerField(blank=True, null=True)),
+                ("publisher_id", models.BigIntegerField(blank=True, null=True)),
+                ("journalist_id", models.BigIntegerField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "reader",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sync_changes",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["reader", "id"], name="news_change_reader__9e7714_idx"
+                    ),
+                    models.Index(
+                        fields=["created_at"], name="news_change_created_43cdfe_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:43
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subscribers(apps, schema_editor):
+    # The subscriber counts as of this migration; news/counters.py keeps
+    # them current afterwards
+    alias = schema_editor.connection.alias
+    Publisher = apps.get_model("news", "Publisher")
+    CustomUser = apps.get_model("news", "CustomUser")
+    targets = (
+        (Publisher, CustomUser.subscribed_publishers.through, "publisher"),
+        (CustomUser, CustomUser.subscribed_journalists.through, "to_customuser"),
+    )
+    for model, through, column in targets:
+        subscribers = (
+            through.objects.using(alias)
+            .filter(**{column: OuterRef("pk")})
+            .values(column)
+            .annotate(n=Count("*"))
+            .values("n")
+        )
+        model.objects.using(alias).update(
+            subscriber_count=Coalesce(Subquery(subscribers), 0)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("news", "0008_changelog"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="article",
+            name="view_count",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="customuser",
+            name="subscriber_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="publisher",
+            name="subscriber_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_subscribers, migrations.RunPython.noop),
+    ]
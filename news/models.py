@@ -1,11 +1,29 @@
 from django.contrib.auth.models import AbstractUser, Group
 from django.db import models
-from django.contrib.auth.models import AbstractUser, Group
+from django.utils import timezone
 
 '''
 The model is for handling user roles
 '''
 
+# role -> id of the auth Group of that name, filled on first use; cleared
+# when groups are (re)created or deleted, see news/signals.py
+_role_groups = {}
+
+
+def role_group_id(role):
+    ''' Id of the Group named after ``role``, or None before it exists '''
+    if role not in _role_groups:
+        pk = Group.objects.filter(name=role).values_list("pk", flat=True).first()
+        if pk is None:
+            return None  # not created yet (e.g., before migrations)
+        _role_groups[role] = pk
+    return _role_groups[role]
+
+
+def clear_role_groups():
+    _role_groups.clear()
+
 
 class CustomUser(AbstractUser):
     '''Custom user model with role-based fields and group assignment'''
@@ -16,6 +34,16 @@ class CustomUser(AbstractUser):
     )
     role = models.CharField(max_length=20, choices=ROLE_CHOICES)
 
+    # How a reader hears about newly approved articles
+    FREQUENCY_CHOICES = (
+        ("immediate", "Immediately"),
+        ("hourly", "Hourly digest"),
+        ("daily", "Daily digest"),
+    )
+    notification_frequency = models.CharField(
+        max_length=20, choices=FREQUENCY_CHOICES, default="immediate"
+    )
+
     # Reader-specific fields
     subscribed_publishers = models.ManyToManyField(
         "Publisher", blank=True, related_name="subscribed_readers"
@@ -23,6 +51,8 @@ class CustomUser(AbstractUser):
     subscribed_journalists = models.ManyToManyField(
         "self", blank=True, symmetrical=False, related_name="subscribers"
     )
+    # Readers subscribed to this journalist, see news/counters.py
+    subscriber_count = models.PositiveIntegerField(default=0, editable=False)
 
     # Journalist-specific fields
     independent_articles = models.ManyToManyField(
@@ -32,20 +62,118 @@ class CustomUser(AbstractUser):
         "Newsletter", blank=True, related_name="owning_journalists"
     )
 
+    # ---- Membership checks ----
+    # Each relation is read once as a set of ids and kept on the instance
+    # (i.e. for the request); m2m_changed handlers drop stale sets.
+
+    def _related_ids(self, field):
+        cache = self.__dict__.setdefault("_membership_cache", {})
+        if field not in cache:
+            cache[field] = frozenset(
+                getattr(self, field).values_list("pk", flat=True)
+            )
+        return cache[field]
+
+    async def _arelated_ids(self, field):
+        # Fills the same cache, so the sync checks below cost no query after
+        cache = self.__dict__.setdefault("_membership_cache", {})
+        if field not in cache:
+            cache[field] = frozenset(
+                [pk async for pk in getattr(self, field).values_list("pk", flat=True)]
+            )
+        return cache[field]
+
+    def invalidate_membership_cache(self, field=None):
+        cache = self.__dict__.get("_membership_cache", {})
+        if field is None:
+            cache.clear()
+        else:
+            cache.pop(field, None)
+
+    def subscribed_publisher_ids(self):
+        return self._related_ids("subscribed_publishers")
+
+    def subscribed_journalist_ids(self):
+        return self._related_ids("subscribed_journalists")
+
+    def owned_article_ids(self):
+        return self._related_ids("independent_articles")
+
+    def owned_newsletter_ids(self):
+        return self._related_ids("independent_newsletters")
+
+    async def asubscribed_publisher_ids(self):
+        return await self._arelated_ids("subscribed_publishers")
+
+    async def asubscribed_journalist_ids(self):
+        return await self._arelated_ids("subscribed_journalists")
+
+    async def aowned_newsletter_ids(self):
+        return await self._arelated_ids("independent_newsletters")
+
+    def is_subscribed_to_publisher(self, publisher_id):
+        return publisher_id in self.subscribed_publisher_ids()
+
+    def is_subscribed_to_journalist(self, journalist_id):
+        return journalist_id in self.subscribed_journalist_ids()
+
+    def owns_article(self, article_id):
+        return article_id in self.owned_article_ids()
+
+    def owns_newsletter(self, newsletter_id):
+        return newsletter_id in self.owned_newsletter_ids()
+
+    # ---- Permissions ----
+    # PermissionCacheMiddleware attaches a loader that fills the backend's
+    # permission caches from the session; run once, on the first check.
+
+    def _load_permissions(self):
+        loader = self.__dict__.pop("_permissions_loader", None)
+        if loader is not None:
+            loader()
+
+    def has_perm(self, perm, obj=None):
+        self._load_permissions()
+        return super().has_perm(perm, obj)
+
+    def has_module_perms(self, app_label):
+        self._load_permissions()
+        return super().has_module_perms(app_label)
+
+    def get_all_permissions(self, obj=None):
+        self._load_permissions()
+        return super().get_all_permissions(obj)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Role as loaded, so save() only redoes the group and the role
+        # separation when the role changed
+        instance._loaded_role = instance.__dict__.get("role")
+        # Shown on the pages of their articles, see news/signals.py
+        instance._loaded_username = instance.__dict__.get("username")
+        return instance
+
     def save(self, *args, **kwargs):
+        adding = self._state.adding
+        update_fields = kwargs.get("update_fields")
+        role_changed = (
+            (update_fields is None or "role" in update_fields)
+            and (adding or self.role != getattr(self, "_loaded_role", None))
+        )
+
         # Save the user first
         super().save(*args, **kwargs)
+        # Nothing else for the usual saves, e.g. last_login at every login
+        if not role_changed:
+            return
+        self._loaded_role = self.role
 
-        # Auto-assign group based on role
-        group_name = self.role.capitalize()  # 'reader' to 'Reader'
-        try:
-            group = Group.objects.get(name=group_name)
-            self.groups.clear()  # remove previous groups
-            self.groups.add(group)
-        except Group.DoesNotExist:
-            pass  # group may not exist yet (e.g., before migrations)
+        self.assign_role_group(adding)
 
-        # Enforce role separation
+        # Enforce role separation; a new user has nothing to clear
+        if adding:
+            return
         if self.role == "reader":
             self.independent_articles.clear()
             self.independent_newsletters.clear()
@@ -54,6 +182,20 @@ class CustomUser(AbstractUser):
             self.subscribed_publishers.clear()
             self.subscribed_journalists.clear()
 
+    def assign_role_group(self, adding=False):
+        ''' Put the user in their role's group and out of the other role
+            groups; groups that are not named after a role are kept
+        '''
+        other_roles = [
+            pk for role, _ in self.ROLE_CHOICES
+            if role != self.role and (pk := role_group_id(role)) is not None
+        ]
+        if other_roles and not adding:
+            self.groups.remove(*other_roles)
+        group_id = role_group_id(self.role)
+        if group_id is not None:
+            self.groups.add(group_id)
+
 
 '''
 The model is for handling publisher name
@@ -65,6 +207,15 @@ class Publisher(models.Model):
     '''Model representing a news publisher'''
 
     name = models.CharField(max_length=255)
+    # Readers subscribed to this publisher, see news/counters.py
+    subscriber_count = models.PositiveIntegerField(default=0, editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Name as loaded; a rename changes every rendered article page
+        instance._loaded_name = instance.__dict__.get("name")
+        return instance
 
     def __str__(self):
         return self.name
@@ -75,6 +226,33 @@ The model is for handling articles data
 '''
 
 
+class ArticleQuerySet(models.QuerySet):
+    '''Reusable query building blocks for article listings'''
+
+    PREVIEW_FIELDS = (
+        "title",
+        "content",
+        "approved",
+        "created_at",
+        "publisher__name",
+        "journalist__username",
+    )
+
+    def approved(self):
+        return self.filter(approved=True)
+
+    def pending(self):
+        return self.filter(approved=False)
+
+    def for_listing(self):
+        ''' Join publisher and journalist up front and load only what the
+            list templates display, so a page costs one query
+        '''
+        return self.select_related("publisher", "journalist").only(
+            *self.PREVIEW_FIELDS
+        )
+
+
 # ARTICLE MODEL
 class Article(models.Model):
     '''Model representing a news article'''
@@ -89,6 +267,54 @@ class Article(models.Model):
         CustomUser, on_delete=models.CASCADE, related_name="journalist_articles"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Buffered and written in batches, see news/counters.py
+    view_count = models.PositiveBigIntegerField(default=0, editable=False)
+
+    objects = ArticleQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Owners as loaded, so moving an article to another publisher or
+        # journalist is also reported to the readers of the old one
+        instance._loaded_owners = (
+            instance.__dict__.get("publisher_id"),
+            instance.__dict__.get("journalist_id"),
+        )
+        # Approval as loaded, so only the save that approves it notifies
+        instance._loaded_approved = instance.__dict__.get("approved")
+        return instance
+
+    class Meta:
+        # Partial indexes: Django filters booleans as a bare "WHERE approved",
+        # which SQLite can only match against an index with that condition.
+        # Each one also covers the (created_at, id) keyset ordering.
+        indexes = [
+            # Reader listings of approved articles
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(approved=True),
+                name="article_approved_idx",
+            ),
+            # The editors' pending queue
+            models.Index(
+                fields=["-created_at", "-id"],
+                condition=models.Q(approved=False),
+                name="article_pending_idx",
+            ),
+            # Subscribed-articles lookups by publisher / journalist
+            models.Index(
+                fields=["publisher", "-created_at", "-id"],
+                condition=models.Q(approved=True),
+                name="article_publisher_appr_idx",
+            ),
+            models.Index(
+                fields=["journalist", "-created_at", "-id"],
+                condition=models.Q(approved=True),
+                name="article_journalist_appr_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -99,6 +325,15 @@ The model is for handling newsletter data
 '''
 
 
+class NewsletterQuerySet(models.QuerySet):
+    '''Reusable query building blocks for newsletter listings'''
+
+    PREVIEW_FIELDS = ("title", "content", "created_at", "publisher__name")
+
+    def for_listing(self):
+        return self.select_related("publisher").only(*self.PREVIEW_FIELDS)
+
+
 # NEWSLETTERS MODEL
 class Newsletter(models.Model):
     '''Model representing a newsletter'''
@@ -109,6 +344,177 @@ class Newsletter(models.Model):
         Publisher, on_delete=models.CASCADE, related_name="newsletters"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = NewsletterQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["publisher", "-created_at", "-id"],
+                name="newsletter_pub_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
+
+
+'''
+The model is for handling precomputed reader feeds
+'''
+
+
+# FEED ENTRY MODEL
+class FeedEntry(models.Model):
+    '''One approved article in a reader's subscribed-articles feed'''
+
+    reader = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="feed_entries"
+    )
+    article = models.ForeignKey(
+        Article, on_delete=models.CASCADE, related_name="feed_entries"
+    )
+    # Copied from the article so a reader's feed is one index range scan
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["reader", "article"], name="unique_feed_entry"
+            )
+        ]
+        indexes = [models.Index(fields=["reader", "-created_at", "-article"])]
+
+    def __str__(self):
+        return f"{self.reader} - {self.article}"
+
+
+'''
+The model is for handling the change log behind incremental sync
+'''
+
+
+# CHANGE LOG MODEL
+class ChangeLogEntry(models.Model):
+    '''Something that may have changed which articles a reader sees.
+    Article entries record the article's publisher/journalist so readers
+    only scan changes from their subscriptions; subscription entries record
+    the reader and the publisher or journalist they (un)subscribed.
+    '''
+
+    KIND_CHOICES = (
+        ("article", "Article"),
+        ("subscription", "Subscription"),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Plain ids, not foreign keys: entries must outlive deleted rows
+    article_id = models.BigIntegerField(null=True, blank=True)
+    publisher_id = models.BigIntegerField(null=True, blank=True)
+    journalist_id = models.BigIntegerField(null=True, blank=True)
+    reader = models.ForeignKey(
+        CustomUser, null=True, blank=True, on_delete=models.CASCADE,
+        related_name="sync_changes",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["reader", "id"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} change #{self.pk}"
+
+
+'''
+The model is for handling notifications waiting for a reader's digest
+'''
+
+
+# PENDING NOTIFICATION MODEL
+class PendingNotification(models.Model):
+    '''An approved article a digest reader has not been mailed about yet'''
+
+    reader = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="pending_notifications"
+    )
+    article = models.ForeignKey(
+        Article, on_delete=models.CASCADE, related_name="pending_notifications"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["reader", "article"], name="unique_pending_notification"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.reader} - {self.article}"
+
+
+'''
+The model is for handling deferred notification work
+'''
+
+
+# OUTBOX MODEL
+class OutboxMessage(models.Model):
+    '''Durable queue entry for work moved off the request path'''
+
+    KIND_CHOICES = (
+        ("email", "Email"),
+        ("tweet", "Tweet"),
+        ("feed", "Feed fan-out"),
+    )
+    STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("processing", "Processing"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default="pending"
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "available_at"])]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+'''
+The model is for handling changes to cached permissions
+'''
+
+
+# PERMISSIONS VERSION MODEL
+class PermissionsVersion(models.Model):
+    '''Change counter for permissions cached in sessions: the row without
+       a user counts changes that concern everyone (group permissions,
+       permissions), the others changes to one user's groups and
+       permissions. See news/permissions.py.
+    '''
+
+    user = models.OneToOneField(
+        CustomUser, null=True, blank=True, on_delete=models.CASCADE,
+        related_name="+",
+    )
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user or 'everyone'} v{self.version}"
@@ -0,0 +1,268 @@
+"""
+Durable outbox for notification work triggered by editorial actions.
+
+Signals only write ``OutboxMessage`` rows; ``python manage.py process_outbox``
+claims them and runs the matching handler. A message is retried with
+exponential backoff until it succeeds or runs out of attempts, and a message
+whose worker died mid-delivery is reclaimed once its lease expires, so every
+message is delivered at least once.
+"""
+
+import logging
+import random
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import metrics
+from .digests import queue_digest_notifications
+from .feed import fan_out_article, feed_enabled
+from .models import Article, OutboxMessage
+from .notifications import send_article_emails, send_batch_emails
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+
+class RetryLater(Exception):
+    """Raised by a handler that cannot run yet. The message is put back
+    for ``delay`` seconds without using up an attempt."""
+
+    def __init__(self, delay):
+        super().__init__(f"retry in {delay:.1f}s")
+        self.delay = delay
+
+
+def handler(kind):
+    """Register ``func`` as the delivery function for ``kind`` messages"""
+
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+
+    return register
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+""" # ******************** ENQUEUEING ********************"""
+
+
+def approval_messages(article_ids):
+    ''' The outbox messages announcing articles approved together.
+        Email and tweet are separate messages so a failing tweet is never
+        retried by re-sending the emails. Several articles share one email
+        message, which sends each subscriber a single email listing them.
+    '''
+    if len(article_ids) == 1:
+        email_payload = {"article_id": article_ids[0]}
+    else:
+        email_payload = {"article_ids": list(article_ids)}
+    messages = [OutboxMessage(kind="email", payload=email_payload)]
+    kinds = ["tweet", "feed"] if feed_enabled() else ["tweet"]
+    for kind in kinds:
+        messages.extend(
+            OutboxMessage(kind=kind, payload={"article_id": pk})
+            for pk in article_ids
+        )
+    return messages
+
+
+def enqueue_articles_approved(article_ids):
+    OutboxMessage.objects.bulk_create(approval_messages(article_ids))
+
+
+def enqueue_article_approved(article_id):
+    ''' Queue the email and tweet fan-out for a freshly approved article '''
+    enqueue_articles_approved([article_id])
+
+
+def enqueue_article_feed(article_id):
+    ''' Queue the feed fan-out alone, for an approved article whose
+        subscribers changed
+    '''
+    OutboxMessage.objects.create(kind="feed", payload={"article_id": article_id})
+
+
+""" # ******************** HANDLERS ********************"""
+
+
+@handler("email")
+def deliver_article_email(payload):
+    article_ids = payload.get("article_ids") or [payload["article_id"]]
+    articles = list(
+        Article.objects.filter(pk__in=article_ids).order_by("-created_at", "-pk")
+    )
+    if not articles:
+        return  # deleted since approval, nothing to announce
+
+    # Idempotent, so a retry after a failed send does not duplicate digests
+    queue_digest_notifications(articles)
+    if len(articles) == 1:
+        send_article_emails(articles[0])
+    else:
+        send_batch_emails(articles)
+
+
+@handler("tweet")
+def deliver_article_tweet(payload):
+    from .twitter import Tweet, TweetThrottled
+
+    article = Article.objects.filter(pk=payload["article_id"]).first()
+    if article is None:
+        return
+
+    # make_tweet raises on failure so the worker can retry. It must not
+    # sleep out the rate limit: past the lease another worker would
+    # reclaim the message and post the tweet twice.
+    try:
+        Tweet().make_tweet(Tweet.compose_article_tweet(article), block=False)
+    except TweetThrottled as e:
+        raise RetryLater(e.retry_after) from e
+
+
+@handler("feed")
+def deliver_article_feed(payload):
+    article = Article.objects.filter(pk=payload["article_id"]).first()
+    if article is None or not article.approved:
+        return
+
+    fan_out_article(article)
+
+
+""" # ******************** WORKER ********************"""
+
+
+def claimable(now=None):
+    ''' Messages that are due, plus messages whose lease has expired '''
+    now = now or timezone.now()
+    lease = timedelta(seconds=_setting("NEWS_OUTBOX_LEASE_SECONDS", 300))
+    return Q(status="pending", available_at__lte=now) | Q(
+        status="processing", locked_at__lt=now - lease
+    )
+
+
+def claim_batch(limit):
+    ''' Atomically mark up to ``limit`` due messages as processing and
+        return their ids. The conditional UPDATE makes claiming safe when
+        several workers poll the same table.
+    '''
+    now = timezone.now()
+    condition = claimable(now)
+    candidates = list(
+        OutboxMessage.objects.filter(condition)
+        .order_by("available_at", "pk")
+        .values_list("pk", flat=True)[:limit]
+    )
+
+    claimed = []
+    for pk in candidates:
+        updated = OutboxMessage.objects.filter(condition, pk=pk).update(
+            status="processing", locked_at=now, attempts=F("attempts") + 1
+        )
+        if updated:
+            claimed.append(pk)
+    return claimed
+
+
+def backoff_delay(attempts):
+    ''' Exponential backoff with full jitter, capped at NEWS_OUTBOX_BACKOFF_MAX '''
+    base = _setting("NEWS_OUTBOX_BACKOFF_BASE", 2)
+    cap = _setting("NEWS_OUTBOX_BACKOFF_MAX", 600)
+    return random.uniform(0, min(cap, base * 2 ** attempts))
+
+
+def deliver(pk):
+    ''' Run the handler for one claimed message and record the outcome.
+        Returns True when the message was delivered.
+    '''
+    message = OutboxMessage.objects.get(pk=pk)
+    started = time.perf_counter()
+
+    try:
+        try:
+            HANDLERS[message.kind](message.payload)
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.outbox_seconds.observe(elapsed, kind=message.kind)
+            now = timezone.now()
+    except RetryLater as e:
+        message.status = "pending"
+        message.available_at = now + timedelta(seconds=e.delay)
+        message.locked_at = None
+        # Not a failure, give the attempt back
+        message.attempts = F("attempts") - 1
+        message.save(update_fields=["status", "available_at", "locked_at", "attempts"])
+        metrics.outbox_messages.inc(kind=message.kind, outcome="deferred")
+        metrics.log_event(
+            "outbox_message", id=pk, kind=message.kind, outcome="deferred",
+            seconds=round(elapsed, 4), retry_in=round(e.delay, 4),
+        )
+        return False
+    except Exception as e:
+        message.last_error = f"{type(e).__name__}: {e}"
+        if message.attempts >= _setting("NEWS_OUTBOX_MAX_ATTEMPTS", 8):
+            message.status = "failed"
+            logger.error("Outbox message %s failed permanently: %s", pk, e)
+        else:
+            message.status = "pending"
+            message.available_at = now + timedelta(
+                seconds=backoff_delay(message.attempts)
+            )
+            logger.warning("Outbox message %s will be retried: %s", pk, e)
+        message.locked_at = None
+        message.save(
+            update_fields=["status", "available_at", "locked_at", "last_error"]
+        )
+        outcome = "failed" if message.status == "failed" else "retried"
+        metrics.outbox_messages.inc(kind=message.kind, outcome=outcome)
+        metrics.log_event(
+            "outbox_message", id=pk, kind=message.kind, outcome=outcome,
+            attempts=message.attempts, seconds=round(elapsed, 4),
+            error=message.last_error,
+        )
+        return False
+
+    message.status = "done"
+    message.delivered_at = now
+    message.locked_at = None
+    message.save(update_fields=["status", "delivered_at", "locked_at"])
+    # created_at is when the approval committed and queued the message
+    lag = (now - message.created_at).total_seconds()
+    metrics.outbox_messages.inc(kind=message.kind, outcome="delivered")
+    metrics.approval_to_delivery.observe(lag, kind=message.kind)
+    metrics.log_event(
+        "outbox_message", id=pk, kind=message.kind, outcome="delivered",
+        attempts=message.attempts, seconds=round(elapsed, 4),
+        since_approval_seconds=round(lag, 4),
+    )
+    return True
+
+
+def deliver_in_worker(pk):
+    ''' Pool entry point: deliver, then release the worker's DB connection '''
+    try:
+        return deliver(pk)
+    finally:
+        close_old_connections()
+
+
+def deliver_in_process(pk):
+    ''' Process pool entry point: also hands this child's metrics to the
+        parent, which serves them
+    '''
+    return deliver_in_worker(pk), metrics.drain()
+
+
+def init_worker_process():
+    ''' Process pool initializer for spawn/forkserver start methods '''
+    import django
+
+    django.setup()
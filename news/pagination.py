@@ -0,0 +1,227 @@
+"""
+Keyset (cursor) pagination, newest first.
+
+Pages are selected with ``WHERE (created_at, id) < (cursor)`` instead of an
+OFFSET, so fetching any page costs the same regardless of how deep it is and
+rows inserted while a client pages through cannot shift or duplicate items.
+The cursor handed to clients is an opaque url-safe token.
+
+Ranked results (search) have no stable keyset and use ``paginate_ranked``,
+a capped ?page= OFFSET pagination, instead.
+"""
+
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+DEFAULT_KEY = ("created_at", "pk")
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    ''' Return the decoded cursor values, or raise Http404 for a bad token '''
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created_at, pk = json.loads(raw)
+        created_at = parse_datetime(created_at)
+        if created_at is None or not isinstance(pk, int):
+            raise ValueError
+    except (ValueError, TypeError, binascii.Error):
+        raise Http404("Invalid cursor")
+    return created_at, pk
+
+
+def page_size_from(request):
+    ''' ?page_size= from the request, clamped to NEWS_MAX_PAGE_SIZE '''
+    default = getattr(settings, "NEWS_PAGE_SIZE", 20)
+    maximum = getattr(settings, "NEWS_MAX_PAGE_SIZE", 100)
+    try:
+        size = int(request.GET.get("page_size", default))
+    except ValueError:
+        size = default
+    return max(1, min(size, maximum))
+
+
+class KeysetPage:
+    '''One page of objects plus the cursor of the page after it'''
+
+    def __init__(self, object_list, next_cursor, next_query=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.next_query = next_query
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _keyset_queryset(queryset, cursor, page_size, key):
+    created_field, id_field = key
+    queryset = queryset.order_by(f"-{created_field}", f"-{id_field}")
+
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f"{created_field}__lt": created_at})
+            | Q(**{created_field: created_at, f"{id_field}__lt": pk})
+        )
+
+    # One extra row tells us whether another page exists
+    return queryset[: page_size + 1]
+
+
+def page_window(request, queryset, key=DEFAULT_KEY):
+    ''' The rows the page ``request`` asks for is read from: the page plus
+        the one after it
+    '''
+    return _keyset_queryset(
+        queryset, request.GET.get("cursor"), page_size_from(request), key
+    )
+
+
+def _keyset_page(items, page_size, key):
+    created_field, id_field = key
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        # Model instances, or dicts from a values() queryset
+        if isinstance(last, dict):
+            created_at, pk = last[created_field], last[id_field]
+        else:
+            created_at, pk = getattr(last, created_field), getattr(last, id_field)
+        next_cursor = encode_cursor([created_at.isoformat(), pk])
+    return KeysetPage(items, next_cursor)
+
+
+def paginate_keyset(queryset, cursor=None, page_size=20, key=DEFAULT_KEY):
+    ''' Return the page of ``queryset`` after ``cursor``, ordered by ``key``
+        (a timestamp field and a unique integer tiebreaker) descending.
+    '''
+    items = list(_keyset_queryset(queryset, cursor, page_size, key))
+    return _keyset_page(items, page_size, key)
+
+
+async def apaginate_keyset(queryset, cursor=None, page_size=20, key=DEFAULT_KEY):
+    items = [obj async for obj in _keyset_queryset(queryset, cursor, page_size, key)]
+    return _keyset_page(items, page_size, key)
+
+
+def _link_next(request, page):
+    if page.has_next:
+        query = request.GET.copy()
+        query["cursor"] = page.next_cursor
+        page.next_query = query.urlencode()
+    return page
+
+
+def paginate_request(request, queryset, key=DEFAULT_KEY):
+    ''' Paginate for an HTML view using ?cursor= and ?page_size= '''
+    page = paginate_keyset(
+        queryset, request.GET.get("cursor"), page_size_from(request), key
+    )
+    return _link_next(request, page)
+
+
+async def apaginate_request(request, queryset, key=DEFAULT_KEY):
+    page = await apaginate_keyset(
+        queryset, request.GET.get("cursor"), page_size_from(request), key
+    )
+    return _link_next(request, page)
+
+
+def paginate_ranked(request, queryset, max_results=None):
+    ''' Paginate an already ordered queryset by ?page= for orderings with
+        no usable keyset, such as search rank. Deep pages cost an OFFSET,
+        so results stop after NEWS_SEARCH_MAX_RESULTS.
+    '''
+    max_results = max_results or getattr(settings, "NEWS_SEARCH_MAX_RESULTS", 1000)
+    page_size = page_size_from(request)
+    try:
+        number = max(1, int(request.GET.get("page", 1)))
+    except ValueError:
+        raise Http404("Invalid page")
+
+    start = (number - 1) * page_size
+    stop = min(start + page_size, max_results)
+    items = list(queryset[start:stop + 1]) if start < stop else []
+    page = KeysetPage(items[: stop - start], None)
+    if len(items) > stop - start and stop < max_results:
+        page.next_cursor = str(number + 1)
+        query = request.GET.copy()
+        query["page"] = page.next_cursor
+        page.next_query = query.urlencode()
+    return page
+
+
+class KeysetPagination(BasePagination):
+    ''' DRF pagination using the same cursors as the HTML views.
+        Views can set ``pagination_key`` to page on annotated fields.
+    '''
+
+    def paginate_queryset(self, queryset, request, view=None):
+        key = getattr(view, "pagination_key", DEFAULT_KEY)
+        self.request = request
+        self.page = paginate_keyset(
+            queryset, request.query_params.get("cursor"), page_size_from(request), key
+        )
+        return list(self.page)
+
+    def get_next_link(self):
+        if not self.page.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, "cursor", self.page.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "next_cursor": self.page.next_cursor,
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "next_cursor": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+
+class RankedPagination(KeysetPagination):
+    ''' DRF counterpart of ``paginate_ranked``, same response shape '''
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page = paginate_ranked(request, queryset)
+        return list(self.page)
+
+    def get_next_link(self):
+        if not self.page.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, "page", self.page.next_cursor)
@@ -0,0 +1,194 @@
+"""
+Cached authorization: role and permissions resolved once per session.
+
+Django's ModelBackend reads a user's permissions with two queries (user
+and group permissions) on the first ``has_perm`` of every request, i.e.
+on every ``permission_required`` view. ``PermissionCacheMiddleware``
+replaces ``AuthenticationMiddleware`` and keeps the resolved permission
+names in the session, with the role they were resolved for. Later
+requests fill ModelBackend's own caches on the user from there when the
+view first checks a permission, so ``has_perm``/``permission_required``
+cost one version lookup instead.
+
+An entry is resolved again when:
+
+* the user's role or superuser flag differs from the one it was stored
+  with (a role change, see ``CustomUser.save``),
+* a permissions version moved. Versions are rows in the database
+  (``PermissionsVersion``), so every worker sees a change on its next
+  request: changes to groups' permissions or to permissions bump the one
+  for everyone, changes to a user's groups or permissions only theirs
+  (see ``news/signals.py``). Both are read with one query.
+* it is older than ``NEWS_PERMISSION_CACHE_TIMEOUT`` seconds, which
+  bounds staleness after changes made with raw SQL.
+
+``can_edit``/``can_delete`` answer the object-level question the article
+and newsletter views ask: editors may change anything, journalists only
+what they own, readers nothing.
+"""
+
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware, get_user
+from django.db.models import F, Q
+from django.utils.functional import SimpleLazyObject
+
+from .models import PermissionsVersion
+
+# Session key of the cached entry
+PERMISSIONS_KEY = "_news_permissions"
+
+
+def permissions_version(user_id):
+    ''' [everyone's version, the user's version]; None for never bumped '''
+    rows = dict(
+        PermissionsVersion.objects.filter(
+            Q(user__isnull=True) | Q(user=user_id)
+        ).values_list("user", "version")
+    )
+    return [rows.get(None), rows.get(user_id)]
+
+
+def bump_permissions_version(user_ids=None):
+    ''' Make the cached permissions of ``user_ids``, or of everyone for
+        None, stale
+    '''
+    if user_ids is None:
+        if not PermissionsVersion.objects.filter(user__isnull=True).update(
+            version=F("version") + 1
+        ):
+            PermissionsVersion.objects.create(version=1)
+        return
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    PermissionsVersion.objects.filter(user__in=user_ids).update(
+        version=F("version") + 1
+    )
+    # First change for these users; a concurrent bump already counts
+    PermissionsVersion.objects.bulk_create(
+        [PermissionsVersion(user_id=pk, version=1) for pk in user_ids],
+        ignore_conflicts=True,
+    )
+
+
+def _owner(user):
+    return [user.role, user.is_superuser]
+
+
+def _session_user(request, user):
+    return (
+        user.is_authenticated
+        and user.is_active
+        and request.session.get(SESSION_KEY) == user._meta.pk.value_to_string(user)
+    )
+
+
+def load_permissions(request, user):
+    ''' Fill ModelBackend's permission caches on ``user`` from the session
+        when the entry there is current. Called by ``CustomUser`` on its
+        first permission check of the request.
+    '''
+    if not _session_user(request, user):
+        return
+    entry = request.session.get(PERMISSIONS_KEY)
+    # Read before any permission is, so a change made meanwhile is seen
+    # by the next request
+    version = permissions_version(user.pk)
+    timeout = getattr(settings, "NEWS_PERMISSION_CACHE_TIMEOUT", 300)
+    if (
+        entry
+        and entry["owner"] == _owner(user)
+        and entry["version"] == version
+        and time.time() - entry["at"] < timeout
+    ):
+        user._user_perm_cache = set(entry["user"])
+        user._group_perm_cache = set(entry["group"])
+        user._perm_cache = user._user_perm_cache | user._group_perm_cache
+    else:
+        request._permissions_version = (user.pk, version)
+
+
+def store_permissions(request, user, version):
+    ''' Keep the permissions ModelBackend resolved for ``user`` during this
+        request in the session, as of ``version``
+    '''
+    if not (
+        hasattr(user, "_user_perm_cache") and hasattr(user, "_group_perm_cache")
+    ):
+        return
+    if not _session_user(request, user):
+        return
+    request.session[PERMISSIONS_KEY] = {
+        "owner": _owner(user),
+        "version": version,
+        "at": int(time.time()),
+        "user": sorted(user._user_perm_cache),
+        "group": sorted(user._group_perm_cache),
+    }
+
+
+def _with_loader(request, user):
+    # Nothing is read until the view checks a permission
+    user._permissions_loader = lambda: load_permissions(request, user)
+    return user
+
+
+class PermissionCacheMiddleware(AuthenticationMiddleware):
+    '''AuthenticationMiddleware whose request.user reads its permissions
+       from the session. Async views (request.auser()) resolve them as
+       before.
+    '''
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(
+            lambda: _with_loader(request, get_user(request))
+        )
+
+    def process_response(self, request, response):
+        loaded = getattr(request, "_permissions_version", None)
+        if loaded is not None:
+            user_id, version = loaded
+            # After login()/logout() request.user may be another user
+            if request.user.pk == user_id:
+                store_permissions(request, request.user, version)
+        return response
+
+
+""" # ******************** OBJECT PERMISSIONS ********************"""
+
+
+def _owns(user, obj):
+    if obj._meta.model_name == "article":
+        return obj.journalist_id == user.pk
+    if obj._meta.model_name == "newsletter":
+        return user.owns_newsletter(obj.pk)
+    return False
+
+
+def _may(action, user, obj):
+    if not user.is_authenticated:
+        return False
+    opts = obj._meta
+    if not user.has_perm(f"{opts.app_label}.{action}_{opts.model_name}"):
+        return False
+    if user.role == "editor":
+        return True
+    if user.role == "journalist":
+        return _owns(user, obj)
+    return False
+
+
+def can_edit(user, obj):
+    ''' Whether ``user`` may change ``obj`` (an article or newsletter):
+        editors any, journalists their own, readers none
+    '''
+    return _may("change", user, obj)
+
+
+def can_delete(user, obj):
+    ''' Like ``can_edit``, for deleting ``obj`` '''
+    return _may("delete", user, obj)
@@ -0,0 +1,99 @@
+"""
+Bulk role changes.
+
+``CustomUser.save()`` moves one user to their new role's group and clears
+what the new role may not have (a journalist's subscriptions, a reader's
+owned articles and newsletters). ``set_roles`` does the same for many
+users with a few statements per batch. Subscriptions are still cleared
+through the M2M managers, user by user and only for users that have any,
+so the feed, the sync log and the subscriber counts stay in step.
+"""
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import CustomUser, role_group_id
+from .notifications import batched
+from .permissions import bump_permissions_version
+
+ROLES = [role for role, _ in CustomUser.ROLE_CHOICES]
+
+
+def _role_group_ids():
+    return {role: pk for role in ROLES if (pk := role_group_id(role)) is not None}
+
+
+def _set_groups(user_ids, role, groups):
+    ''' Move ``user_ids`` from any role group to the one of ``role`` '''
+    Membership = CustomUser.groups.through
+    Membership.objects.filter(
+        customuser_id__in=user_ids, group_id__in=groups.values()
+    ).delete()
+    if role in groups:
+        Membership.objects.bulk_create(
+            Membership(customuser_id=pk, group_id=groups[role]) for pk in user_ids
+        )
+
+
+def set_roles(users, role, batch_size=1000):
+    ''' Give every user of the ``users`` queryset ``role``; returns how many
+        changed. Each batch is one transaction.
+    '''
+    if role not in ROLES:
+        raise ValueError(f"role must be one of {', '.join(ROLES)}")
+    groups = _role_group_ids()
+    user_ids = list(users.exclude(role=role).values_list("pk", flat=True))
+
+    for batch in batched(user_ids, batch_size):
+        with transaction.atomic():
+            CustomUser.objects.filter(pk__in=batch).update(role=role)
+            _set_groups(batch, role, groups)
+
+            if role == "reader":
+                # Nothing listens to these relations beyond the instance cache
+                CustomUser.independent_articles.through.objects.filter(
+                    customuser_id__in=batch
+                ).delete()
+                CustomUser.independent_newsletters.through.objects.filter(
+                    customuser_id__in=batch
+                ).delete()
+            elif role == "journalist":
+                subscribed = CustomUser.objects.filter(pk__in=batch).filter(
+                    Exists(CustomUser.subscribed_publishers.through.objects.filter(
+                        customuser=OuterRef("pk")
+                    ))
+                    | Exists(CustomUser.subscribed_journalists.through.objects.filter(
+                        from_customuser=OuterRef("pk")
+                    ))
+                )
+                for user in subscribed:
+                    user.subscribed_publishers.clear()
+                    user.subscribed_journalists.clear()
+    # The bulk group changes send no m2m_changed
+    bump_permissions_version(user_ids)
+    return len(user_ids)
+
+
+def sync_role_groups(users):
+    ''' Put every user of ``users`` in their role's group, and out of the
+        other role groups; returns the number of memberships added
+    '''
+    groups = _role_group_ids()
+    Membership = CustomUser.groups.through
+    added = 0
+    for role, group_id in groups.items():
+        members = users.filter(role=role)
+        Membership.objects.filter(
+            customuser__in=members,
+            group_id__in=[pk for other, pk in groups.items() if other != role],
+        ).delete()
+        missing = list(
+            members.exclude(groups=group_id).values_list("pk", flat=True)
+        )
+        Membership.objects.bulk_create(
+            [Membership(customuser_id=pk, group_id=group_id) for pk in missing],
+            batch_size=1000,
+        )
+        added += len(missing)
+    bump_permissions_version()
+    return added
@@ -0,0 +1,295 @@
+"""
+Full-text search over articles and newsletters.
+
+Each searchable model gets an inverted index next to its table:
+
+* SQLite: an FTS5 virtual table ``news_<kind>_fts`` whose rowid is the
+  object's pk, ranked with bm25 (title weighted over content).
+* PostgreSQL: a ``news_<kind>_search`` table holding a weighted
+  ``tsvector`` per object behind a GIN index, ranked with ts_rank_cd.
+* Anything else falls back to ``icontains`` filters, newest first.
+
+The tables are created by migration 0007 and kept in sync by the
+``post_save``/``post_delete`` signals; ``python manage.py
+rebuild_search_index`` rebuilds them from scratch. Queries join the index
+to a visibility-filtered queryset, so readers only ever find what they
+could open.
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection as default_connection
+from django.db import transaction
+from django.db.models import Q, Value
+
+from .models import Article, Newsletter
+
+SEARCHABLE = {"article": Article, "newsletter": Newsletter}
+
+MAX_TERMS = 10
+
+
+def terms(query):
+    ''' Lower-cased words of ``query``, operators and punctuation dropped '''
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+class SQLiteFTS:
+    vendor = "sqlite"
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def table(self, kind):
+        return f"news_{kind}_fts"
+
+    def create_tables(self):
+        with self.connection.cursor() as cursor:
+            for kind in SEARCHABLE:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table(kind)} "
+                    "USING fts5(title, content, tokenize='porter unicode61')"
+                )
+
+    def drop_tables(self):
+        with self.connection.cursor() as cursor:
+            for kind in SEARCHABLE:
+                cursor.execute(f"DROP TABLE IF EXISTS {self.table(kind)}")
+
+    def index_rows(self, kind, rows):
+        ''' Insert or replace (pk, title, content) rows '''
+        rows = list(rows)
+        table = self.table(kind)
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {table} WHERE rowid = %s", [(row[0],) for row in rows]
+            )
+            cursor.executemany(
+                f"INSERT INTO {table} (rowid, title, content) VALUES (%s, %s, %s)",
+                rows,
+            )
+
+    def remove(self, kind, pks):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {self.table(kind)} WHERE rowid = %s",
+                [(pk,) for pk in pks],
+            )
+
+    def clear(self, kind):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table(kind)}")
+
+    def optimize(self, kind):
+        table = self.table(kind)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+
+    def search(self, queryset, kind, query):
+        words = terms(query)
+        if not words:
+            return queryset.none()
+        table = self.table(kind)
+        # Quoted terms are plain strings to FTS5, never query syntax
+        match = " ".join(f'"{word}"' for word in words)
+        return queryset.extra(
+            select={"rank": f"bm25({table}, 10.0, 1.0)"},
+            tables=[table],
+            where=[
+                f"{table}.rowid = {queryset.model._meta.db_table}.id",
+                f"{table} MATCH %s",
+            ],
+            params=[match],
+        ).order_by("rank", "-pk")  # bm25: lower is better
+
+
+class PostgresFTS:
+    vendor = "postgresql"
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.config = getattr(settings, "NEWS_SEARCH_CONFIG", "english")
+
+    def table(self, kind):
+        return f"news_{kind}_search"
+
+    def create_tables(self):
+        with self.connection.cursor() as cursor:
+            for kind, model in SEARCHABLE.items():
+                table = self.table(kind)
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    f"object_id bigint PRIMARY KEY REFERENCES "
+                    f"{model._meta.db_table} (id) ON DELETE CASCADE, "
+                    "document tsvector NOT NULL)"
+                )
+                cursor.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_document "
+                    f"ON {table} USING GIN (document)"
+                )
+
+    def drop_tables(self):
+        with self.connection.cursor() as cursor:
+            for kind in SEARCHABLE:
+                cursor.execute(f"DROP TABLE IF EXISTS {self.table(kind)}")
+
+    def index_rows(self, kind, rows):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {self.table(kind)} (object_id, document) VALUES ("
+                "%s, setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+                "setweight(to_tsvector(%s::regconfig, %s), 'B')) "
+                "ON CONFLICT (object_id) DO UPDATE SET document = EXCLUDED.document",
+                [
+                    (pk, self.config, title, self.config, content)
+                    for pk, title, content in rows
+                ],
+            )
+
+    def remove(self, kind, pks):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {self.table(kind)} WHERE object_id = ANY(%s)",
+                [list(pks)],
+            )
+
+    def clear(self, kind):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {self.table(kind)}")
+
+    def optimize(self, kind):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {self.table(kind)}")
+
+    def search(self, queryset, kind, query):
+        if not terms(query):
+            return queryset.none()
+        table = self.table(kind)
+        tsquery = "websearch_to_tsquery(%s::regconfig, %s)"
+        return queryset.extra(
+            select={"rank": f"ts_rank_cd({table}.document, {tsquery})"},
+            select_params=[self.config, query],
+            tables=[table],
+            where=[
+                f"{table}.object_id = {queryset.model._meta.db_table}.id",
+                f"{table}.document @@ {tsquery}",
+            ],
+            params=[self.config, query],
+        ).order_by("-rank", "-pk")
+
+
+class BasicSearch:
+    ''' No index: every term must appear in the title or content '''
+    vendor = None
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def create_tables(self):
+        pass
+
+    drop_tables = create_tables
+
+    def index_rows(self, kind, rows):
+        pass
+
+    def remove(self, kind, pks):
+        pass
+
+    def clear(self, kind):
+        pass
+
+    optimize = clear
+
+    def search(self, queryset, kind, query):
+        words = terms(query)
+        if not words:
+            return queryset.none()
+        for word in words:
+            queryset = queryset.filter(
+                Q(title__icontains=word) | Q(content__icontains=word)
+            )
+        return queryset.annotate(rank=Value(0.0)).order_by("-created_at", "-pk")
+
+
+BACKENDS = {backend.vendor: backend for backend in (SQLiteFTS, PostgresFTS)}
+
+
+def get_backend(connection=None):
+    connection = connection or default_connection
+    return BACKENDS.get(connection.vendor, BasicSearch)(connection)
+
+
+""" # ******************** INDEXING ********************"""
+
+
+def index_objects(kind, objects):
+    get_backend().index_rows(
+        kind, [(obj.pk, obj.title, obj.content) for obj in objects]
+    )
+
+
+def remove_objects(kind, pks):
+    get_backend().remove(kind, pks)
+
+
+def rebuild(kind, batch_size=1000):
+    ''' Re-index every object of ``kind``, returns the number indexed '''
+    backend = get_backend()
+    rows = SEARCHABLE[kind].objects.values_list("pk", "title", "content")
+    indexed = 0
+    with transaction.atomic():
+        backend.clear(kind)
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                backend.index_rows(kind, batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            backend.index_rows(kind, batch)
+            indexed += len(batch)
+    backend.optimize(kind)
+    return indexed
+
+
+""" # ******************** QUERYING ********************"""
+
+
+def visible(kind, user):
+    ''' What ``user`` may open, mirroring the list and detail views '''
+    model = SEARCHABLE[kind]
+    if user.role == "editor":
+        return model.objects.all()
+
+    if kind == "article":
+        if user.role == "journalist":
+            return Article.objects.filter(journalist=user)
+        if user.role == "reader":
+            return Article.objects.approved().filter(
+                Q(publisher__in=user.subscribed_publisher_ids())
+                | Q(journalist__in=user.subscribed_journalist_ids())
+            )
+    else:
+        if user.role == "journalist":
+            return Newsletter.objects.filter(pk__in=user.owned_newsletter_ids())
+        if user.role == "reader":
+            Owners = Newsletter.owning_journalists.through
+            return Newsletter.objects.filter(
+                Q(publisher__in=user.subscribed_publisher_ids())
+                | Q(
+                    pk__in=Owners.objects.filter(
+                        customuser__in=user.subscribed_journalist_ids()
+                    ).values("newsletter")
+                )
+            )
+    return model.objects.none()
+
+
+def search(user, query, kind="article"):
+    ''' Ranked queryset of the ``kind`` objects visible to ``user`` that
+        match ``query``, best match first. Each object has a ``rank``.
+    '''
+    return get_backend().search(visible(kind, user), kind, query)
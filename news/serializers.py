@@ -1,5 +1,18 @@
+"""
+DRF serializers, plus a fast row path for the article list endpoints.
+
+``ArticleSerializer`` runs DRF's per-field machinery for every row. List
+endpoints can instead read ``values()`` rows with the publisher name and
+journalist username joined in (``article_values``) and shape them with
+``article_rows``: same JSON, a fraction of the work per row.
+"""
+
+import datetime
+
+from django.db.models.functions import Left
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Article
+from .models import Article, Newsletter
 
 
 class ArticleSerializer(serializers.ModelSerializer):
@@ -10,3 +23,53 @@ class ArticleSerializer(serializers.ModelSerializer):
         model = Article
         fields = ["id", "title", "content", "publisher", "journalist", "approved", "created_at",
         ]
+
+
+class NewsletterSerializer(serializers.ModelSerializer):
+    publisher = serializers.StringRelatedField()
+
+    class Meta:
+        model = Newsletter
+        fields = ["id", "title", "content", "publisher", "created_at"]
+
+
+""" # ******************** FAST ROWS ********************"""
+
+
+# ArticleSerializer fields and the values() lookups that produce them
+ARTICLE_ROW_FIELDS = (
+    ("id", "id"),
+    ("title", "title"),
+    ("content", "content"),
+    ("publisher", "publisher__name"),
+    ("journalist", "journalist__username"),
+    ("approved", "approved"),
+    ("created_at", "created_at"),
+)
+
+
+def article_values(queryset, extra=(), preview=None):
+    ''' ``queryset`` as values() rows for ``article_rows``, one joined query.
+        ``extra`` adds lookups the caller needs (pagination keys);
+        ``preview`` truncates content to that many characters in SQL.
+    '''
+    lookups = [lookup for _, lookup in ARTICLE_ROW_FIELDS]
+    if preview:
+        queryset = queryset.annotate(content_preview=Left("content", preview))
+        lookups[lookups.index("content")] = "content_preview"
+    return queryset.values(*lookups, *(f for f in extra if f not in lookups))
+
+
+def article_rows(rows, preview=None):
+    ''' ArticleSerializer-shaped dicts from ``article_values`` rows '''
+    fields = list(ARTICLE_ROW_FIELDS)
+    if preview:
+        fields[2] = ("content", "content_preview")
+    # DRF renders datetimes in the current time zone
+    tz = timezone.get_current_timezone()
+    utc = tz.utcoffset(None) == datetime.timedelta(0)
+    for row in rows:
+        data = {name: row[lookup] for name, lookup in fields}
+        if not utc:
+            data["created_at"] = timezone.localtime(data["created_at"], tz)
+        yield data
@@ -1,14 +1,19 @@
-from django.db.models.signals import post_save, post_migrate
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, post_migrate, pre_delete, pre_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
-from .models import Article, CustomUser, Newsletter
+from . import approval, caching, counters, feed, outbox, permissions, search, sync
+from .models import Article, CustomUser, Newsletter, Publisher, clear_role_groups
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 
 
 @receiver(post_migrate)
 def create_groups_and_permissions(sender, **kwargs):
+    # Groups may be recreated with new ids (e.g. after a flush)
+    clear_role_groups()
+
     # Create groups
     reader_group, _ = Group.objects.get_or_create(name="reader")
     editor_group, _ = Group.objects.get_or_create(name="editor")
@@ -40,42 +45,216 @@ def create_groups_and_permissions(sender, **kwargs):
     )
 
 
-@receiver(post_save, sender=Article)
-def article_approved_signal(sender, instance, created, **kwargs):
+@receiver([post_save, post_delete], sender=Group)
+def group_changed(sender, **kwargs):
+    clear_role_groups()
 
-    # Only act when approved
-    if not instance.approved:
-        return
 
-    # Prevent duplicate execution
-    if getattr(instance, "_signal_processed", False):
+# Cached session permissions are resolved again after any of these, see
+# news/permissions.py
+@receiver(post_delete, sender=Group)
+@receiver([post_save, post_delete], sender=Permission)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permissions_changed(sender, action=None, **kwargs):
+    if action is None or action.startswith("post_"):
+        permissions.bump_permissions_version()
+
+
+@receiver(m2m_changed, sender=CustomUser.groups.through)
+@receiver(m2m_changed, sender=CustomUser.user_permissions.through)
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # Remember whose groups/permissions are cleared, post_clear has no pk_set
+        instance._permission_users = list(instance.user_set.values_list("pk", flat=True))
+    if not action.startswith("post_"):
         return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == "post_clear":
+        user_ids = instance.__dict__.pop("_permission_users", [])
+    else:
+        user_ids = pk_set
+    permissions.bump_permissions_version(user_ids)
+
 
-    instance._signal_processed = True
+@receiver([post_save, post_delete], sender=Article)
+@receiver([post_save, post_delete], sender=Newsletter)
+def invalidate_detail_cache(sender, instance, **kwargs):
+    caching.invalidate(sender._meta.model_name, instance.pk)
 
-    # ---- EMAIL ----
-    readers_by_publisher = CustomUser.objects.filter(
-        role="reader",
-        subscribed_publishers=instance.publisher
+
+@receiver(post_save, sender=Publisher)
+def publisher_renamed(sender, instance, created, **kwargs):
+    # Article and newsletter pages show the publisher's name
+    loaded, instance._loaded_name = (
+        getattr(instance, "_loaded_name", None), instance.name
     )
+    if created or instance.name == loaded:
+        return
+    caching.touch(Article.objects.filter(publisher=instance.pk))
+    caching.touch(Newsletter.objects.filter(publisher=instance.pk))
+
 
-    readers_by_journalist = CustomUser.objects.filter(
-        role="reader",
-        subscribed_journalists=instance.journalist
+@receiver(post_save, sender=CustomUser)
+def journalist_renamed(sender, instance, created, **kwargs):
+    # Article pages show the journalist's username
+    loaded, instance._loaded_username = (
+        getattr(instance, "_loaded_username", None), instance.username
     )
+    if created or instance.username == loaded:
+        return
+    caching.touch(Article.objects.filter(journalist=instance.pk))
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Newsletter)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {"title", "content"} & set(update_fields):
+        return
+    search.index_objects(sender._meta.model_name, [instance])
+
+
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=Newsletter)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_objects(sender._meta.model_name, [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Article)
+def log_article_change(sender, instance, **kwargs):
+    sync.log_article_changes([instance])
+
+
+@receiver(pre_save, sender=Article)
+def remember_article_owners(sender, instance, **kwargs):
+    # Read here, log_article_change resets the loaded owners on post_save
+    instance._moved_from = sync.moved_from(instance)
+
+
+@receiver(post_save, sender=Article)
+def article_approved_signal(sender, instance, created, update_fields=None, **kwargs):
+    moved = instance.__dict__.pop("_moved_from", None) is not None
+    was_approved = getattr(instance, "_loaded_approved", False)
+
+    if update_fields is None or "approved" in update_fields:
+        instance._loaded_approved = instance.approved
+
+        # Only act when approved
+        if not instance.approved:
+            if feed.feed_enabled() and not created:
+                feed.retract_article(instance.pk)
+            return
 
-    subscribers = (readers_by_publisher | readers_by_journalist).distinct()
-    email_list = [u.email for u in subscribers if u.email]
+        # Email + tweet are delivered by the outbox worker once the
+        # approval is committed, keeping them off the request path
+        if not was_approved:
+            approval.article_approved(instance.pk)
+            return
 
-    if email_list:
-        send_mail(
-            subject=f"New Article Published: {instance.title}",
-            message=instance.content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=email_list,
-            fail_silently=True,
+    # Later edits (editor, admin) of an approved article notify nobody
+    # again, but moving it to another publisher or journalist changes
+    # whose feeds it belongs in
+    if moved and was_approved and feed.feed_enabled():
+        feed.retract_article(instance.pk)
+        transaction.on_commit(partial(outbox.enqueue_article_feed, instance.pk))
+
+
+SUBSCRIPTION_REVERSE_NAMES = {
+    "subscribed_publishers": "subscribed_readers",
+    "subscribed_journalists": "subscribers",
+}
+
+
+def _subscription_delta(instance, action, reverse, pk_set, field):
+    ''' (reader ids, target ids, added) for a subscription M2M change, or
+        None when there is nothing to do for ``action``
+    '''
+    related = getattr(instance, SUBSCRIPTION_REVERSE_NAMES[field] if reverse else field)
+    if action == "pre_clear":
+        # Remember what is being cleared, post_clear has no pk_set
+        instance._subscriptions_cleared = set(related.values_list("pk", flat=True))
+        return None
+    if action == "pre_remove":
+        # post_remove reports every id asked for, existing links or not
+        instance._subscriptions_removed = set(
+            related.filter(pk__in=pk_set).values_list("pk", flat=True)
         )
+        return None
+
+    if action == "post_clear":
+        pk_set = getattr(instance, "_subscriptions_cleared", set())
+    elif action == "post_remove":
+        pk_set = getattr(instance, "_subscriptions_removed", pk_set)
+    elif action != "post_add":
+        return None
+
+    if not pk_set:
+        return None
+
+    readers, targets = ([instance.pk], pk_set) if not reverse else (pk_set, [instance.pk])
+    return readers, targets, action == "post_add"
+
+
+def _sync_subscriptions(instance, action, reverse, pk_set, field):
+    ''' Keep the materialised feed and the sync change log in step with a
+        subscription M2M
+    '''
+    delta = _subscription_delta(instance, action, reverse, pk_set, field)
+    if delta is None:
+        return
+
+    readers, targets, added = delta
+    # Every target gains (or loses) one subscriber per reader
+    counters.change_subscriber_count(
+        Publisher if field == "subscribed_publishers" else CustomUser,
+        targets, len(readers) if added else -len(readers),
+    )
+    key = "publisher_ids" if field == "subscribed_publishers" else "journalist_ids"
+    sync.log_subscription_changes(readers, **{key: targets})
+    if not feed.feed_enabled():
+        return
+    if added:
+        feed.add_subscriptions(readers, **{key: targets})
+    else:
+        feed.remove_subscriptions(readers, **{key: targets})
+
+
+def _invalidate_membership(instance, action, reverse, field):
+    ''' Drop the user's cached id set for a relation that just changed '''
+    if not reverse and action.startswith("post_"):
+        instance.invalidate_membership_cache(field)
+
+
+@receiver(m2m_changed, sender=CustomUser.subscribed_publishers.through)
+def publisher_subscription_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _invalidate_membership(instance, action, reverse, "subscribed_publishers")
+    _sync_subscriptions(instance, action, reverse, pk_set, "subscribed_publishers")
+
+
+@receiver(m2m_changed, sender=CustomUser.subscribed_journalists.through)
+def journalist_subscription_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _invalidate_membership(instance, action, reverse, "subscribed_journalists")
+    _sync_subscriptions(instance, action, reverse, pk_set, "subscribed_journalists")
+
+
+@receiver(pre_delete, sender=CustomUser)
+def release_subscriptions(sender, instance, **kwargs):
+    ''' Deleting a user drops their subscription rows without m2m_changed;
+        take them off the counts first
+    '''
+    counters.change_subscriber_count(
+        Publisher, list(instance.subscribed_publishers.values_list("pk", flat=True)), -1
+    )
+    counters.change_subscriber_count(
+        CustomUser, list(instance.subscribed_journalists.values_list("pk", flat=True)), -1
+    )
+
+
+@receiver(m2m_changed, sender=CustomUser.independent_articles.through)
+def owned_articles_changed(sender, instance, action, reverse, **kwargs):
+    _invalidate_membership(instance, action, reverse, "independent_articles")
+
 
-    #  TWEET
-    from .twitter import Tweet  # adjust import path if needed
-    Tweet.tweet_article(instance)
\ No newline at end of file
+@receiver(m2m_changed, sender=CustomUser.independent_newsletters.through)
+def owned_newsletters_changed(sender, instance, action, reverse, **kwargs):
+    _invalidate_membership(instance, action, reverse, "independent_newsletters")
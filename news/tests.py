@@ -1,11 +1,101 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from asgiref.sync import sync_to_async
+from unittest.mock import patch
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
 from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework.authtoken.models import Token
-from .models import Article, Publisher
+from rest_framework.renderers import JSONRenderer
+from . import async_views, counters, instrumentation, metrics, models, permissions
+from .approval import approve_articles, coalesce_approvals
+from .caching import cache_stats
+from .digests import send_digests
+from .importer import Importer, read_rows
+from .live import LocalBroker, publish_articles
+from .models import (
+    Article,
+    ChangeLogEntry,
+    FeedEntry,
+    Newsletter,
+    OutboxMessage,
+    PendingNotification,
+    Publisher,
+)
+from .notifications import iter_subscriber_emails, send_article_emails
+from .outbox import claim_batch, deliver, deliver_article_feed
+from .renderers import json_dumps
+from .search import search
+from .twitter import Tweet, TweetError, TweetQueue, TweetThrottled, TwitterClient
+from .twitter_stub import StubTwitterServer
 
 User = get_user_model()
 
+# The async views on their usual routes, for AsyncViewsTest
+urlpatterns = [
+    path("articles/", async_views.article_list),
+    path("articles/<int:article_id>/", async_views.article_detail),
+    path("newsletters/<int:newsletter_id>/", async_views.newsletter_detail),
+    path("api/subscribed-articles/", async_views.subscribed_articles_api),
+    path("", include("news.urls")),
+]
+
+
+def tearDownModule():
+    # Write the views the tests buffered while the test database still
+    # exists, not at exit into the real one
+    counters.flush_views()
+
+
+class NewsroomMixin:
+    ''' The users, publisher and articles the tests below start from. Mix
+        into a TestCase or APITestCase and call ``setUpNewsroom`` from
+        setUp; ``create_user``/``create_article`` add anything else.
+    '''
+
+    def create_user(self, username, role, **fields):
+        return User.objects.create_user(
+            username=username, password="password123", role=role, **fields
+        )
+
+    def create_article(self, title, publisher=None, journalist=None, **fields):
+        fields.setdefault("content", "Body")
+        return Article.objects.create(
+            title=title,
+            publisher=publisher or self.publisher,
+            journalist=journalist or self.journalist,
+            **fields,
+        )
+
+    def setUpNewsroom(self, reader=True, editor=False):
+        ''' "Publisher 1" and journalist1, plus reader1 subscribed to the
+            publisher and editor1 when asked for
+        '''
+        self.publisher = Publisher.objects.create(name="Publisher 1")
+        self.journalist = self.create_user("journalist1", "journalist")
+        if reader:
+            self.reader = self.create_user(
+                "reader1", "reader", email="reader1@example.com"
+            )
+            self.reader.subscribed_publishers.add(self.publisher)
+        if editor:
+            self.editor = self.create_user("editor1", "editor")
+
 
 class SubscribedArticlesAPITest(APITestCase):
     def setUp(self):
@@ -60,7 +150,7 @@ class SubscribedArticlesAPITest(APITestCase):
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        titles = [article["title"] for article in response.data]
+        titles = [article["title"] for article in response.data["results"]]
 
         # Articles included because of subscription (approved only)
         expected_titles = [
@@ -74,9 +164,1332 @@ class SubscribedArticlesAPITest(APITestCase):
         self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.non_reader_token.key}')
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0)
+        self.assertEqual(len(response.data["results"]), 0)
+
+    def page_through(self, url):
+        titles = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            titles += [article["title"] for article in response.data["results"]]
+            url = response.data["next"]
+        return titles
+
+    def test_cursor_pagination_is_stable(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.reader_token.key}')
+        titles = self.page_through(self.url + "?page_size=1")
+        self.assertEqual(titles, [
+            self.article_journalist2.title,
+            self.article_journalist1.title,
+            self.article_pub1.title,
+        ])
+
+        with override_settings(NEWS_FEED_MATERIALIZED=True):
+            call_command("backfill_feed", stdout=StringIO())
+            self.assertEqual(self.page_through(self.url + "?page_size=2"), titles)
+
+    def test_invalid_cursor(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.reader_token.key}')
+        response = self.client.get(self.url + "?cursor=garbage")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_fast_rows_match_serializer(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.reader_token.key}')
+        with CaptureQueriesContext(connection) as queries:
+            fast = self.client.get(self.url + "?page_size=2").json()
+        # Token, subscriptions, validators and one joined page query
+        self.assertEqual(len(queries), 5)
+
+        with override_settings(NEWS_FAST_SERIALIZATION=False):
+            slow = self.client.get(self.url + "?page_size=2").json()
+        self.assertEqual(fast, slow)
+
+    def test_content_preview(self):
+        Article.objects.filter(pk=self.article_pub1.pk).update(content="A long article body")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.reader_token.key}')
+        response = self.client.get(self.url + "?preview=6")
+        contents = {a["id"]: a["content"] for a in response.json()["results"]}
+        self.assertEqual(contents[self.article_pub1.pk], "A long")
+
+    def test_fast_json_matches_drf(self):
+        data = {
+            "when": timezone.now(),
+            "price": Decimal("1.50"),
+            "label": gettext_lazy("Approved"),
+            "items": [1, "é", None],
+        }
+        self.assertEqual(json_dumps(data), JSONRenderer().render(data))
 
     def test_unauthenticated_user_is_denied(self):
         self.client.credentials()  # remove any credentials
         response = self.client.get(self.url)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class OutboxTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        self.setUpNewsroom()
+        self.article = self.create_article("Pending")
+
+    def approve(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.article.approved = True
+            self.article.save()
+
+    def test_approval_only_enqueues(self):
+        self.approve()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertCountEqual(
+            OutboxMessage.objects.values_list("kind", flat=True), ["email", "tweet"]
+        )
+
+    def test_edits_of_approved_articles_enqueue_nothing(self):
+        self.approve()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.article.save()
+            article = Article.objects.get(pk=self.article.pk)
+            article.title = "Edited"
+            article.save()
+        editor = self.create_user("editor1", "editor")
+        self.client.force_login(editor)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                f"/articles/{article.pk}/edit/",
+                {"title": "Edited again", "content": "Body", "publisher": self.publisher.pk},
+            )
+        self.assertEqual(Article.objects.get().title, "Edited again")
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+        # Approving again after a retraction notifies again
+        with self.captureOnCommitCallbacks(execute=True):
+            article = Article.objects.get(pk=self.article.pk)
+            article.approved = False
+            article.save()
+            article.approved = True
+            article.save()
+        self.assertEqual(OutboxMessage.objects.count(), 4)
+
+    def test_delivery_sends_email_and_retries_failures(self):
+        self.approve()
+        email = OutboxMessage.objects.get(kind="email")
+        tweet = OutboxMessage.objects.get(kind="tweet")
+
+        with patch("news.twitter.Tweet.make_tweet", side_effect=Exception("down")):
+            self.assertEqual(claim_batch(10), [email.pk, tweet.pk])
+            self.assertTrue(deliver(email.pk))
+            self.assertFalse(deliver(tweet.pk))
+
+        self.assertEqual(mail.outbox[0].recipients(), ["reader1@example.com"])
+        email.refresh_from_db()
+        tweet.refresh_from_db()
+        self.assertEqual(email.status, "done")
+        self.assertEqual(tweet.status, "pending")
+        self.assertEqual(tweet.attempts, 1)
+        self.assertIn("down", tweet.last_error)
+
+    def test_rate_limited_tweets_are_deferred(self):
+        self.approve()
+        tweet = OutboxMessage.objects.get(kind="tweet")
+        with patch("news.twitter.Tweet.make_tweet", side_effect=TweetThrottled(30)) as make:
+            self.assertIn(tweet.pk, claim_batch(10))
+            self.assertFalse(deliver(tweet.pk))
+        self.assertEqual(make.call_args.kwargs, {"block": False})
+
+        tweet.refresh_from_db()
+        self.assertEqual((tweet.status, tweet.attempts), ("pending", 0))
+        self.assertGreater(tweet.available_at, timezone.now() + timedelta(seconds=25))
+
+    def test_tweet_view_is_for_editors(self):
+        url = f"/articles/{self.article.pk}/tweet/"
+        with patch("news.twitter.Tweet.tweet_article") as tweet_article:
+            self.assertEqual(self.client.post(url).status_code, 302)  # to login
+            self.client.force_login(self.reader)
+            self.assertEqual(self.client.post(url).status_code, 403)
+
+            self.client.force_login(self.create_user("editor1", "editor"))
+            self.assertEqual(self.client.get(url).status_code, 405)
+            self.assertEqual(self.client.post(url).status_code, 400)  # pending
+            self.approve()
+            self.assertEqual(self.client.post(url).status_code, 202)
+        tweet_article.assert_called_once()
+
+
+class SubscriberEmailTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        self.setUpNewsroom(reader=False)
+        for i in range(3):
+            reader = self.create_user(f"reader{i}", "reader", email=f"reader{i}@example.com")
+            reader.subscribed_publishers.add(self.publisher)
+            if i == 0:
+                # subscribed both ways, must still be mailed once
+                reader.subscribed_journalists.add(self.journalist)
+        self.create_user(
+            "reader3", "reader", email="reader3@example.com"
+        ).subscribed_journalists.add(self.journalist)
+        self.article = self.create_article("News")
+
+    def test_subscribers_are_deduplicated(self):
+        emails = list(iter_subscriber_emails(self.article, chunk_size=1))
+        self.assertCountEqual(emails, [f"reader{i}@example.com" for i in range(4)])
+
+    def test_bcc_batches(self):
+        stats = send_article_emails(self.article, batch_size=3, mode="bcc")
+        self.assertEqual((stats.recipients, stats.messages), (4, 2))
+        self.assertEqual([len(m.bcc) for m in mail.outbox], [3, 1])
+
+    def test_individual_messages(self):
+        stats = send_article_emails(self.article, batch_size=3, mode="individual")
+        self.assertEqual((stats.recipients, stats.messages), (4, 4))
+        self.assertTrue(all(len(m.to) == 1 for m in mail.outbox))
+
+
+@override_settings(NEWS_FEED_MATERIALIZED=True)
+class MaterializedFeedTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        self.setUpNewsroom()
+        self.old = self.create_article("Old", approved=True)
+
+    def feed(self):
+        return set(FeedEntry.objects.filter(reader=self.reader).values_list("article_id", flat=True))
+
+    def test_approval_fans_out_to_subscribers(self):
+        article = self.create_article("New")
+        with self.captureOnCommitCallbacks(execute=True):
+            article.approved = True
+            article.save()
+        deliver_article_feed({"article_id": article.pk})
+        self.assertIn(article.pk, self.feed())
+
+    def test_digest_readers_get_feed_entries(self):
+        call_command("backfill_feed", stdout=StringIO())
+        self.reader.notification_frequency = "daily"
+        self.reader.save()
+        article = self.create_article("New")
+        with self.captureOnCommitCallbacks(execute=True):
+            article.approved = True
+            article.save()
+        deliver_article_feed({"article_id": article.pk})
+        self.assertIn(article.pk, self.feed())
+        call_command("check_feed", stdout=StringIO())  # no drift
+
+    def test_moving_an_approved_article_moves_it_between_feeds(self):
+        call_command("backfill_feed", stdout=StringIO())
+        other = Publisher.objects.create(name="Publisher 2")
+        follower = self.create_user("reader2", "reader")
+        follower.subscribed_publishers.add(other)
+
+        article = Article.objects.get(pk=self.old.pk)
+        article.publisher = other
+        with self.captureOnCommitCallbacks(execute=True):
+            article.save()
+        for pk in claim_batch(10):
+            deliver(pk)
+
+        self.assertEqual(self.feed(), set())
+        self.assertEqual(
+            list(FeedEntry.objects.filter(reader=follower).values_list("article_id", flat=True)),
+            [article.pk],
+        )
+        call_command("check_feed", stdout=StringIO())
+
+    def test_subscription_changes_update_feed(self):
+        self.assertEqual(self.feed(), set())  # created before the feed existed
+        call_command("backfill_feed", stdout=StringIO())
+        self.assertEqual(self.feed(), {self.old.pk})
+
+        # still visible through the journalist after leaving the publisher
+        self.reader.subscribed_journalists.add(self.journalist)
+        self.reader.subscribed_publishers.remove(self.publisher)
+        self.assertEqual(self.feed(), {self.old.pk})
+
+        self.reader.subscribed_journalists.clear()
+        self.assertEqual(self.feed(), set())
+        call_command("check_feed", stdout=StringIO())
+
+    def test_check_feed_reports_drift(self):
+        with self.assertRaises(CommandError):
+            call_command("check_feed", stdout=StringIO())
+        call_command("check_feed", "--fix", stdout=StringIO())
+        self.assertEqual(self.feed(), {self.old.pk})
+
+
+class ListQueryCountTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        self.setUpNewsroom()
+        self.reader.subscribed_journalists.add(self.journalist)
+        self.client.force_login(self.reader)
+
+    def add_content(self, count):
+        for i in range(count):
+            publisher = Publisher.objects.create(name=f"Publisher {i}")
+            self.reader.subscribed_publishers.add(publisher)
+            self.create_article(f"Article {i}", publisher=publisher, approved=True)
+            Newsletter.objects.create(title=f"Newsletter {i}", content="Body", publisher=publisher)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for url in ("/articles/", "/newsletters/"):
+            self.add_content(1)
+            small = self.count_queries(url)
+            self.add_content(8)
+            self.assertEqual(self.count_queries(url), small, url)
+
+
+class MembershipCacheTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        self.setUpNewsroom()
+        self.other = Publisher.objects.create(name="Publisher 2")
+
+    def test_membership_is_cached_and_invalidated(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.reader.is_subscribed_to_publisher(self.publisher.pk))
+            self.assertFalse(self.reader.is_subscribed_to_publisher(self.other.pk))
+
+        self.reader.subscribed_publishers.add(self.other)
+        self.assertTrue(self.reader.is_subscribed_to_publisher(self.other.pk))
+
+        self.reader.subscribed_publishers.clear()
+        self.assertFalse(self.reader.is_subscribed_to_publisher(self.publisher.pk))
+
+    def test_detail_views_check_subscriptions(self):
+        visible = self.create_article("Visible", approved=True)
+        hidden = self.create_article("Hidden", approved=True, publisher=self.other)
+        newsletter = Newsletter.objects.create(title="Letter", content="Body", publisher=self.other)
+        self.client.force_login(self.reader)
+
+        self.assertEqual(self.client.get(f"/articles/{visible.pk}/").status_code, 200)
+        self.assertEqual(self.client.get(f"/articles/{hidden.pk}/").status_code, 403)
+        self.assertEqual(self.client.get(f"/newsletters/{newsletter.pk}/").status_code, 403)
+
+        self.journalist.independent_newsletters.add(newsletter)
+        self.reader.subscribed_journalists.add(self.journalist)
+        self.assertEqual(self.client.get(f"/newsletters/{newsletter.pk}/").status_code, 200)
+
+
+class DetailCacheTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.setUpNewsroom(reader=False)
+        self.editor = self.create_user("editor1", "editor", is_staff=True)
+        self.article = self.create_article("Cached", content="First", approved=True)
+        self.url = f"/articles/{self.article.pk}/"
+        self.client.force_login(self.editor)
+
+    def test_hits_skip_rendering_and_edits_invalidate(self):
+        before = cache_stats()
+        self.assertContains(self.client.get(self.url), "First")
+        with patch("news.caching.render_to_string") as render:
+            self.assertContains(self.client.get(self.url), "First")
+            render.assert_not_called()
+
+        self.article.content = "Second"
+        self.article.save()
+        self.assertContains(self.client.get(self.url), "Second")
+
+        after = cache_stats()
+        self.assertEqual(after["hits"] - before["hits"], 1)
+        self.assertEqual(after["misses"] - before["misses"], 2)
+        self.assertEqual(self.client.get("/api/cache-stats/").json()["hits"], after["hits"])
+
+    def test_renames_invalidate_bodies_and_validators(self):
+        response = self.client.get(self.url)
+        self.assertContains(response, "Publisher 1")
+        etag = response["ETag"]
+
+        publisher = Publisher.objects.get()
+        publisher.name = "Renamed Publisher"
+        publisher.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "Renamed Publisher")
+        etag = response["ETag"]
+
+        journalist = User.objects.get(username="journalist1")
+        journalist.username = "journalist-renamed"
+        journalist.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, "journalist-renamed")
+        etag = response["ETag"]
+
+        # Other saves leave the pages alone
+        with self.assertNumQueries(1):
+            journalist.save(update_fields=["last_login"])
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+
+
+class ConditionalRequestTest(NewsroomMixin, APITestCase):
+    def setUp(self):
+        self.setUpNewsroom()
+        self.article = self.create_article("First", approved=True)
+        self.client.force_login(self.reader)
+
+    def assertRevalidates(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_api_feed(self):
+        def approve_another():
+            self.create_article("Second", approved=True)
+        self.assertRevalidates("/api/subscribed-articles/", approve_another)
+
+    def test_article_detail(self):
+        def edit():
+            self.article.title = "Edited"
+            self.article.save()
+        self.assertRevalidates(f"/articles/{self.article.pk}/", edit)
+
+    def test_not_modified_skips_the_listing_query(self):
+        etag = self.client.get("/articles/")["ETag"]
+        with patch("news.views.paginate_request") as paginate:
+            response = self.client.get("/articles/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        paginate.assert_not_called()
+
+    def test_validators_follow_the_page(self):
+        older = self.create_article("Older", approved=True)
+        Article.objects.filter(pk=older.pk).update(
+            created_at=self.article.created_at - timedelta(days=1),
+            updated_at=self.article.updated_at - timedelta(days=1),
+        )
+        # Deleting a row leaves the newest stamp alone but changes the page
+        self.assertRevalidates("/articles/?page_size=2", older.delete)
+
+        # No aggregate over the whole listing, only the page's keyset query
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get("/articles/")
+        self.assertFalse(
+            [q for q in ctx.captured_queries if "COUNT(" in q["sql"].upper()]
+        )
+
+
+class TwitterClientTest(TestCase):
+    def client_for(self, server, **kwargs):
+        kwargs.setdefault("rate", 1000)
+        kwargs.setdefault("burst", 10)
+        kwargs.setdefault("backoff_base", 0.01)
+        return TwitterClient("k", "s", "t", "ts", base_url=server.url, **kwargs)
+
+    def test_retries_server_errors(self):
+        with StubTwitterServer(fail_first=2) as server, self.assertLogs("news.twitter"):
+            response = self.client_for(server).post_tweet({"text": "hello"})
+        self.assertEqual(response["data"]["text"], "hello")
+        self.assertEqual(server.requests, 3)
+
+    def test_gives_up_after_max_retries(self):
+        with StubTwitterServer(fail_first=10) as server, self.assertLogs("news.twitter"):
+            with self.assertRaises(TweetError) as raised:
+                self.client_for(server, max_retries=1).post_tweet({"text": "x"})
+        self.assertEqual(raised.exception.status_code, 503)
+        self.assertEqual(server.requests, 2)
+
+    def test_queue_waits_out_rate_limit(self):
+        with StubTwitterServer(limit=3, window=0.2) as server, self.assertLogs("news.twitter"):
+            client = self.client_for(server)
+            tweets = TweetQueue(client, workers=3, maxsize=10)
+            futures = [tweets.submit({"text": str(i)}) for i in range(7)]
+            tweets.join()
+            tweets.shutdown()
+            client.close()
+        self.assertTrue(all(future.exception() is None for future in futures))
+        self.assertEqual(len(server.posted), 7)
+
+    def test_non_blocking_raises_instead_of_waiting(self):
+        with StubTwitterServer() as server:
+            client = self.client_for(server, rate=0.001, burst=1)
+            client.post_tweet({"text": "1"}, block=False)
+            with self.assertRaises(TweetThrottled):
+                client.post_tweet({"text": "2"}, block=False)  # bucket empty
+            client.close()
+        self.assertEqual(server.requests, 1)
+
+        with StubTwitterServer(limit=1, window=60) as server, self.assertLogs("news.twitter"):
+            client = self.client_for(server)
+            client.post_tweet({"text": "1"}, block=False)
+            with self.assertRaises(TweetThrottled) as raised:
+                client.post_tweet({"text": "2"}, block=False)  # window spent
+            client.close()
+        self.assertGreater(raised.exception.retry_after, 50)
+        self.assertEqual(server.requests, 1)
+
+    def test_missing_tokens_never_prompt(self):
+        tweet = Tweet()
+        with patch.multiple(tweet, client=None, access_token=None, access_token_secret=None), \
+                patch("builtins.input", side_effect=AssertionError("prompted")), \
+                patch("news.twitter.OAuth1Session", side_effect=AssertionError("network")):
+            with self.assertRaisesMessage(ImproperlyConfigured, "X_ACCESS_TOKEN"):
+                tweet.make_tweet({"text": "x"})
+
+
+class BulkApprovalTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        self.setUpNewsroom()
+        self.other = self.create_user("journalist2", "journalist")
+        self.create_user(
+            "reader2", "reader", email="reader2@example.com"
+        ).subscribed_journalists.add(self.other)
+        self.articles = [
+            self.create_article(
+                f"Article {i}", journalist=self.other if i == 0 else self.journalist
+            )
+            for i in range(3)
+        ]
+
+    def deliver_email(self):
+        email = OutboxMessage.objects.get(kind="email")
+        claim_batch(10)
+        self.assertTrue(deliver(email.pk))
+
+    def test_one_email_per_subscriber(self):
+        # Mailed later by send_digests, not counted as a recipient
+        self.create_user(
+            "daily", "reader", email="daily@example.com", notification_frequency="daily"
+        ).subscribed_publishers.add(self.publisher)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = approve_articles(Article.objects.all())
+
+        self.assertEqual(len(result.article_ids), 3)
+        self.assertEqual(result.recipients, 2)
+        self.assertFalse(Article.objects.filter(approved=False).exists())
+        self.assertEqual(OutboxMessage.objects.filter(kind="email").count(), 1)
+        self.assertEqual(OutboxMessage.objects.filter(kind="tweet").count(), 3)
+
+        self.deliver_email()
+        subjects = {m.bcc[0]: m.subject for m in mail.outbox}
+        self.assertEqual(subjects, {
+            "reader1@example.com": "3 New Articles Published",
+            "reader2@example.com": "New Article Published: Article 0",
+        })
+        self.assertEqual(len(mail.outbox), result.recipients)
+
+    def test_individual_saves_are_coalesced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with coalesce_approvals():
+                for article in self.articles:
+                    article.approved = True
+                    article.save()
+
+        self.assertEqual(OutboxMessage.objects.filter(kind="email").count(), 1)
+        self.deliver_email()
+        self.assertEqual(len(mail.outbox), 2)
+
+
+class DigestTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        self.setUpNewsroom(reader=False)
+        for name, frequency in (("instant", "immediate"), ("daily", "daily")):
+            self.create_user(
+                name, "reader", email=f"{name}@example.com",
+                notification_frequency=frequency,
+            ).subscribed_publishers.add(self.publisher)
+
+    def approve(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_article(title, approved=True)
+        for pk in claim_batch(10):
+            deliver(pk)
+
+    def test_digest_readers_get_one_email_per_window(self):
+        with patch("news.twitter.Tweet.make_tweet"):
+            self.approve("First")
+            self.approve("Second")
+
+        self.assertEqual(
+            [m.recipients() for m in mail.outbox],
+            [["instant@example.com"], ["instant@example.com"]],
+        )
+        self.assertEqual(PendingNotification.objects.count(), 2)
+
+        mail.outbox = []
+        self.assertEqual(send_digests("hourly").messages, 0)
+        stats = send_digests("daily")
+        self.assertEqual(stats.messages, 1)
+        self.assertEqual(mail.outbox[0].to, ["daily@example.com"])
+        self.assertIn("First", mail.outbox[0].body)
+        self.assertIn("Second", mail.outbox[0].body)
+        self.assertFalse(PendingNotification.objects.exists())
+
+    def test_failed_send_keeps_only_unsent_rows(self):
+        self.create_user(
+            "daily2", "reader", email="daily2@example.com", notification_frequency="daily"
+        ).subscribed_publishers.add(self.publisher)
+        with patch("news.twitter.Tweet.make_tweet"):
+            self.approve("First")
+        self.assertEqual(PendingNotification.objects.count(), 2)
+
+        connection = mail.get_connection()
+        send = connection.send_messages
+        with patch.object(
+            connection, "send_messages", side_effect=[1, ConnectionError("smtp down")]
+        ):
+            with self.assertRaises(ConnectionError):
+                send_digests("daily", batch_size=1, connection=connection)
+        # The first reader's digest went out and its row is gone
+        self.assertEqual(PendingNotification.objects.count(), 1)
+
+        mail.outbox = []
+        with patch.object(connection, "send_messages", side_effect=send):
+            self.assertEqual(send_digests("daily", connection=connection).messages, 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(PendingNotification.objects.exists())
+
+
+class SearchTest(NewsroomMixin, APITestCase):
+    def setUp(self):
+        self.setUpNewsroom()
+        other = Publisher.objects.create(name="Publisher 2")
+
+        def article(title, content, publisher=None, approved=True):
+            return self.create_article(
+                title, content=content, approved=approved, publisher=publisher
+            )
+
+        self.in_title = article("Election results", "Counting continues")
+        self.in_body = article("Weather", "Storm delays election count")
+        article("Election draft", "Not approved yet", approved=False)
+        article("Election abroad", "Unsubscribed publisher", publisher=other)
+
+    def test_ranked_and_visibility_filtered(self):
+        self.assertEqual(
+            list(search(self.reader, "election")), [self.in_title, self.in_body]
+        )
+        self.assertEqual(search(self.journalist, "election").count(), 4)
+
+    def test_index_follows_edits_and_deletes(self):
+        self.in_title.title = "Sports"
+        self.in_title.save()
+        self.in_body.delete()
+        self.assertFalse(search(self.reader, "election").exists())
+        self.assertEqual(list(search(self.reader, "sports")), [self.in_title])
+
+    def test_api_pages_results(self):
+        self.client.force_authenticate(self.reader)
+        response = self.client.get("/api/search/?q=election&page_size=1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([a["id"] for a in response.data["results"]], [self.in_title.pk])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual([a["id"] for a in response.data["results"]], [self.in_body.pk])
+        self.assertIsNone(response.data["next"])
+
+
+class SyncAPITest(NewsroomMixin, APITestCase):
+    url = "/api/subscribed-articles/changes/"
+
+    def setUp(self):
+        self.setUpNewsroom()
+        self.client.force_authenticate(self.reader)
+        self.token = self.client.get(self.url).data["token"]
+
+    def sync(self):
+        response = self.client.get(self.url, {"since": self.token})
+        self.assertEqual(response.status_code, 200)
+        self.token = response.data["token"]
+        return [a["id"] for a in response.data["upserted"]], response.data["removed"]
+
+    def test_changes_since_token(self):
+        article = self.create_article("News", approved=True)
+        self.create_article(
+            "Other", approved=True, publisher=Publisher.objects.create(name="Publisher 2")
+        )
+        self.assertEqual(self.sync(), ([article.pk], []))
+        self.assertEqual(self.sync(), ([], []))
+
+        self.reader.subscribed_publishers.remove(self.publisher)
+        self.assertEqual(self.sync(), ([], [article.pk]))
+
+        self.reader.subscribed_journalists.add(self.journalist)
+        upserted, removed = self.sync()
+        self.assertEqual(len(upserted), 2)
+
+        article_id = article.pk
+        article.delete()
+        self.assertEqual(self.sync(), ([], [article_id]))
+
+    def test_bulk_approval_is_logged(self):
+        article = self.create_article("Pending")
+        self.assertEqual(self.sync(), ([], [article.pk]))
+        approve_articles(Article.objects.all())
+        self.assertEqual(self.sync(), ([article.pk], []))
+
+    def test_foreign_token_rejected(self):
+        other = self.create_user("reader2", "reader")
+        self.client.force_authenticate(other)
+        response = self.client.get(self.url, {"since": self.token})
+        self.assertEqual(response.status_code, 400)
+
+
+class LiveFeedTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        self.setUpNewsroom()
+        self.reader.subscribed_journalists.add(self.journalist)
+
+    async def test_broker_delivers_once_per_subscriber(self):
+        broker = LocalBroker()
+        both = broker.subscribe(["publisher:1", "journalist:2"])
+        other = broker.subscribe(["publisher:3"])
+
+        self.assertEqual(broker.publish(["publisher:1", "journalist:2"], {"id": 1}), 1)
+        self.assertEqual(await both.get(timeout=1), {"id": 1})
+        self.assertIsNone(await both.get(timeout=0.01))
+        self.assertIsNone(await other.get(timeout=0.01))
+
+        both.close()
+        other.close()
+        self.assertEqual(broker.connections(), 0)
+
+    async def test_stream_pushes_approved_articles(self):
+        await self.async_client.aforce_login(self.reader)
+        response = await self.async_client.get("/live/")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+
+        article = await sync_to_async(Article.objects.create)(
+            title="Breaking", content="Body", approved=True,
+            publisher=self.publisher, journalist=self.journalist,
+        )
+        await sync_to_async(publish_articles)([article.pk])
+        event = (await anext(stream)).decode()
+        self.assertIn("event: article", event)
+        self.assertIn('"title": "Breaking"', event)
+        await stream.aclose()
+
+
+@override_settings(ROOT_URLCONF="news.tests")
+class AsyncViewsTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.setUpNewsroom()
+        self.token = Token.objects.create(user=self.reader)
+        other = Publisher.objects.create(name="Publisher 2")
+
+        self.visible = self.create_article(
+            "Visible", content="Visible body", approved=True
+        )
+        self.hidden = self.create_article(
+            "Hidden", content="Hidden body", approved=True, publisher=other
+        )
+        self.newsletter = Newsletter.objects.create(
+            title="Other news", content="Body", publisher=other
+        )
+
+    async def test_list_and_not_modified(self):
+        await self.async_client.aforce_login(self.reader)
+        response = await self.async_client.get("/articles/")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Visible")
+        self.assertContains(response, "Subscribed Publisher")
+
+        again = await self.async_client.get(
+            "/articles/", headers={"if-none-match": response["ETag"]}
+        )
+        self.assertEqual(again.status_code, 304)
+
+    async def test_detail_authorization(self):
+        await self.async_client.aforce_login(self.reader)
+        response = await self.async_client.get(f"/articles/{self.visible.pk}/")
+        self.assertContains(response, "Visible body")
+
+        response = await self.async_client.get(f"/articles/{self.hidden.pk}/")
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.get("/articles/999999/")
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get(f"/newsletters/{self.newsletter.pk}/")
+        self.assertEqual(response.status_code, 403)
+
+    async def test_api_matches_sync_view(self):
+        response = await self.async_client.get("/api/subscribed-articles/")
+        self.assertEqual(response.status_code, 401)
+
+        auth = {"authorization": f"Token {self.token.key}"}
+        response = await self.async_client.get("/api/subscribed-articles/", headers=auth)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([a["id"] for a in data["results"]], [self.visible.pk])
+        self.assertEqual(data["results"][0]["publisher"], "Publisher 1")
+
+        with override_settings(ROOT_URLCONF="news.urls"):
+            expected = await self.async_client.get(
+                "/api/subscribed-articles/", headers=auth
+            )
+        self.assertEqual(data, expected.json())
+
+
+class ExportTest(NewsroomMixin, APITestCase):
+    def setUp(self):
+        self.setUpNewsroom(editor=True)
+        other = Publisher.objects.create(name="Publisher 2")
+        self.articles = [
+            self.create_article(f"Article {i}", publisher=publisher, approved=True)
+            for i, publisher in enumerate([self.publisher, other, self.publisher])
+        ]
+        self.create_article("Pending")
+
+    def export(self, query="", **headers):
+        self.client.force_authenticate(self.editor)
+        response = self.client.get(f"/api/articles/export/{query}", **headers)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    def test_ndjson_and_json_array(self):
+        response, body = self.export()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([r["id"] for r in rows], [a.pk for a in self.articles])
+        self.assertEqual(rows[0]["publisher"], "Publisher 1")
+
+        response, body = self.export(
+            f"?publisher={self.publisher.pk}", HTTP_ACCEPT="application/json"
+        )
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(
+            [r["title"] for r in json.loads(body)], ["Article 0", "Article 2"]
+        )
+
+    def test_date_filters_and_errors(self):
+        Article.objects.filter(pk=self.articles[0].pk).update(
+            created_at=timezone.now() - timedelta(days=10)
+        )
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        _, body = self.export(f"?since={since}&format=json")
+        self.assertEqual(len(json.loads(body)), 2)
+
+        response = self.client.get("/api/articles/export/?since=yesterday")
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(self.reader)
+        response = self.client.get("/api/articles/export/")
+        self.assertEqual(response.status_code, 403)
+
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            "export_articles", "--format", "json", stdout=out, stderr=StringIO()
+        )
+        self.assertEqual(len(json.loads(out.getvalue())), 3)
+
+
+class ImportTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        self.setUpNewsroom(reader=False, editor=True)
+
+    def test_csv_articles(self):
+        rows = StringIO(
+            "title,content,publisher,journalist,approved,created_at\n"
+            "Imported one,Volcano report,Publisher 1,journalist1,yes,2020-01-02T10:00:00\n"
+            f"Imported two,Body,New Publisher,{self.journalist.pk},,\n"
+            ",No title,Publisher 1,journalist1,yes,\n"
+            "Imported three,Body,Publisher 1,nobody,yes,\n"
+        )
+        importer = Importer("article", batch_size=2, create_publishers=True)
+        with CaptureQueriesContext(connection) as queries:
+            stats = importer.run(read_rows(rows, "csv"))
+        self.assertLess(len(queries), 40)
+
+        self.assertEqual((stats.rows, stats.created), (4, 2))
+        self.assertEqual([line for line, _ in stats.errors], [3, 4])
+        first = Article.objects.get(title="Imported one")
+        self.assertTrue(first.approved)
+        self.assertEqual(first.created_at.year, 2020)
+        self.assertEqual(list(first.owning_journalists.all()), [self.journalist])
+        self.assertEqual(
+            Article.objects.get(title="Imported two").publisher.name, "New Publisher"
+        )
+        self.assertEqual([a.pk for a in search(self.editor, "volcano")], [first.pk])
+        self.assertEqual(ChangeLogEntry.objects.filter(article_id=first.pk).count(), 1)
+        # A back catalogue notifies nobody unless asked to
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_ndjson_newsletters_and_publishers(self):
+        rows = StringIO(
+            '{"title": "Weekly", "content": "News", "publisher": "Publisher 1",'
+            ' "journalist": "journalist1"}\n\n'
+            '{"title": "Monthly", "content": "More", "publisher_id": 999}\n'
+        )
+        stats = Importer("newsletter").run(read_rows(rows, "ndjson"))
+        self.assertEqual((stats.created, len(stats.errors)), (1, 1))
+        newsletter = Newsletter.objects.get(title="Weekly")
+        self.assertEqual(list(newsletter.owning_journalists.all()), [self.journalist])
+
+        stats = Importer("publisher").run(
+            read_rows(StringIO("name\nPublisher 1\nPublisher 3\n"), "csv")
+        )
+        self.assertEqual(stats.created, 1)
+        with self.assertRaisesMessage(ValueError, "Line 1"):
+            list(read_rows(StringIO("[1]\n"), "ndjson"))
+
+    def test_command(self):
+        with self.assertRaisesMessage(CommandError, "--format"):
+            call_command("import_content", "-", "--kind", "article")
+        with patch("sys.stdin", StringIO("title,content\nStdin,Body\n")):
+            out = StringIO()
+            call_command(
+                "import_content", "-", "--kind", "article", "--format", "csv",
+                "--publisher", "Publisher 1", stdout=out, stderr=StringIO(),
+            )
+        self.assertIn("0 created from 1 row(s), 1 invalid", out.getvalue())
+
+
+class BenchmarkCommandsTest(TestCase):
+    def seed(self, prefix, random_seed=1):
+        out = StringIO()
+        call_command(
+            "seed_benchmark", "--prefix", prefix, "--publishers", "5",
+            "--journalists", "20", "--readers", "200", "--articles", "300",
+            "--newsletters", "20", "--random-seed", str(random_seed), "--json",
+            stdout=out,
+        )
+        return json.loads(out.getvalue())
+
+    def test_seed_is_reproducible_and_skewed(self):
+        first, second = self.seed("one"), self.seed("two")
+        first.pop("seconds"), second.pop("seconds")
+        self.assertEqual(first, second)
+        self.assertEqual(Article.objects.filter(title__startswith="one ").count(), 300)
+
+        counts = sorted(
+            User.objects.filter(username__startswith="one_journalist_")
+            .annotate(n=Count("subscribers")).values_list("n", flat=True)
+        )
+        # A few popular journalists, a long tail of little-followed ones
+        self.assertGreater(counts[-1], 3 * counts[len(counts) // 2])
+        with self.assertRaisesMessage(CommandError, "already exists"):
+            self.seed("one")
+
+    def test_run_benchmarks_report(self):
+        self.seed("bench")
+        out = StringIO()
+        call_command(
+            "run_benchmarks", "--requests", "2", "--warmup", "0", "--json",
+            stdout=out,
+        )
+        report = json.loads(out.getvalue())
+        self.assertEqual(
+            sorted(report["cases"]),
+            ["approve_article", "article_detail", "article_list",
+             "newsletter_list", "subscribed_api"],
+        )
+        stats = report["cases"]["article_list"]
+        self.assertGreater(stats["queries"], 0)
+        self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+        self.assertEqual(report["dataset"]["articles"], 300)
+
+
+@override_settings(NEWS_INSTRUMENTATION=True, NEWS_QUERY_BUDGET_STRICT=True)
+class InstrumentationTest(NewsroomMixin, TestCase):
+    ''' Also the query budget check: every view requested here must stay
+        within its NEWS_QUERY_BUDGETS entry
+    '''
+
+    def setUp(self):
+        instrumentation.reset()
+        self.setUpNewsroom()
+        self.staff = self.create_user("staff1", "editor", is_staff=True)
+        self.staff.groups.add(Group.objects.get(name="editor"))
+        self.reader.subscribed_journalists.add(self.journalist)
+        for i in range(3):
+            publisher = Publisher.objects.create(name=f"Publisher {i}")
+            self.reader.subscribed_publishers.add(publisher)
+            self.article = self.create_article(
+                f"Article {i}", publisher=publisher, approved=True
+            )
+            self.newsletter = Newsletter.objects.create(
+                title=f"Newsletter {i}", content="Body", publisher=publisher
+            )
+        self.pending = self.create_article("Pending", publisher=publisher)
+
+    def test_views_within_budget_and_reported(self):
+        self.client.force_login(self.reader)
+        for url in (
+            "/articles/", f"/articles/{self.article.pk}/", "/newsletters/",
+            f"/newsletters/{self.newsletter.pk}/", "/api/subscribed-articles/",
+        ):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
+        self.client.force_login(self.staff)
+        self.client.post(f"/editor/approve/{self.pending.pk}/")
+
+        response = self.client.get("/api/instrumentation/")
+        views = response.json()["views"]
+        self.assertTrue(response.json()["enabled"])
+        self.assertEqual(
+            set(settings.NEWS_QUERY_BUDGETS) - set(views), set()
+        )
+        stats = views["article_list"]
+        self.assertEqual(stats["requests"], 1)
+        self.assertGreater(stats["queries_max"], 0)
+        self.assertGreater(stats["template_ms_mean"], 0)
+        self.assertGreater(stats["bytes_mean"], 0)
+        self.assertLessEqual(stats["queries_max"], stats["query_budget"])
+
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get("/api/instrumentation/").status_code, 403)
+
+    def test_over_budget(self):
+        self.client.force_login(self.reader)
+        with override_settings(NEWS_QUERY_BUDGETS={"article_list": 1}):
+            with self.assertRaises(instrumentation.QueryBudgetExceeded):
+                self.client.get("/articles/")
+            with override_settings(NEWS_QUERY_BUDGET_STRICT=False):
+                with self.assertLogs("news.instrumentation", "WARNING"):
+                    self.assertEqual(self.client.get("/articles/").status_code, 200)
+        self.assertEqual(instrumentation.view_stats()["article_list"]["over_budget"], 2)
+
+    @override_settings(NEWS_INSTRUMENTATION=False)
+    def test_disabled_is_not_loaded(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            instrumentation.QueryInstrumentationMiddleware(lambda request: None)
+        self.client.force_login(self.reader)
+        self.client.get("/articles/")
+        self.assertEqual(instrumentation.view_stats(), {})
+
+
+class MetricsTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        metrics.drain()
+        self.setUpNewsroom()
+        self.article = self.create_article("Pending")
+
+    def scrape(self, **extra):
+        extra.setdefault("HTTP_AUTHORIZATION", "Bearer scrape-token")
+        with override_settings(NEWS_METRICS_TOKEN="scrape-token"):
+            response = self.client.get("/metrics/", **extra)
+        if response.status_code == 200:
+            self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        return response
+
+    def test_approval_fan_out(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.article.approved = True
+            self.article.save()
+        email = OutboxMessage.objects.get(kind="email")
+        tweet = OutboxMessage.objects.get(kind="tweet")
+        claim_batch(10)
+        with self.assertLogs("news.metrics") as logs:
+            self.assertTrue(deliver(email.pk))
+            with patch("news.twitter.Tweet.make_tweet", side_effect=Exception("down")):
+                self.assertFalse(deliver(tweet.pk))
+
+        events = [json.loads(line.split(":", 2)[2]) for line in logs.output]
+        self.assertEqual(
+            [(e["event"], e.get("outcome")) for e in events],
+            [("article_announced", None), ("outbox_message", "delivered"),
+             ("outbox_message", "retried")],
+        )
+        self.assertEqual(events[0]["recipients"], 1)
+        self.assertIn("since_approval_seconds", events[1])
+
+        text = self.scrape().content.decode()
+        for line in (
+            'news_approvals_total{mode="single"} 1',
+            "news_subscribers_resolved_total 1",
+            "news_emails_sent_total 1",
+            'news_outbox_messages_total{kind="email",outcome="delivered"} 1',
+            'news_outbox_messages_total{kind="tweet",outcome="retried"} 1',
+            'news_approval_to_delivery_seconds_count{kind="email"} 1',
+            'news_approval_to_delivery_seconds_bucket{kind="email",le="+Inf"} 1',
+        ):
+            self.assertIn(line + "\n", text)
+
+    def test_scrape_access(self):
+        # Localhost is what a reverse proxy's clients look like
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION="").status_code, 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        self.assertEqual(self.scrape().status_code, 200)
+        with override_settings(NEWS_METRICS_ALLOWED_IPS=["10.0.0.1"]):
+            self.assertEqual(
+                self.scrape(HTTP_AUTHORIZATION="", REMOTE_ADDR="10.0.0.1").status_code, 200
+            )
+        self.client.force_login(self.create_user("staff1", "editor", is_staff=True))
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION="").status_code, 200)
+
+    def test_tweet_metrics(self):
+        with StubTwitterServer(fail_first=1) as server, self.assertLogs("news.twitter"):
+            client = TwitterClient(
+                "k", "s", "t", "ts", base_url=server.url, rate=1000, burst=10,
+                backoff_base=0.01,
+            )
+            client.post_tweet({"text": "hello"})
+        text = metrics.render()
+        self.assertIn('news_tweets_total{outcome="posted"} 1\n', text)
+        self.assertIn('news_tweet_retries_total{reason="503"} 1\n', text)
+        self.assertIn('news_tweet_seconds_count{outcome="posted"} 1\n', text)
+
+    def test_histogram_buckets_and_merge(self):
+        histogram = metrics.Histogram("test_seconds", "Test", ["stage"], buckets=(1, 5))
+        try:
+            for value in (0.5, 2, 10):
+                histogram.observe(value, stage='say "hi"')
+            values = metrics.drain()["test_seconds"]
+            metrics.merge({"test_seconds": values})
+            metrics.merge({"test_seconds": values})
+            samples = list(histogram.samples())
+        finally:
+            del metrics.REGISTRY["test_seconds"]
+        self.assertEqual(samples, [
+            'test_seconds_bucket{stage="say \\"hi\\"",le="1.0"} 2',
+            'test_seconds_bucket{stage="say \\"hi\\"",le="5.0"} 4',
+            'test_seconds_bucket{stage="say \\"hi\\"",le="+Inf"} 6',
+            'test_seconds_count{stage="say \\"hi\\""} 6',
+            'test_seconds_sum{stage="say \\"hi\\""} 25.0',
+        ])
+
+
+class CountersTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        self.readers = [self.create_user(f"reader{i}", "reader") for i in range(2)]
+        self.journalist = self.create_user("journalist1", "journalist")
+        self.publishers = [Publisher.objects.create(name=f"Publisher {i}") for i in range(3)]
+
+    def counts(self):
+        return (
+            [p.subscriber_count for p in Publisher.objects.order_by("pk")],
+            User.objects.get(pk=self.journalist.pk).subscriber_count,
+        )
+
+    def test_subscriber_counts_follow_subscriptions(self):
+        first, second = self.readers
+        p0, p1, p2 = self.publishers
+        first.subscribed_publishers.add(p0, p1)
+        p0.subscribed_readers.add(second)
+        first.subscribed_journalists.add(self.journalist)
+        self.journalist.subscribers.add(second)
+        self.assertEqual(self.counts(), ([2, 1, 0], 2))
+
+        # Removing a subscription that does not exist changes nothing
+        first.subscribed_publishers.remove(p0, p2)
+        self.assertEqual(self.counts(), ([1, 1, 0], 2))
+
+        # Becoming a journalist clears the reader's subscriptions
+        second.role = "journalist"
+        second.save()
+        self.assertEqual(self.counts(), ([0, 1, 0], 1))
+        first.delete()
+        self.assertEqual(self.counts(), ([0, 0, 0], 0))
+
+    def test_reconcile(self):
+        self.readers[0].subscribed_publishers.add(self.publishers[0])
+        Publisher.objects.update(subscriber_count=5)
+
+        out = StringIO()
+        call_command("reconcile_counters", "--dry-run", stdout=out)
+        self.assertIn("3 publisher count(s) wrong; 0 customuser count(s) wrong", out.getvalue())
+        call_command("reconcile_counters", stdout=StringIO())
+        self.assertEqual(self.counts(), ([1, 0, 0], 0))
+
+    @override_settings(NEWS_VIEW_COUNT_FLUSH_SIZE=3, NEWS_VIEW_COUNT_FLUSH_INTERVAL=3600)
+    def test_views_are_buffered(self):
+        counters.flush_views()
+        article = self.create_article("Hot", publisher=self.publishers[0], approved=True)
+        self.readers[0].subscribed_publishers.add(self.publishers[0])
+        self.client.force_login(self.readers[0])
+        url = f"/articles/{article.pk}/"
+
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(Article.objects.get(pk=article.pk).view_count, 0)
+        self.client.get(url)
+        flushed = Article.objects.get(pk=article.pk)
+        self.assertEqual(flushed.view_count, 3)
+        # Counting views does not invalidate cached pages
+        self.assertEqual(flushed.updated_at, article.updated_at)
+
+
+class RoleTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        self.setUpNewsroom()
+        self.reader.subscribed_journalists.add(self.journalist)
+
+    def groups(self, user):
+        return sorted(user.groups.values_list("name", flat=True))
+
+    def test_saves_without_role_change_are_one_query(self):
+        user = User.objects.get(pk=self.reader.pk)
+        with self.assertNumQueries(1):
+            user.save(update_fields=["last_login"])
+        user.first_name = "Ann"
+        with self.assertNumQueries(1):
+            user.save()
+        with self.assertNumQueries(0):
+            self.assertIsNotNone(models.role_group_id("editor"))
+
+    def test_registration_joins_the_role_group(self):
+        response = self.client.post("/register/", {
+            "username": "journalist2", "email": "j2@example.com", "role": "journalist",
+            "password1": "A-long-passphrase-42", "password2": "A-long-passphrase-42",
+        })
+        self.assertRedirects(response, "/articles/", fetch_redirect_response=False)
+        self.assertEqual(self.groups(User.objects.get(username="journalist2")), ["journalist"])
+
+    def test_role_change_moves_group_and_clears(self):
+        self.assertEqual(self.groups(self.reader), ["reader"])
+        custom = Group.objects.create(name="newsroom")
+        self.reader.groups.add(custom)
+
+        user = User.objects.get(pk=self.reader.pk)
+        user.role = "journalist"
+        user.save()
+        self.assertEqual(self.groups(user), ["journalist", "newsroom"])
+        self.assertFalse(user.subscribed_publishers.exists())
+        self.assertEqual(Publisher.objects.get().subscriber_count, 0)
+        self.assertTrue(User.objects.get(pk=user.pk).has_perm("news.add_article"))
+
+    def test_assign_roles_command(self):
+        other = self.create_user("reader2", "reader")
+        call_command(
+            "assign_roles", "--role", "journalist", "--from-role", "reader",
+            stdout=StringIO(),
+        )
+        for user in (self.reader, other):
+            user = User.objects.get(pk=user.pk)
+            self.assertEqual((user.role, self.groups(user)), ("journalist", ["journalist"]))
+        self.assertEqual(Publisher.objects.get().subscriber_count, 0)
+        self.assertEqual(User.objects.get(pk=self.journalist.pk).subscriber_count, 0)
+
+        User.groups.through.objects.all().delete()
+        out = StringIO()
+        call_command("assign_roles", "--sync-groups", "--all", stdout=out)
+        self.assertIn("Added 3 missing", out.getvalue())
+        with self.assertRaisesMessage(CommandError, "Unknown user(s): nobody"):
+            call_command("assign_roles", "--role", "editor", "--users", "nobody")
+
+
+class PermissionCacheTest(NewsroomMixin, TestCase):
+    def setUp(self):
+        self.setUpNewsroom(editor=True)
+        self.other = self.create_user("journalist2", "journalist")
+        self.article = self.create_article("Mine")
+        self.newsletter = Newsletter.objects.create(
+            title="Weekly", publisher=self.publisher
+        )
+        self.journalist.independent_newsletters.add(self.newsletter)
+
+    def permission_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response, [
+            q["sql"] for q in ctx.captured_queries if "auth_permission" in q["sql"]
+        ]
+
+    def test_permissions_resolved_once_per_session(self):
+        self.client.force_login(self.editor)
+        url = f"/articles/{self.article.pk}/edit/"
+        response, queries = self.permission_queries(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)
+
+        for url in (url, "/editor/pending/", f"/newsletters/{self.newsletter.pk}/edit/"):
+            response, queries = self.permission_queries(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(queries, [])
+
+    def test_pages_without_permission_checks_read_no_version(self):
+        self.client.force_login(self.reader)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get("/articles/").status_code, 200)
+        self.assertFalse(
+            [q for q in ctx.captured_queries if "permissionsversion" in q["sql"]]
+        )
+
+    def test_changes_reach_other_workers(self):
+        # Each worker has its own LocMemCache; the change is made with
+        # another one than the requests use
+        self.client.force_login(self.editor)
+        self.assertEqual(self.client.get("/editor/pending/").status_code, 200)
+        other_worker = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "other-worker",
+            }
+        }
+        with override_settings(CACHES=other_worker):
+            change = Permission.objects.get(codename="change_article")
+            Group.objects.get(name="editor").permissions.remove(change)
+        self.assertEqual(self.client.get("/editor/pending/").status_code, 403)
+
+        # Only the user whose groups changed resolves them again
+        self.client.force_login(self.journalist)
+        self.assertEqual(self.client.get("/editor/pending/").status_code, 200)
+        self.other.groups.add(Group.objects.create(name="newsroom"))
+        _, queries = self.permission_queries("/editor/pending/")
+        self.assertEqual(queries, [])
+        self.journalist.groups.remove(Group.objects.get(name="journalist"))
+        self.assertEqual(self.client.get("/editor/pending/").status_code, 403)
+
+    def test_group_and_role_changes_invalidate(self):
+        self.client.force_login(self.editor)
+        url = f"/articles/{self.article.pk}/edit/"
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        change = Permission.objects.get(codename="change_article")
+        Group.objects.get(name="editor").permissions.remove(change)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        Group.objects.get(name="editor").permissions.add(change)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        editor = User.objects.get(pk=self.editor.pk)
+        editor.role = "reader"
+        editor.save()
+        self.assertEqual(self.client.get("/editor/pending/").status_code, 403)
+
+    def test_bulk_role_change_invalidates(self):
+        self.client.force_login(self.reader)
+        self.assertEqual(self.client.get("/editor/pending/").status_code, 403)
+        call_command("assign_roles", "--role", "editor", "--users", "reader1",
+                     stdout=StringIO())
+        self.assertEqual(self.client.get("/editor/pending/").status_code, 200)
+
+    def test_can_edit(self):
+        for user, expected in (
+            (self.editor, True), (self.journalist, True),
+            (self.other, False), (self.reader, False),
+        ):
+            user = User.objects.get(pk=user.pk)
+            for obj in (self.article, self.newsletter):
+                self.assertIs(permissions.can_edit(user, obj), expected)
+                self.assertIs(permissions.can_delete(user, obj), expected)
+
+        response = self.client.get(f"/articles/{self.article.pk}/edit/")
+        self.assertEqual(response.status_code, 302)  # login first
+        self.client.force_login(self.other)
+        response = self.client.get(f"/articles/{self.article.pk}/edit/")
+        self.assertContains(response, "only edit your own", status_code=403)
+
+
+class IndexTest(TransactionTestCase):
+    # The benchmark drops the indexes in a transaction it rolls back, which
+    # SQLite cannot do inside the transaction a TestCase runs in
+
+    def test_indexes_exist(self):
+        with connection.cursor() as cursor:
+            for model in (Article, Newsletter):
+                constraints = connection.introspection.get_constraints(
+                    cursor, model._meta.db_table
+                )
+                for index in model._meta.indexes:
+                    self.assertTrue(constraints[index.name]["index"], index.name)
+
+    def test_benchmark_indexes_plans(self):
+        out = StringIO()
+        call_command(
+            "benchmark_indexes", "--seed", "200", "--repeat", "1", "--json",
+            stdout=out, stderr=StringIO(),
+        )
+        report = json.loads(out.getvalue())
+        for query, index in (
+            ("pending_articles", "article_pending_idx"),
+            ("reader_article_list", "article_approved_idx"),
+            ("publisher_approved", "article_publisher_appr_idx"),
+            ("journalist_approved", "article_journalist_appr_idx"),
+            ("publisher_newsletters", "newsletter_pub_created_idx"),
+        ):
+            self.assertIn(index, report["with_indexes"][query]["plan"], query)
+            self.assertNotIn(index, report["without_indexes"][query]["plan"], query)
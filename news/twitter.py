@@ -1,6 +1,251 @@
+import logging
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
 from requests_oauthlib import OAuth1Session
 from django.conf import settings
-import json
+from django.core.exceptions import ImproperlyConfigured
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TweetError(Exception):
+    """The X API rejected a tweet"""
+
+    def __init__(self, status_code, text):
+        super().__init__(
+            "Request returned an error: {} {}".format(status_code, text)
+        )
+        self.status_code = status_code
+
+
+class TweetThrottled(Exception):
+    """No tweet may be posted for ``retry_after`` seconds (rate limit)"""
+
+    def __init__(self, retry_after):
+        super().__init__("Rate limited, retry in {:.1f}s".format(retry_after))
+        self.retry_after = retry_after
+
+
+class TokenBucket():
+    """Thread-safe token bucket: ``rate`` tokens/second, bursts of ``capacity``"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take a token if one is available. Returns 0, or the seconds
+        until one will be"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if now >= self.blocked_until and self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def block_until(self, deadline):
+        """Hold every caller until ``deadline`` (a time.monotonic() value)"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, deadline)
+            self.tokens = 0
+
+
+class TwitterClient():
+    """Client for the X API v2 tweet endpoint.
+
+    Keeps one OAuth1 session whose keep-alive connection pool is shared by
+    every request, throttles itself with a token bucket that also honours
+    the ``x-rate-limit-remaining``/``x-rate-limit-reset`` headers, and
+    retries 429/5xx responses and connection errors with jittered backoff.
+    With ``block=False`` it never sleeps: an empty bucket or a 429 raises
+    TweetThrottled and any other failure is raised at once, for callers
+    that retry on their own schedule (the outbox worker).
+    """
+
+    def __init__(self, consumer_key, consumer_secret, access_token,
+                 access_token_secret, base_url=None, rate=None, burst=None,
+                 max_retries=None, backoff_base=0.5, backoff_max=60,
+                 pool_size=10, timeout=10):
+        self.base_url = (
+            base_url or getattr(settings, "X_API_BASE_URL", "https://api.twitter.com")
+        ).rstrip("/")
+        self.max_retries = (
+            max_retries if max_retries is not None
+            else getattr(settings, "NEWS_TWEET_MAX_RETRIES", 3)
+        )
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.bucket = TokenBucket(
+            rate or getattr(settings, "NEWS_TWEET_RATE", 1.0),
+            burst or getattr(settings, "NEWS_TWEET_BURST", 5),
+        )
+
+        self.session = OAuth1Session(
+            consumer_key,
+            client_secret=consumer_secret,
+            resource_owner_key=access_token,
+            resource_owner_secret=access_token_secret,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post_tweet(self, tweet_data, block=True):
+        """Post a tweet, retrying transient failures. Returns the JSON body."""
+        started = time.perf_counter()
+        outcome = "failed"
+        try:
+            body = self._post_tweet(tweet_data, block)
+            outcome = "posted"
+            return body
+        except TweetThrottled:
+            outcome = "throttled"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            metrics.tweets.inc(outcome=outcome)
+            metrics.tweet_seconds.observe(elapsed, outcome=outcome)
+            metrics.log_event("tweet", outcome=outcome, seconds=round(elapsed, 4))
+
+    def _post_tweet(self, tweet_data, block):
+        url = f"{self.base_url}/2/tweets"
+        for attempt in range(self.max_retries + 1):
+            if block:
+                self.bucket.acquire()
+            else:
+                wait = self.bucket.try_acquire()
+                if wait:
+                    raise TweetThrottled(wait)
+            try:
+                response = self.session.post(url, json=tweet_data, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not block or attempt == self.max_retries:
+                    raise
+                logger.warning("Tweet request failed (%s), retrying", e)
+                metrics.tweet_retries.inc(reason="connection")
+                time.sleep(self.backoff(attempt))
+                continue
+
+            pause = self.observe_rate_limit(response)
+            if response.status_code == 201:
+                logger.debug("Tweet posted: %s", response.text)
+                return response.json()
+
+            if response.status_code == 429 and not block:
+                raise TweetThrottled(pause)
+            retryable = response.status_code == 429 or response.status_code >= 500
+            if not retryable or not block or attempt == self.max_retries:
+                raise TweetError(response.status_code, response.text)
+
+            logger.warning(
+                "Tweet request returned %s, retrying", response.status_code
+            )
+            metrics.tweet_retries.inc(reason=str(response.status_code))
+            if response.status_code != 429:
+                # 429s already blocked the bucket until the window resets
+                time.sleep(self.backoff(attempt))
+
+    def backoff(self, attempt):
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        )
+
+    def observe_rate_limit(self, response):
+        """Pause the bucket until the rate-limit window resets when
+        exhausted. Returns the pause in seconds, or None."""
+        remaining = response.headers.get("x-rate-limit-remaining")
+        reset = response.headers.get("x-rate-limit-reset")
+        exhausted = response.status_code == 429 or remaining == "0"
+        if not exhausted:
+            return None
+
+        if reset is not None:
+            wait = float(reset) - time.time()
+        else:
+            wait = float(response.headers.get("retry-after", self.backoff_max))
+        # Jitter so queued workers do not all fire the instant it resets
+        wait = max(0.0, wait) + random.uniform(0, self.backoff_base)
+        logger.warning("X API rate limit reached, pausing %.1fs", wait)
+        metrics.rate_limit_pauses.inc()
+        self.bucket.block_until(time.monotonic() + wait)
+        return wait
+
+    def close(self):
+        self.session.close()
+
+
+class TweetQueue():
+    """Bounded queue of tweets posted by background worker threads"""
+
+    def __init__(self, client, workers=None, maxsize=None):
+        self.client = client
+        self.queue = queue.Queue(
+            maxsize or getattr(settings, "NEWS_TWEET_QUEUE_SIZE", 100)
+        )
+        self.threads = [
+            threading.Thread(target=self._work, daemon=True, name=f"tweet-{i}")
+            for i in range(workers or getattr(settings, "NEWS_TWEET_WORKERS", 2))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, tweet_data, block=True, timeout=None):
+        """Queue a tweet and return a Future for the API response.
+        Raises queue.Full when the queue stays full past ``timeout``.
+        """
+        future = Future()
+        self.queue.put((tweet_data, future), block=block, timeout=timeout)
+        return future
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                tweet_data, future = item
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(self.client.post_tweet(tweet_data))
+                    except Exception as e:
+                        future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        """Wait until every queued tweet has been processed"""
+        self.queue.join()
+
+    def shutdown(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
 
 
 class Tweet():
@@ -10,9 +255,11 @@ class Tweet():
 
     def __new__(cls):
         if cls._instance is None:
-            print("Creating the Tweet object")
+            logger.info("Creating the Tweet object")
             cls._instance = super(Tweet, cls).__new__(cls)
-            cls._instance.oauth = None
+            cls._instance.client = None
+            cls._instance.queue = None
+            cls._instance.lock = threading.Lock()
             # Use settings if available, otherwise use hardcoded values
             if hasattr(settings, 'X_API_KEY') and settings.X_API_KEY:
                 cls._instance.consumer_key = settings.X_API_KEY
@@ -26,17 +273,27 @@ class Tweet():
                 cls._instance.access_token_secret = None
         return cls._instance
 
-    def authenticate(self):
-        """Authenticate with Twitter API using OAuth1"""
+    def authenticate(self, interactive=False):
+        """Authenticate with Twitter API using OAuth1.
+
+        Without access tokens in the settings this raises
+        ImproperlyConfigured, unless ``interactive`` asks for the PIN flow,
+        which needs someone at a terminal (never the outbox worker).
+        """
         # If we have access tokens from settings, use them directly
         if self.access_token and self.access_token_secret:
-            self.oauth = OAuth1Session(
+            self.client = TwitterClient(
                 self.consumer_key,
-                client_secret=self.consumer_secret,
-                resource_owner_key=self.access_token,
-                resource_owner_secret=self.access_token_secret,
+                self.consumer_secret,
+                self.access_token,
+                self.access_token_secret,
+            )
+            return self.client
+
+        if not interactive:
+            raise ImproperlyConfigured(
+                "X_ACCESS_TOKEN and X_ACCESS_SECRET must be set to post tweets"
             )
-            return self.oauth
 
         # Otherwise, use the interactive OAuth flow
         request_token_url = (
@@ -50,7 +307,7 @@ class Tweet():
         try:
             fetch_response = oauth.fetch_request_token(request_token_url)
         except ValueError:
-            print(
+            logger.error(
                 "There may have been an issue with the consumer_key "
                 "or consumer_secret you entered"
             )
@@ -58,12 +315,12 @@ class Tweet():
 
         resource_owner_key = fetch_response.get("oauth_token")
         resource_owner_secret = fetch_response.get("oauth_token_secret")
-        print("Got oauth token: %s" % resource_owner_key)
+        logger.debug("Got oauth token: %s", resource_owner_key)
 
         # Step 2 Get authorization
         base_authorization_url = "https://api.twitter.com/oauth/authorize"
         authorization_url = oauth.authorization_url(base_authorization_url)
-        print("Please go here and authorize: %s" % authorization_url)
+        logger.info("Please go here and authorize: %s", authorization_url)
         verifier = input("Paste the pin here: ")
 
         # Get the access token
@@ -77,65 +334,69 @@ class Tweet():
         )
         oauth_tokens = oauth.fetch_access_token(access_token_url)
 
-        access_token = oauth_tokens["oauth_token"]
-        access_token_secret = oauth_tokens["oauth_token_secret"]
+        self.access_token = oauth_tokens["oauth_token"]
+        self.access_token_secret = oauth_tokens["oauth_token_secret"]
 
-        # Make the request
-        self.oauth = OAuth1Session(
+        # Keep the pooled client for every later request
+        self.client = TwitterClient(
             self.consumer_key,
-            client_secret=self.consumer_secret,
-            resource_owner_key=access_token,
-            resource_owner_secret=access_token_secret,
-        )
-        return self.oauth
-
-    def make_tweet(self, tweet_data):
-        """Post a tweet using Twitter API v2"""
-        if self.oauth is None:
-            if not self.authenticate():
-                raise ValueError("Authentication failed!")
-
-        # Making the request
-        response = self.oauth.post(
-            "https://api.twitter.com/2/tweets",
-            json=tweet_data,
+            self.consumer_secret,
+            self.access_token,
+            self.access_token_secret,
         )
+        return self.client
 
-        if response.status_code != 201:
-            raise Exception(
-                "Request returned an error: {} {}".format(
-                    response.status_code, response.text
-                )
-            )
+    def get_client(self, interactive=False):
+        with self.lock:
+            if self.client is None:
+                if not self.authenticate(interactive):
+                    raise ValueError("Authentication failed!")
+            return self.client
 
-        print("Response code: {}".format(response.status_code))
+    def make_tweet(self, tweet_data, block=True):
+        """Post a tweet using Twitter API v2. With ``block=False`` it
+        raises TweetThrottled instead of waiting for the rate limit."""
+        return self.get_client().post_tweet(tweet_data, block=block)
 
-        # Saving the response as JSON
-        json_response = response.json()
-        print(json.dumps(json_response, indent=4, sort_keys=True))
-        return json_response
+    def submit_tweet(self, tweet_data):
+        """Post a tweet in the background, returns a Future"""
+        client = self.get_client()
+        with self.lock:
+            if self.queue is None:
+                self.queue = TweetQueue(client)
+        return self.queue.submit(tweet_data, block=False)
 
     @staticmethod
-    def tweet_article(article):
-        """Tweet when an article is approved"""
-        try:
-            tweet_client = Tweet()
+    def compose_article_tweet(article):
+        """Build the tweet payload announcing an approved article"""
+        # Shorten content for X (280 chars max)
+        snippet = (
+            article.content[:200] + "..."
+            if len(article.content) > 200
+            else article.content
+        )
 
-            # Shorten content for X (280 chars max)
-            snippet = (
-                article.content[:200] + "..."
-                if len(article.content) > 200
-                else article.content
-            )
+        tweet_text = (
+            f" New Article Published!\n\n"
+            f"{article.title}\n\n"
+            f"{snippet}"
+        )
+        return {"text": tweet_text}
 
-            tweet_text = (
-                f" New Article Published!\n\n"
-                f"{article.title}\n\n"
-                f"{snippet}"
-            )
+    @staticmethod
+    def tweet_article(article):
+        """Tweet when an article is approved, without waiting for the API"""
+        try:
+            future = Tweet().submit_tweet(Tweet.compose_article_tweet(article))
+        except Exception as e:
+            logger.error("Twitter error when posting article: %s", e)
+            return None
 
-            tweet_data = {"text": tweet_text}
-            tweet_client.make_tweet(tweet_data)
+        def report(done):
+            if done.exception() is not None:
+                logger.error(
+                    "Twitter error when posting article: %s", done.exception()
+                )
 
-        except Exception as e:
-            print(f"Twitter error when posting article: {e}")
\ No newline at end of file
+        future.add_done_callback(report)
+        return future
@@ -0,0 +1,99 @@
+"""
+A local stand-in for the X API ``POST /2/tweets`` endpoint.
+
+Used by the tests and ``benchmark_tweets`` to measure the client without
+touching the real API: point ``TwitterClient(base_url=server.url)`` at it.
+It can fail the first requests with 503 and enforce a fixed-window rate
+limit, answering with the same ``x-rate-limit-*`` headers as the real API.
+"""
+
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubTwitterServer():
+
+    def __init__(self, limit=None, window=1.0, fail_first=0, latency=0.0):
+        self.limit = limit
+        self.window = window
+        self.fail_first = fail_first
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.requests = 0
+        self.posted = []
+        self.window_start = time.time()
+        self.window_count = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+    def respond(self, body):
+        ''' Return (status, headers, payload) for one POST '''
+        with self.lock:
+            self.requests += 1
+            if self.requests <= self.fail_first:
+                return 503, {}, {"title": "Service Unavailable"}
+
+            now = time.time()
+            if now - self.window_start >= self.window:
+                self.window_start = now
+                self.window_count = 0
+            headers = {}
+            if self.limit is not None:
+                reset = self.window_start + self.window
+                headers["x-rate-limit-limit"] = str(self.limit)
+                headers["x-rate-limit-reset"] = "%.3f" % reset
+                if self.window_count >= self.limit:
+                    headers["x-rate-limit-remaining"] = "0"
+                    return 429, headers, {"title": "Too Many Requests"}
+                self.window_count += 1
+                headers["x-rate-limit-remaining"] = str(self.limit - self.window_count)
+
+            tweet_id = str(next(self.ids))
+            self.posted.append(body)
+        return 201, headers, {"data": {"id": tweet_id, "text": body.get("text", "")}}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if server.latency:
+                    time.sleep(server.latency)
+                status, headers, payload = server.respond(body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -1,9 +1,20 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 from .views import SubscribedArticlesAPIView
 from rest_framework.authtoken.views import obtain_auth_token
 
 
+ASYNC_VIEWS = set(getattr(settings, "NEWS_ASYNC_VIEWS", ()))
+if "all" in ASYNC_VIEWS:
+    ASYNC_VIEWS.update(async_views.ASYNC_VIEW_NAMES)
+
+
+def pick(name, sync_view, async_view):
+    ''' The async-native view for routes listed in NEWS_ASYNC_VIEWS '''
+    return async_view if name in ASYNC_VIEWS else sync_view
+
+
 urlpatterns = [
     # home
     path("", views.home, name="home"),
@@ -12,27 +23,37 @@ urlpatterns = [
     path("logout/", views.logout_view, name="logout"),
     path("register/", views.register_view, name="register"),
     # Reader URLs
-    path("articles/", views.article_list, name="article_list"),
+    path("articles/", pick("article_list", views.article_list, async_views.article_list), name="article_list"),
     path("subscribe/publisher/<int:publisher_id>/", views.subscribe_publisher, name="subscribe_publisher"),
     path("subscribe/journalist/<int:journalist_id>/", views.subscribe_journalist, name="subscribe_journalist"),
+    path("notifications/", views.notification_preferences, name="notification_preferences"),
     # Journalist URLs
     path("articles/create/", views.create_article, name="create_article"),
     path("articles/<int:article_id>/edit/", views.update_article, name="update_article"),
     path("articles/<int:article_id>/delete/", views.delete_article, name="delete_article"),
     # Article detail
-    path("articles/<int:newsletter_id>/", views.article_detail, name="article_detail"),
+    path("articles/<int:article_id>/", pick("article_detail", views.article_detail, async_views.article_detail), name="article_detail"),
     # Newsletters
-    path("newsletters/", views.newsletter_list, name="newsletter_list"),
+    path("newsletters/", pick("newsletter_list", views.newsletter_list, async_views.newsletter_list), name="newsletter_list"),
     path("newsletters/create/", views.create_newsletter, name="create_newsletter"),
     path("newsletters/<int:newsletter_id>/edit/", views.update_newsletter, name="update_newsletter"),
     path("newsletters/<int:newsletter_id>/delete/", views.delete_newsletter, name="delete_newsletter"),
-    path("newsletters/<int:newsletter_id>/", views.newsletter_detail, name="newsletter_detail"),
+    path("newsletters/<int:newsletter_id>/", pick("newsletter_detail", views.newsletter_detail, async_views.newsletter_detail), name="newsletter_detail"),
     # Editor URLs
     path("editor/pending/", views.pending_articles, name="pending_articles"),
     path("editor/approve/<int:article_id>/", views.approve_article, name="approve_article"),
+    path("editor/approve/", views.bulk_approve_articles, name="bulk_approve_articles"),
     # APIS
-    path("api/subscribed-articles/", SubscribedArticlesAPIView.as_view(), name="subscribed-articles"),
+    path("api/subscribed-articles/", pick("subscribed-articles", SubscribedArticlesAPIView.as_view(), async_views.subscribed_articles_api), name="subscribed-articles"),
+    path("api/subscribed-articles/changes/", views.ArticleChangesAPIView.as_view(), name="subscribed-articles-changes"),
+    path("api/articles/export/", views.ArticleExportAPIView.as_view(), name="articles-export"),
+    path("live/", views.live_feed, name="live_feed"),
     path("articles/<int:article_id>/tweet/", views.tweet_article_view, name="tweet-article"),
+    path("api/cache-stats/", views.cache_stats_view, name="cache-stats"),
+    path("api/instrumentation/", views.instrumentation_view, name="instrumentation"),
+    path("metrics/", views.metrics_view, name="metrics"),
+    path("search/", views.search_view, name="search"),
+    path("api/search/", views.SearchAPIView.as_view(), name="search-api"),
 
     # token
     path("api/token/", obtain_auth_token, name="api_token"),
@@ -1,15 +1,48 @@
+import hmac
+
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required, permission_required
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
-from django.http import HttpResponseForbidden, JsonResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import (
+    HttpResponse,
+    HttpResponseForbidden,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.views.decorators.http import require_POST
 from django.contrib.auth.forms import AuthenticationForm
-from django.contrib.auth.models import Group
 from .models import Article, Publisher, CustomUser, Newsletter
-from .forms import ArticleForm, NewsletterForm, CustomUserCreationForm
+from .forms import (
+    ArticleForm,
+    CustomUserCreationForm,
+    NewsletterForm,
+    NotificationPreferencesForm,
+)
 from rest_framework.generics import ListAPIView
+from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-from .serializers import ArticleSerializer
+from .serializers import (
+    ArticleSerializer,
+    NewsletterSerializer,
+    article_rows,
+    article_values,
+)
+from .renderers import FastJSONRenderer, NDJSONRenderer, json_dumps
+from .feed import FEED_PAGINATION_KEY, feed_enabled, subscribed_articles
+from .pagination import DEFAULT_KEY, RankedPagination, paginate_ranked, paginate_request
+from .search import search
+from . import export, live, sync
+from .caching import cache_stats, render_body
+from .counters import record_view
+from .instrumentation import instrumentation_enabled, view_stats
+from . import metrics
+from .conditional import conditional, make_validators, page_validators
+from .approval import approve_articles
+from .permissions import can_delete, can_edit
 
 
 """ # ********************  HOME/LANDING PAGE ********************"""
@@ -31,12 +64,8 @@ def register_view(request):
         '''Use registration form to create a new user'''
         form = CustomUserCreationForm(request.POST)
         if form.is_valid():
+            # save() puts the user in their role's group
             user = form.save()
-
-            # Assign Django group based on role
-            group = Group.objects.get(name=user.role)
-            user.groups.add(group)
-
             login(request, user)
             return redirect("article_list")
     else:
@@ -69,27 +98,56 @@ def logout_view(request):
 """ # ******************** READERS FUNCTIONALITY ********************"""
 
 
-# READERS VIEWING APPROVE ARTICLES + JOURNALST VIEW THEIR ARTICLES,
-@login_required
-def article_list(request):
-    ''' Depending on the user role, show different sets of articles '''
-    user = request.user
+def subscription_context(user):
+    ''' Subscription id sets so list templates can mark subscribed
+        publishers/journalists without a query per row
+    '''
+    if user.role != "reader":
+        return {}
+    return {
+        "subscribed_publisher_ids": user.subscribed_publisher_ids(),
+        "subscribed_journalist_ids": user.subscribed_journalist_ids(),
+    }
 
+
+def visible_articles(user):
+    ''' Articles listed for ``user``, by role '''
     if user.role == "journalist":
         # Journalist's independent articles
-        articles = request.user.journalist_articles.all()
+        return user.journalist_articles.all()
 
     elif user.role == "reader":
 
-        articles = Article.objects.filter(approved=True)
+        return Article.objects.approved()
 
     elif user.role == "editor":
         # Editors see all articles
-        articles = Article.objects.all()
-    else:
-        articles = Article.objects.none()
+        return Article.objects.all()
+    return Article.objects.none()
 
-    return render(request, "news/article_list.html", {"articles": articles})
+
+# READERS VIEWING APPROVE ARTICLES + JOURNALST VIEW THEIR ARTICLES,
+@login_required
+def article_list(request):
+    ''' Depending on the user role, show different sets of articles '''
+    user = request.user
+    articles = visible_articles(user)
+    context = subscription_context(user)
+    validators = page_validators(
+        request, articles, user.pk, user.role, request.get_full_path(),
+        *(tuple(sorted(ids)) for ids in context.values()),
+    )
+
+    def build():
+        page = paginate_request(request, articles.for_listing())
+        return render(
+            request,
+            "news/article_list.html",
+            {"articles": page, "page": page, **context},
+        )
+
+    # 304 from the page's ids and stamps when nothing changed
+    return conditional(request, validators, build)
 
 
 # READERS SUBCRIBING TO PUBLISHERS
@@ -100,12 +158,27 @@ def subscribe_publisher(request, publisher_id):  # name to identify publisher
         return HttpResponseForbidden()
 
     publisher = get_object_or_404(Publisher, id=publisher_id)
-    if publisher not in request.user.subscribed_publishers.all():
+    if not request.user.is_subscribed_to_publisher(publisher.id):
         request.user.subscribed_publishers.add(publisher)
         messages.success(request, f"Subscribed to {publisher.name} successfully!")
     return redirect("article_list")
 
 
+# READER NOTIFICATION PREFERENCES
+@login_required
+def notification_preferences(request):
+    ''' Readers choose immediate emails or an hourly/daily digest '''
+    if request.user.role != "reader":
+        return HttpResponseForbidden()
+
+    form = NotificationPreferencesForm(request.POST or None, instance=request.user)
+    if request.method == "POST" and form.is_valid():
+        form.save()
+        messages.success(request, "Notification preferences saved.")
+        return redirect("article_list")
+    return render(request, "news/notification_preferences.html", {"form": form})
+
+
 # READERS SUBCRIBING TO JOURNALIST
 @login_required
 def subscribe_journalist(request, journalist_id):
@@ -143,30 +216,55 @@ def create_article(request):
     return render(request, "news/article_form.html", {"form": form})
 
 
-# ARTICLES VIEW IN DETAIL
-@login_required
-def article_detail(request, article_id):
-    ''' All users can view article details, but readers can
-        only see approved articles from subscribed publishers/journalists
-    '''
-    article = get_object_or_404(Article, id=article_id)
-    user = request.user
-
+def article_access_error(user, article):
+    ''' A 403 response when ``user`` may not read ``article``, else None '''
     # Readers can only see approved articles from subscribed
     # publishers/journalists
     if user.role == "reader" and not article.approved:
         return HttpResponseForbidden("This article is not approved.")
 
     if user.role == "reader":
-        if (
-            article.publisher not in user.subscribed_publishers.all()
-            and article.journalist not in user.subscribed_journalists.all()
+        if not (
+            user.is_subscribed_to_publisher(article.publisher_id)
+            or user.is_subscribed_to_journalist(article.journalist_id)
         ):
             return HttpResponseForbidden(
                 "You are not subscribed to this article's publisher or journalist."
             )
+    return None
+
+
+# ARTICLES VIEW IN DETAIL
+@login_required
+def article_detail(request, article_id):
+    ''' All users can view article details, but readers can
+        only see approved articles from subscribed publishers/journalists
+    '''
+    # Only what the checks need; the body comes from the render cache
+    article = get_object_or_404(
+        Article.objects.only("approved", "publisher", "journalist", "updated_at"),
+        id=article_id,
+    )
+    user = request.user
+    forbidden = article_access_error(user, article)
+    if forbidden is not None:
+        return forbidden
+    if request.method == "GET":
+        record_view(article.pk)
+
+    def build():
+        body = render_body(
+            "article", article.pk, article.updated_at, "news/article_body.html",
+            lambda: Article.objects.select_related("publisher", "journalist").get(
+                pk=article.pk
+            ),
+        )
+        return render(
+            request, "news/article_detail.html", {"article": article, "body": body}
+        )
 
-    return render(request, "news/article_detail.html", {"article": article})
+    validators = make_validators(article.updated_at, "article", article.pk, user.pk)
+    return conditional(request, validators, build)
 
 
 # UPDATE ARTICLES ONLY BY JOURNALIST + EDITORS
@@ -180,15 +278,10 @@ def update_article(request, article_id):
     article = get_object_or_404(Article, id=article_id)
     user = request.user
 
-    # Journalists can edit only their own articles
-    if user.role == "journalist":
-        if article.journalist != user:
+    # Journalists can edit only their own articles, editors ANY article
+    if not can_edit(user, article):
+        if user.role == "journalist":
             return HttpResponseForbidden("You can only edit your own articles.")
-
-    # Editors can edit ANY article
-    elif user.role == "editor":
-        pass
-    else:
         return HttpResponseForbidden("You cannot edit articles.")
 
     if request.method == "POST":
@@ -212,15 +305,10 @@ def delete_article(request, article_id):
     article = get_object_or_404(Article, id=article_id)
     user = request.user
 
-    # Journalists can delete only their own articles
-    if user.role == "journalist":
-        if article.journalist != user:
+    # Journalists can delete only their own articles, editors ANY article
+    if not can_delete(user, article):
+        if user.role == "journalist":
             return HttpResponseForbidden("You can only delete your own articles.")
-
-    # Editors can delete ANY article
-    elif user.role == "editor":
-        pass
-    else:
         return HttpResponseForbidden("You cannot delete articles.")
 
     if request.method == "POST":
@@ -235,8 +323,18 @@ def delete_article(request, article_id):
 @permission_required("news.change_article", raise_exception=True)
 def pending_articles(request):
     ''' Editors can see all pending articles that need approval '''
-    articles = Article.objects.filter(approved=False)
-    return render(request, "news/pending_articles.html", {"articles": articles})
+    articles = Article.objects.pending()
+    validators = page_validators(
+        request, articles, request.user.pk, request.get_full_path()
+    )
+
+    def build():
+        page = paginate_request(request, articles.for_listing())
+        return render(
+            request, "news/pending_articles.html", {"articles": page, "page": page}
+        )
+
+    return conditional(request, validators, build)
 
 
 # APPROVE ARTICLE
@@ -250,6 +348,26 @@ def approve_article(request, article_id):
     return redirect("pending_articles")
 
 
+# APPROVE MANY ARTICLES
+@login_required
+@permission_required("news.change_article", raise_exception=True)
+@require_POST
+def bulk_approve_articles(request):
+    ''' Editors approve the selected pending articles in one go.
+        Subscribers get one email listing every article they follow.
+    '''
+    article_ids = [
+        pk for pk in request.POST.getlist("article_ids") if pk.isdigit()
+    ]
+    if not article_ids:
+        messages.error(request, "No articles selected.")
+        return redirect("pending_articles")
+
+    result = approve_articles(Article.objects.filter(pk__in=article_ids))
+    messages.success(request, str(result))
+    return redirect("pending_articles")
+
+
 """ # ******************** NEWSLETTERS  CRUD FUNCTIONALITY ********************"""
 '''
 The views is for handling newsletter, creation, updating, viewing
@@ -277,6 +395,27 @@ def create_newsletter(request):
     return render(request, "news/newsletters_form.html", {"form": form})
 
 
+def visible_newsletters(user):
+    ''' Newsletters listed for ``user``, by role '''
+    if user.role == "journalist":
+        return user.independent_newsletters.all()
+    elif user.role == "reader":
+        # show newsletters from subscribed publishers or journalists
+        return Newsletter.objects.filter(
+            publisher__in=user.subscribed_publisher_ids()
+        )
+        # | Newsletter.objects.filter(journalist__in=user.subscribed_journalists.all())
+    elif user.role == "editor":
+        return Newsletter.objects.all()
+    return Newsletter.objects.none()
+
+
+def newsletter_context(user):
+    if user.role == "journalist":
+        return {"owned_newsletter_ids": user.owned_newsletter_ids()}
+    return {}
+
+
 # VIEW/ READ NEWSLETTERS
 @login_required
 def newsletter_list(request):
@@ -286,39 +425,63 @@ def newsletter_list(request):
         - Editors see all newsletters
     '''
     user = request.user
+    newsletters = visible_newsletters(user)
+    context = newsletter_context(user)
 
-    if user.role == "journalist":
-        newsletters = user.independent_newsletters.all()
-    elif user.role == "reader":
-        # show newsletters from subscribed publishers or journalists
-        newsletters = Newsletter.objects.filter(
-            publisher__in=user.subscribed_publishers.all()
+    validators = page_validators(
+        request, newsletters, user.pk, user.role, request.get_full_path(),
+        *(tuple(sorted(ids)) for ids in context.values()),
+    )
+
+    def build():
+        page = paginate_request(request, newsletters.for_listing())
+        return render(
+            request,
+            "news/newsletter_list.html",
+            {"newsletters": page, "page": page, **context},
         )
-        # | Newsletter.objects.filter(journalist__in=user.subscribed_journalists.all())
-    elif user.role == "editor":
-        newsletters = Newsletter.objects.all()
-    else:
-        newsletters = Newsletter.objects.none()
 
-    return render(request, "news/newsletter_list.html", {"newsletters": newsletters})
+    return conditional(request, validators, build)
 
 
 # VIEW NEWSLETTERS IN DETAIL
 @login_required
 def newsletter_detail(request, newsletter_id):
-    newsletter = get_object_or_404(Newsletter, id=newsletter_id)
+    newsletter = get_object_or_404(
+        Newsletter.objects.only("publisher", "updated_at"), id=newsletter_id
+    )
 
     user = request.user
 
     # Readers can only view subscribed newsletters
     if user.role == "reader":
-        if (
-            newsletter.publisher not in user.subscribed_publishers.all()
-            and newsletter.journalist not in user.subscribed_journalists.all()
+        # Newsletters belong to journalists through independent_newsletters
+        if not (
+            user.is_subscribed_to_publisher(newsletter.publisher_id)
+            or newsletter.owning_journalists.filter(
+                pk__in=user.subscribed_journalist_ids()
+            ).exists()
         ):
             return HttpResponseForbidden("You are not subscribed to this newsletter.")
 
-    return render(request, "news/newsletter_detail.html", {"newsletter": newsletter})
+    def build():
+        body = render_body(
+            "newsletter", newsletter.pk, newsletter.updated_at,
+            "news/newsletter_body.html",
+            lambda: Newsletter.objects.select_related("publisher").get(
+                pk=newsletter.pk
+            ),
+        )
+        return render(
+            request,
+            "news/newsletter_detail.html",
+            {"newsletter": newsletter, "body": body},
+        )
+
+    validators = make_validators(
+        newsletter.updated_at, "newsletter", newsletter.pk, user.pk
+    )
+    return conditional(request, validators, build)
 
 
 # UPDATE NEWSLETTERS ONLY BY: JOURNALIST + EDITORS
@@ -331,16 +494,10 @@ def update_newsletter(request, newsletter_id):
     newsletter = get_object_or_404(Newsletter, id=newsletter_id)
     user = request.user
 
-    # Journalists can edit only their own newsletters
-    if user.role == "journalist":
-        if newsletter not in user.independent_newsletters.all():
+    # Journalists can edit only their own newsletters, editors ANY newsletter
+    if not can_edit(user, newsletter):
+        if user.role == "journalist":
             return HttpResponseForbidden("You can only edit your own newsletters.")
-
-    # Editors can edit ANY newsletter
-    elif user.role == "editor":
-        pass
-
-    else:
         return HttpResponseForbidden("You cannot edit newsletters.")
 
     if request.method == "POST":
@@ -367,14 +524,9 @@ def delete_newsletter(request, newsletter_id):
     newsletter = get_object_or_404(Newsletter, id=newsletter_id)
     user = request.user
 
-    if user.role == "journalist":
-        if newsletter not in user.independent_newsletters.all():
+    if not can_delete(user, newsletter):
+        if user.role == "journalist":
             return HttpResponseForbidden("You can only delete your own newsletters.")
-
-    elif user.role == "editor":
-        pass
-
-    else:
         return HttpResponseForbidden("You cannot delete newsletters.")
 
     if request.method == "POST":
@@ -401,27 +553,270 @@ class SubscribedArticlesAPIView(ListAPIView):
     serializer_class = ArticleSerializer
     permission_classes = [IsAuthenticated]
 
+    @property
+    def pagination_key(self):
+        return FEED_PAGINATION_KEY if feed_enabled() else DEFAULT_KEY
+
+    def list(self, request, *args, **kwargs):
+        # Polling clients get a 304 from the ids on the page they ask for
+        user = request.user
+        validators = page_validators(
+            request, self.get_queryset(), user.pk, request.get_full_path(),
+            *(tuple(sorted(ids)) for ids in subscription_context(user).values()),
+            key=self.pagination_key,
+        )
+
+        def build():
+            preview = preview_length(request)
+            if fast_rows(preview):
+                return self.list_rows(preview)
+            return super(SubscribedArticlesAPIView, self).list(
+                request, *args, **kwargs
+            )
+
+        return conditional(request, validators, build)
+
+    def list_rows(self, preview):
+        ''' Same response as list(), built from values() rows '''
+        rows = self.paginate_queryset(
+            article_values(self.get_queryset(), self.pagination_key, preview)
+        )
+        return self.get_paginated_response(list(article_rows(rows, preview)))
+
     def get_queryset(self):
-        user = self.request.user
+        return reader_feed(self.request.user)
 
-        if user.role != "reader":
-            return Article.objects.none()
 
-        publisher_articles = Article.objects.filter(
-            approved=True, publisher__in=user.subscribed_publishers.all()
+def preview_length(request):
+    ''' ?preview=<characters>: truncate article content in list APIs '''
+    try:
+        length = int(request.GET.get("preview", ""))
+    except ValueError:
+        return None
+    return length if length > 0 else None
+
+
+def fast_rows(preview=None):
+    ''' Whether list APIs serialize from values() rows, see serializers.py.
+        Content previews are only available on this path.
+    '''
+    return bool(preview) or getattr(settings, "NEWS_FAST_SERIALIZATION", True)
+
+
+def article_rows_response(rows, next_link, next_cursor, preview=None):
+    return HttpResponse(
+        json_dumps({
+            "next": next_link,
+            "next_cursor": next_cursor,
+            "results": list(article_rows(rows, preview)),
+        }),
+        content_type="application/json",
+    )
+
+
+def reader_feed(user):
+    ''' Queryset behind api/subscribed-articles/ '''
+    if user.role != "reader":
+        return Article.objects.none()
+
+    # Materialised feed table when enabled, subscription query otherwise
+    return subscribed_articles(user).select_related("publisher", "journalist")
+
+
+""" # ******************** SEARCH ********************"""
+
+
+SEARCH_KINDS = {
+    "article": (ArticleSerializer, ("publisher", "journalist")),
+    "newsletter": (NewsletterSerializer, ("publisher",)),
+}
+
+
+def search_kind(request):
+    kind = request.GET.get("type", "article")
+    return kind if kind in SEARCH_KINDS else "article"
+
+
+# SEARCH PAGE
+@login_required
+def search_view(request):
+    ''' Ranked full-text search over what the user is allowed to open '''
+    query = request.GET.get("q", "").strip()
+    kind = search_kind(request)
+    page = None
+    if query:
+        results = search(request.user, query, kind).select_related(
+            *SEARCH_KINDS[kind][1]
         )
+        page = paginate_ranked(request, results)
+    return render(
+        request,
+        "news/search.html",
+        {"query": query, "kind": kind, "results": page, "page": page},
+    )
+
+
+class SearchAPIView(ListAPIView):
+    ''' API endpoint for ranked search: ?q=...&type=article|newsletter '''
+
+    permission_classes = [IsAuthenticated]
+    pagination_class = RankedPagination
+
+    def get_serializer_class(self):
+        return SEARCH_KINDS[search_kind(self.request)][0]
 
-        journalist_articles = Article.objects.filter(
-            approved=True, journalist__in=user.subscribed_journalists.all()
+    def get_queryset(self):
+        kind = search_kind(self.request)
+        query = self.request.query_params.get("q", "")
+        return search(self.request.user, query, kind).select_related(
+            *SEARCH_KINDS[kind][1]
         )
 
-        return (publisher_articles | journalist_articles).distinct()
+
+class ArticleChangesAPIView(APIView):
+    ''' Incremental sync for readers: the subscribed articles upserted or
+        removed since ``?since=<token>``. Without a token (or with an
+        expired one) the response says "reset": load the full list from
+        api/subscribed-articles/ and keep the returned token.
+    '''
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        user = request.user
+        if user.role != "reader":
+            return Response({"detail": "Only readers can sync."}, status=403)
+
+        token = request.query_params.get("since")
+        change_id = None
+        if token:
+            try:
+                change_id = sync.read_token(user, token)
+            except ValueError as e:
+                return Response({"detail": str(e)}, status=400)
+
+        if change_id is None:
+            return Response({
+                "reset": True,
+                "upserted": [],
+                "removed": [],
+                "has_more": False,
+                "token": sync.make_token(user, sync.latest_change_id()),
+            })
+
+        delta = sync.changes_since(user, change_id)
+        return Response({
+            "reset": False,
+            "upserted": ArticleSerializer(delta.upserted, many=True).data,
+            "removed": delta.removed,
+            "has_more": delta.has_more,
+            "token": sync.make_token(user, delta.change_id),
+        })
+
+
+class ArticleExportAPIView(APIView):
+    ''' Stream every approved article as NDJSON (default) or a JSON array
+        (?format=json or Accept: application/json) for bulk consumers,
+        editors and staff only. Filters: ?publisher=, ?journalist= (ids),
+        ?since= and ?until= (ISO dates or datetimes).
+    '''
+
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [NDJSONRenderer, FastJSONRenderer]
+
+    def get(self, request):
+        user = request.user
+        if not (user.is_staff or user.role == "editor"):
+            return Response({"detail": "Only editors can export."}, status=403)
+
+        try:
+            articles = export.export_queryset(
+                **{
+                    name: request.query_params.get(name)
+                    for name in ("publisher", "journalist", "since", "until")
+                }
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=400)
+
+        output = request.accepted_renderer.format
+        response = StreamingHttpResponse(
+            export.iter_export(articles, output),
+            content_type=request.accepted_renderer.media_type,
+        )
+        response["Content-Disposition"] = f'attachment; filename="articles.{output}"'
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+# LIVE FEED (SERVER-SENT EVENTS)
+@login_required
+async def live_feed(request):
+    ''' Readers keep this open to get newly approved articles from their
+        subscriptions pushed as they are approved. Needs an ASGI server.
+    '''
+    user = await request.auser()
+    if user.role != "reader":
+        return HttpResponseForbidden()
+
+    topics = await sync_to_async(live.reader_topics)(user)
+    response = StreamingHttpResponse(
+        live.event_stream(topics), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # no proxy buffering (nginx)
+    return response
+
+
+# DETAIL CACHE STATISTICS
+@login_required
+def cache_stats_view(request):
+    ''' Hit/miss counters of the detail render cache, staff only '''
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    return JsonResponse(cache_stats())
+
+
+# PER-VIEW INSTRUMENTATION
+@login_required
+def instrumentation_view(request):
+    ''' Query counts and timings per URL name, staff only '''
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    return JsonResponse({
+        "enabled": instrumentation_enabled(),
+        "views": view_stats(),
+    })
+
+
+# PIPELINE METRICS
+def metrics_view(request):
+    ''' Approval fan-out metrics in Prometheus text format, for staff and
+        for scrapers sending NEWS_METRICS_TOKEN as a bearer token or
+        connecting from NEWS_METRICS_ALLOWED_IPS
+    '''
+    token = getattr(settings, "NEWS_METRICS_TOKEN", "")
+    sent = request.META.get("HTTP_AUTHORIZATION", "").removeprefix("Bearer ")
+    allowed = (
+        request.user.is_staff
+        or (token and hmac.compare_digest(sent.encode(), token.encode()))
+        or request.META.get("REMOTE_ADDR")
+        in getattr(settings, "NEWS_METRICS_ALLOWED_IPS", [])
+    )
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 
 # MAKING A TWEET
+@login_required
+@require_POST
 def tweet_article_view(request, article_id):
-    ''' API endpoint to tweet an approved article '''
-    
+    ''' API endpoint to tweet an approved article, editors and staff only '''
+    user = request.user
+    if not (user.is_staff or user.role == "editor"):
+        return JsonResponse({"error": "Only editors can tweet articles"}, status=403)
+
     article = get_object_or_404(Article, id=article_id)
 
     if not article.approved:
@@ -431,6 +826,7 @@ def tweet_article_view(request, article_id):
         )
 
     from .twitter import Tweet
-    Tweet.tweet_article(article)
+    if Tweet.tweet_article(article) is None:
+        return JsonResponse({"error": "Tweet could not be queued"}, status=503)
 
-    return JsonResponse({"status": "Tweet sent successfully"})
+    return JsonResponse({"status": "Tweet queued"}, status=202)